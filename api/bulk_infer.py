@@ -0,0 +1,326 @@
+# bulk_infer.py
+"""
+Offline bulk inference over a directory tree or .tar/.tar.gz/.zip archives,
+without going through HTTP.
+
+    python bulk_infer.py /surveys/2019 /surveys/2020.tar --task both --output results.csv
+
+Images are decoded in DataLoader worker processes (one per core by default)
+and run through the models in batches. Detection frames are downscaled to
+--imgsz in the worker, so at most workers x 2 x batch-size small frames are
+in flight, whatever the size of the survey imagery. Results are appended to the output
+(.csv, .jsonl or .parquet) after every batch, and each finished source is
+recorded in <output>.manifest, so an interrupted run picks up where it left
+off when started again with the same output.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from config import settings
+from schemas.detection import DetectionParams
+from utils.detection import run_detection, parse_detections
+from utils.inference import load_model, classify_tiered_batch, transform
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+# Column types for Parquet output (CSV/JSONL just write whatever is there)
+FIELD_TYPES = {
+    "source": "string",
+    "species": "string",
+    "confidence": "float64",
+    "top_k": "string",
+    "num_detections": "int64",
+    "detections": "string",
+    "error": "string",
+}
+
+# ===== Sources =====
+# An entry is (source_id, container, member): container is None for plain files,
+# otherwise the archive path with member the TarInfo / zip member name.
+
+def is_image(name):
+    return Path(name).suffix.lower() in IMAGE_SUFFIXES
+
+def list_entries(inputs):
+    entries = []
+    for root in map(Path, inputs):
+        if root.is_dir():
+            for dirpath, _, filenames in os.walk(root):
+                for name in sorted(filenames):
+                    if is_image(name):
+                        path = Path(dirpath) / name
+                        entries.append((str(path), None, str(path)))
+        elif zipfile.is_zipfile(root):
+            with zipfile.ZipFile(root) as archive:
+                for name in archive.namelist():
+                    if is_image(name):
+                        entries.append((f"{root}::{name}", str(root), name))
+        elif tarfile.is_tarfile(root):
+            with tarfile.open(root, "r:*") as archive:
+                for member in archive:
+                    if member.isfile() and is_image(member.name):
+                        entries.append((f"{root}::{member.name}", str(root), member))
+        elif root.is_file() and is_image(root.name):
+            entries.append((str(root), None, str(root)))
+        else:
+            raise ValueError(f"Not a directory, archive or image: {root}")
+    return entries
+
+class ImageSource(IterableDataset):
+    """
+    Decodes entries in worker processes. Worker i takes every n-th entry and
+    keeps its own archive handles; entries are in archive order, so reads
+    within a (compressed) tar only ever seek forward.
+    """
+
+    def __init__(self, entries, classify, detect, imgsz=640):
+        self.entries = entries
+        self.classify = classify
+        self.detect = detect
+        self.imgsz = imgsz
+
+    def _read(self, container, member, handles):
+        if container is None:
+            with open(member, "rb") as f:
+                return f.read()
+        if container not in handles:
+            handles[container] = zipfile.ZipFile(container) if zipfile.is_zipfile(container) else tarfile.open(container, "r:*")
+        archive = handles[container]
+        if isinstance(archive, zipfile.ZipFile):
+            return archive.read(member)
+        return archive.extractfile(member).read()
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, workers = (info.id, info.num_workers) if info else (0, 1)
+        handles = {}
+        try:
+            for source, container, member in self.entries[worker::workers]:
+                item = {"source": source, "error": None, "tensor": None, "image": None, "scale": 1.0}
+                try:
+                    image = Image.open(io.BytesIO(self._read(container, member, handles))).convert("RGB")
+                    if self.classify:
+                        item["tensor"] = transform(image)
+                    if self.detect:
+                        # The detector letterboxes to imgsz anyway, so only that much of the frame crosses to the main process
+                        item["scale"] = min(1.0, self.imgsz / max(image.size))
+                        if item["scale"] < 1.0:
+                            size = (max(round(image.width * item["scale"]), 1), max(round(image.height * item["scale"]), 1))
+                            image = image.resize(size, Image.Resampling.BILINEAR)
+                        # Ultralytics treats numpy input as BGR
+                        item["image"] = torch.from_numpy(np.ascontiguousarray(np.asarray(image)[:, :, ::-1]))
+                except Exception:
+                    item["error"] = "Invalid or corrupted image"
+                yield item
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+# ===== Outputs =====
+
+class Output:
+    """Appends result rows to CSV/JSONL, or writes a new Parquet part file per run."""
+
+    def __init__(self, path, fields):
+        self.path = Path(path)
+        self.fields = fields
+        self.format = self.path.suffix.lower().lstrip(".")
+        if self.format == "csv":
+            new = not self.path.exists() or self.path.stat().st_size == 0
+            self._file = open(self.path, "a", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+            if new:
+                self._writer.writeheader()
+        elif self.format == "jsonl":
+            self._file = open(self.path, "a")
+        elif self.format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+            # Parquet files can't be appended to, so <output>.parquet is a directory of parts
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._part = self.path / f"part-{time.strftime('%Y%m%d-%H%M%S')}.parquet"
+            self._writer = None
+        else:
+            raise SystemExit(f"Unsupported output format: {self.path.suffix} (use .csv, .jsonl or .parquet)")
+
+    def write(self, rows):
+        if self.format == "csv":
+            self._writer.writerows(rows)
+            self._file.flush()
+        elif self.format == "jsonl":
+            self._file.writelines(json.dumps(row) + "\n" for row in rows)
+            self._file.flush()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([(f, FIELD_TYPES[f]) for f in self.fields])
+            table = pa.Table.from_pylist([{f: row.get(f) for f in self.fields} for row in rows], schema=schema)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self._part, schema)
+            self._writer.write_table(table)
+
+    def close(self):
+        if self.format == "parquet":
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+class Manifest:
+    """Sources already written to the output, one per line."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.done = set(self.path.read_text().splitlines()) if self.path.exists() else set()
+        self._file = open(self.path, "a")
+
+    def add(self, sources):
+        self._file.writelines(source + "\n" for source in sources)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.update(sources)
+
+    def close(self):
+        self._file.close()
+
+class Progress:
+    def __init__(self, total, every):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, n, failed=0, force=False):
+        self.done += n
+        self.failed += failed
+        now = time.perf_counter()
+        if force or now - self.last >= self.every:
+            self.last = now
+            rate = self.done / max(now - self.start, 1e-9)
+            eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+            print(f"{self.done}/{self.total} images ({self.failed} failed) - {rate:.1f} img/s, ETA {eta / 60:.1f} min",
+                  file=sys.stderr, flush=True)
+
+# ===== Inference =====
+
+def classify_rows(model, items, top_k):
+    batch = torch.stack([item["tensor"] for item in items])
+    results = classify_tiered_batch(model, batch, top_k=top_k)
+    return [
+        {
+            "species": result["predicted_species"],
+            "confidence": result["confidence"],
+            "top_k": json.dumps(result["top_k"]),
+        }
+        for result in results
+    ]
+
+def detect_rows(detector, items, params):
+    results = run_detection(detector, [item["image"].numpy() for item in items], params)
+    rows = []
+    for item, result in zip(items, results):
+        detections = parse_detections([result])
+        # Boxes back in the original frame's pixels
+        for detection in detections:
+            detection["bbox"] = {k: v / item["scale"] for k, v in detection["bbox"].items()}
+        rows.append({"num_detections": len(detections), "detections": json.dumps(detections)})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline bulk classification/detection over directories and archives")
+    parser.add_argument("inputs", nargs="+", help="Directories, .tar/.tar.gz/.zip archives or image files")
+    parser.add_argument("--output", required=True, help="Results file: .csv, .jsonl or .parquet (a directory of parts)")
+    parser.add_argument("--task", choices=["classify", "detect", "both"], default="classify")
+    parser.add_argument("--model", default=settings.MODEL_PATH, help="Classifier checkpoint (.pth or .safetensors)")
+    parser.add_argument("--arch", default="resnet50", help="Classifier architecture for .pth files without an 'arch' key")
+    parser.add_argument("--detector", default=settings.DETECTION_MODEL_PATH)
+    parser.add_argument("--imgsz", type=int, default=settings.DETECT_IMGSZ)
+    parser.add_argument("--conf", type=float, default=settings.DETECT_CONF)
+    parser.add_argument("--iou", type=float, default=settings.DETECT_IOU)
+    parser.add_argument("--max-det", type=int, default=settings.DETECT_MAX_DET)
+    parser.add_argument("--top-k", type=int, default=settings.PREDICT_TOP_K)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Decode processes (each holds up to 2 batches of decoded images)")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    classify = args.task in ("classify", "both")
+    detect = args.task in ("detect", "both")
+
+    fields = ["source"]
+    if classify:
+        fields += ["species", "confidence", "top_k"]
+    if detect:
+        fields += ["num_detections", "detections"]
+    fields.append("error")
+
+    manifest = Manifest(f"{args.output}.manifest")
+    entries = [entry for entry in list_entries(args.inputs) if entry[0] not in manifest.done]
+    print(f"{len(entries)} images to process ({len(manifest.done)} already done)", file=sys.stderr)
+    if not entries:
+        return 0
+
+    model = load_model(args.model, arch=args.arch) if classify else None
+    detector = None
+    if detect:
+        from ultralytics import YOLO
+        detector = YOLO(args.detector)
+    params = DetectionParams(imgsz=args.imgsz, conf=args.conf, iou=args.iou, max_det=args.max_det)
+
+    loader = DataLoader(
+        ImageSource(entries, classify, detect, imgsz=args.imgsz),
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        collate_fn=list,
+        prefetch_factor=2 if args.workers > 0 else None,
+        persistent_workers=False
+    )
+    output = Output(args.output, fields)
+    progress = Progress(len(entries), args.progress_every)
+    try:
+        for batch in loader:
+            rows = [{"source": item["source"], "error": item["error"]} for item in batch]
+            ok = [i for i, item in enumerate(batch) if item["error"] is None]
+            if ok:
+                items = [batch[i] for i in ok]
+                if classify:
+                    for i, row in zip(ok, classify_rows(model, items, args.top_k)):
+                        rows[i].update(row)
+                if detect:
+                    for i, row in zip(ok, detect_rows(detector, items, params)):
+                        rows[i].update(row)
+            # Results first, then the manifest: a crash can repeat a batch but never lose one
+            output.write(rows)
+            manifest.add([row["source"] for row in rows])
+            progress.update(len(rows), failed=len(rows) - len(ok))
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    finally:
+        progress.update(0, force=True)
+        output.close()
+        manifest.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
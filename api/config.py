@@ -2,7 +2,7 @@
 # Adjust Global API settings 
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # API Settings
@@ -11,7 +11,118 @@ class Settings(BaseSettings):
     API_PREFIX: str = "/api/v1"
     
     # Model Settings
-    MODEL_PATH: str = "models/single_species.pth"
+    MODEL_PATH: str = "models/single_species.pth"  # or an exported .safetensors file (memory-mapped)
+    DETECTION_MODEL_PATH: str = "models/multi_species.pt"
+    
+    # Model Registry Settings (models/registry/<classifier|detector>/<version>/manifest.json)
+    MODEL_REGISTRY_DIR: str = "models/registry"
+    CLASSIFIER_VERSION: Optional[str] = None  # Pin a registry version; latest is used when unset
+    DETECTOR_VERSION: Optional[str] = None  # Falls back to MODEL_PATH / DETECTION_MODEL_PATH if the registry is empty
+    ADMIN_TOKEN: Optional[str] = None  # Required in X-Admin-Token for /admin endpoints; disabled when unset
+    
+    # Tiered Classification Settings
+    FAST_MODEL_PATH: Optional[str] = None  # Small first-tier classifier; disabled when unset
+    FAST_MODEL_ARCH: str = "resnet18"  # Used when the checkpoint doesn't record its architecture
+    TIER_CONFIDENCE_THRESHOLD: float = 0.85  # Fast-tier answers below this escalate to MODEL_PATH
+    PREDICT_TOP_K: int = 3
+    
+    # Graph Compilation Settings (torch.compile the classifiers; falls back to eager if compiling fails)
+    COMPILE_ENABLED: bool = False
+    COMPILE_MODE: str = "default"  # or "reduce-overhead" / "max-autotune"
+    COMPILE_CACHE_DIR: str = "models/compile_cache"  # Compiled kernels, reused across restarts
+    COMPILE_WARMUP_BATCH_SIZES: List[int] = [1, 8]  # Compiled at load time, before serving
+    
+    # Detection Settings (per-request imgsz/conf/iou/max_det fall back to these)
+    DETECT_IMGSZ: int = 640
+    DETECT_ALLOWED_IMGSZ: List[int] = [320, 480, 640]
+    DETECT_CONF: float = 0.25
+    DETECT_IOU: float = 0.7
+    DETECT_MAX_DET: int = 300
+    DETECT_MAX_DET_CAP: int = 300  # Largest max_det a client may request
+    DETECT_WARMUP: bool = True  # Warm up every allowed imgsz at startup
+    
+    # Empty-Frame Prefilter Settings (frames the gate scores as empty skip the detector; see train_prefilter.py)
+    PREFILTER_ENABLED: bool = False
+    PREFILTER_PATH: str = "models/prefilter.json"
+    PREFILTER_RECALL_TARGET: Optional[float] = None  # Occupied-frame recall to keep; the gate's training target when unset
+    
+    # Analyze (detect -> classify crops) Settings
+    ANALYZE_CROP_PADDING: float = 0.1  # Extra context around each box, as a fraction of box size
+    ANALYZE_MAX_CROP_BATCH: int = 64  # Crops per classifier forward pass
+    ANALYZE_CLASSIFIER_MIN_CONF: float = 0.5  # Below this the detector's label is kept
+    
+    # Near-Duplicate Frame Settings (perceptual hash reuse for burst/time-lapse uploads)
+    DEDUP_ENABLED: bool = False
+    DEDUP_MAX_DISTANCE: int = 4  # Max differing bits (of 64) to count as the same frame
+    DEDUP_MAX_ENTRIES: int = 2048
+    DEDUP_WINDOW_SECONDS: float = 300.0
+    
+    # Scheduling Settings (X-Priority: interactive|bulk; batch endpoints default to bulk)
+    INFERENCE_SLOTS: int = 2  # Model calls running at once across all lanes
+    LANE_INTERACTIVE_CONCURRENCY: int = 2
+    LANE_BULK_CONCURRENCY: int = 1  # Keep below INFERENCE_SLOTS to reserve room for interactive work
+    LANE_INTERACTIVE_MAX_QUEUE: int = 50
+    LANE_BULK_MAX_QUEUE: int = 200
+    
+    # Inference Tuning Settings (fixed values; starting points when AUTOTUNE_ENABLED)
+    DETECT_BATCH_SIZE: int = 4  # Images per detector call in the batch endpoints
+    INFERENCE_THREADS: Optional[int] = None  # torch threads per inference slot; torch's default when unset
+    
+    # Autotuning Settings (adjusts batch sizes, INFERENCE_SLOTS and threads within these bounds; see /autotune)
+    AUTOTUNE_ENABLED: bool = False
+    AUTOTUNE_INTERVAL_SECONDS: float = 10.0
+    AUTOTUNE_CLASSIFY_P95_MS: Optional[float] = 2000.0  # Per classifier call (one batch)
+    AUTOTUNE_DETECT_P95_MS: Optional[float] = 5000.0  # Per detector call
+    AUTOTUNE_RSS_LIMIT_MB: Optional[float] = None  # Back off above this; 80% of physical memory when unset
+    AUTOTUNE_CLASSIFY_BATCH_MIN: int = 1
+    AUTOTUNE_CLASSIFY_BATCH_MAX: int = 64
+    AUTOTUNE_DETECT_BATCH_MIN: int = 1
+    AUTOTUNE_DETECT_BATCH_MAX: int = 16
+    AUTOTUNE_SLOTS_MIN: int = 1
+    AUTOTUNE_SLOTS_MAX: int = 4
+    AUTOTUNE_THREADS_MIN: int = 1
+    AUTOTUNE_THREADS_MAX: Optional[int] = None  # CPU count when unset
+    
+    # Request Deadline Settings (clients may send X-Request-Timeout in seconds)
+    REQUEST_TIMEOUT_SECONDS: Optional[float] = None  # Default deadline; no deadline when unset
+    REQUEST_TIMEOUT_MAX_SECONDS: float = 600.0
+
+    # Batch Preprocessing Settings (decode + transform in worker processes)
+    PREPROCESS_WORKERS: int = 2  # 0 decodes in the inference thread instead
+    PREPROCESS_CHUNK_SIZE: int = 8  # Images per shared-memory batch / classifier forward pass (the autotuner's starting point)
+
+    # Remote Ingest Settings (/predict/urls and /detect/urls fetch images server-side)
+    FETCH_TIMEOUT_SECONDS: float = 10.0
+    FETCH_MAX_CONCURRENCY: int = 8  # Downloads in flight per process
+    FETCH_MAX_CONNECTIONS: int = 16  # Pooled keep-alive connections
+    FETCH_ALLOWED_HOSTS: List[str] = ["firebasestorage.googleapis.com", "storage.googleapis.com"]  # Empty allows any host
+    OBJECT_STORE_URL_TEMPLATE: Optional[str] = None  # e.g. https://firebasestorage.googleapis.com/v0/b/<bucket>/o/{key}?alt=media
+
+    # Result Store Settings (per-project species rollups served by /stats)
+    RESULT_STORE_PATH: Optional[str] = None  # e.g. data/results.sqlite3; opt-in, since every result is kept on disk
+    RESULT_RETENTION_DAYS: Optional[int] = 90  # Raw results older than this are pruned (the /stats rollups are kept); None keeps them all
+    DEFAULT_PROJECT_ID: str = "default"  # Used when a request sends no X-Project-Id / project_id
+
+    # Similarity Search Settings (/similar; embeddings come from the full classifier)
+    EMBEDDING_INDEX_DIR: Optional[str] = None  # e.g. data/embeddings; one index per classifier version, opt-in since every full-tier prediction is kept
+    EMBEDDING_INDEX_MAX_SIZE: int = 100000  # Vectors per index (~400MB at 2048-d); the oldest are evicted beyond this
+    EMBEDDING_PCA_DIM: Optional[int] = None  # e.g. 256 to shrink stored vectors once EMBEDDING_PCA_TRAIN_SIZE are collected
+    EMBEDDING_PCA_TRAIN_SIZE: int = 5000
+    EMBEDDING_IVF_MIN_SIZE: int = 50000  # Brute-force search below this many vectors, IVF above
+    EMBEDDING_IVF_NPROBE: int = 8
+    EMBEDDING_SAVE_EVERY: int = 500  # Persist an index after this many new vectors
+    SIMILAR_MAX_K: int = 100
+
+    # Rendition Settings (downscaled WebP/JPEG copies of uploads and annotated images, served by /renditions)
+    RENDITIONS_ENABLED: bool = False  # Keeps uploads on disk (up to RENDITION_CACHE_MAX_MB), so opt-in
+    RENDITION_CACHE_DIR: str = "data/renditions"
+    RENDITION_CACHE_MAX_MB: int = 1024  # Least recently used images (source + renditions) are evicted beyond this
+    RENDITION_SIZES: Dict[str, int] = {"thumb": 160, "small": 480, "medium": 1024}  # Name -> longest edge in pixels
+    RENDITION_PREGENERATE: List[str] = ["thumb"]  # Rendered right after the response; other sizes on first request
+    RENDITION_QUALITY: int = 80
+    RENDITION_WORKERS: int = 1  # Encoder threads, separate from the inference slots
+    RENDITION_MAX_PENDING: int = 64  # Queued pre-renders; beyond this they're skipped and rendered on first request
+    RENDITION_MAX_AGE_SECONDS: int = 31536000  # Renditions are content-addressed, so clients can keep them
     
     # File Upload Settings
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB in bytes
@@ -23,8 +134,12 @@ class Settings(BaseSettings):
     # CORS Settings
     CORS_ORIGINS: List[str] = ["*"]  # Change to specific origins in production
     
-    # Logging Settings
+    # Logging Settings (records go through a queue to a writer thread, off the request path)
     LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}  # Per-module overrides, e.g. {"utils.fetch": "DEBUG", "uvicorn.access": "WARNING"}
+    LOG_FORMAT: str = "json"  # json (one object per line, with request_id and stage timings) or text
+    LOG_SAMPLE_EVERY: int = 20  # Keep 1 in N of the per-file lines inside batch loops; 1 keeps all
+    LOG_QUEUE_SIZE: int = 10000  # Records waiting for the writer; beyond this they are dropped, not blocked on
     
     class Config:
         env_file = ".env"
@@ -1,27 +1,57 @@
 # main.py
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Header, Query
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from datetime import datetime, date, timezone
+from pathlib import Path
 from PIL import Image
 import io
 import os
-import cv2
+import re
 import base64
+import asyncio
+import secrets
+import threading
+import time
+import numpy as np
+import torch
 from ultralytics import YOLO
-from typing import List
+from typing import List, Optional
 
-from utils.inference import load_model, predict_species
+from utils.inference import load_model, classify_tiered, classify_tiered_batch, classify_crops, warmup_classifier, embed_image
+from utils.registry import ModelRegistry
+from utils.scheduler import InferenceScheduler, LaneFull
+from utils.cancellation import RequestContext, RequestCancelled, request_context_dependency, cancelled_http_exception
+from utils.metrics import metrics
+from utils.detection import detection_params, run_detection, parse_detections, annotate, draw_boxes, warmup_detector
+from utils.phash import dhash, hamming_distances, NearDuplicateIndex
+from utils.preprocess import Preprocessor
+from utils.fetch import ImageFetcher, FetchError
+from utils.store import ResultStore
+from utils.vectors import VectorIndex
+from utils.autotune import Autotuner, default_rss_limit_mb
+from utils.logs import configure_logging, RequestLogMiddleware, stage, add_stage
+from utils.compile import configure_compile_cache, compile_classifier, compile_status, warmup_compiled
+from utils.prefilter import EmptyFrameGate
+from utils.renditions import RenditionCache, FORMATS, source_id
+from schemas.detection import DetectionParams
+from schemas.ingest import IngestRequest
 from config import settings
 
-# Set up logging for error handling and status 
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Set up logging for error handling and status: JSON records, written from a background thread
+log_handler = configure_logging(
+    level=settings.LOG_LEVEL,
+    fmt=settings.LOG_FORMAT,
+    module_levels=settings.LOG_LEVELS,
+    sample_every=settings.LOG_SAMPLE_EVERY,
+    queue_size=settings.LOG_QUEUE_SIZE
 )
 logger = logging.getLogger(__name__)
 
+# Per-file log lines inside batch loops are sampled (see LOG_SAMPLE_EVERY)
+SAMPLED = {"sampled": True}
+
 # FastAPI app setup
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -44,50 +74,547 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Request-Id"],
 )
 
+# Request id on every log record and response, plus one access record per request with stage timings
+app.add_middleware(RequestLogMiddleware)
+
+# Opt-in torch.compile for the classifiers; compiled kernels are cached on disk across restarts
+if settings.COMPILE_ENABLED:
+    configure_compile_cache(settings.COMPILE_CACHE_DIR)
+
+def prepare_classifier(model):
+    return compile_classifier(model, mode=settings.COMPILE_MODE) if settings.COMPILE_ENABLED else model
+
+def warm_classifier(model, embeddings=bool(settings.EMBEDDING_INDEX_DIR)):
+    if settings.COMPILE_ENABLED:
+        warmup_compiled(model, settings.COMPILE_WARMUP_BATCH_SIZES, embeddings=embeddings)
+    else:
+        warmup_classifier(model)
+
+# Versioned classifier/detector registry; models can be swapped at runtime via /admin
+registry = ModelRegistry(
+    settings.MODEL_REGISTRY_DIR,
+    loaders={
+        "classifier": lambda path, manifest: prepare_classifier(load_model(path, arch=manifest.get("arch", "resnet50"))),
+        "detector": lambda path, manifest: YOLO(path),
+    },
+    warmups={
+        "classifier": warm_classifier,
+        "detector": lambda m: warmup_detector(m, settings.DETECT_ALLOWED_IMGSZ) if settings.DETECT_WARMUP else None,
+    }
+)
+
+def install_initial_model(kind, pinned_version, fallback_path):
+    version = pinned_version or (registry.list_versions(kind) or [None])[-1]
+    if version is not None:
+        handle = registry.load(kind, version)
+    else:
+        handle = registry.load(kind, "default", manifest={"file": fallback_path, "path": fallback_path})
+    registry.install(kind, handle)
+
 # Load classification model at startup
-logger.info(f"Loading classification model from {settings.MODEL_PATH}")
-model = load_model(settings.MODEL_PATH)
+logger.info("Loading classification model")
+install_initial_model("classifier", settings.CLASSIFIER_VERSION, settings.MODEL_PATH)
 logger.info("Classification model loaded successfully")
 
+# Optional fast first-tier classifier
+fast_model = None
+if settings.FAST_MODEL_PATH:
+    logger.info("Loading fast classification model from %s", settings.FAST_MODEL_PATH)
+    fast_model = prepare_classifier(load_model(settings.FAST_MODEL_PATH, arch=settings.FAST_MODEL_ARCH))
+    warm_classifier(fast_model, embeddings=False)  # The fast tier never indexes embeddings
+    logger.info("Fast classification model loaded successfully")
+
 # Load detection model at startup
-logger.info("Loading detection model from models/multi_species.pt")
-detection_model = YOLO('models/multi_species.pt')
+logger.info("Loading detection model")
+install_initial_model("detector", settings.DETECTOR_VERSION, settings.DETECTION_MODEL_PATH)
 logger.info("Detection model loaded successfully")
 
-# Class ID to species name mapping for detection model
-CLASS_MAPPING = {
-    0: 'Crab',
-    1: 'Eel',
-    2: 'Flatfish',
-    3: 'Roundfish',
-    4: 'Scallop',
-    5: 'Skate',
-    6: 'Whelk'
-}
+# Recent-frame index for reusing results on near-duplicate uploads
+dedup_index = None
+if settings.DEDUP_ENABLED:
+    dedup_index = NearDuplicateIndex(
+        max_entries=settings.DEDUP_MAX_ENTRIES,
+        window_seconds=settings.DEDUP_WINDOW_SECONDS,
+        max_distance=settings.DEDUP_MAX_DISTANCE
+    )
+
+# Empty-frame gate: frames it scores as empty skip the detector (counters on /metrics)
+prefilter = None
+if settings.PREFILTER_ENABLED:
+    prefilter = EmptyFrameGate(settings.PREFILTER_PATH, recall_target=settings.PREFILTER_RECALL_TARGET, metrics=metrics)
+    logger.info("Empty-frame prefilter loaded (threshold %.3f)", prefilter.threshold)
+
+# Downscaled copies of uploads and annotated images for list views, served by /renditions
+renditions = None
+if settings.RENDITIONS_ENABLED:
+    renditions = RenditionCache(
+        settings.RENDITION_CACHE_DIR,
+        max_bytes=settings.RENDITION_CACHE_MAX_MB * 1024 * 1024,
+        sizes=settings.RENDITION_SIZES,
+        quality=settings.RENDITION_QUALITY,
+        workers=settings.RENDITION_WORKERS,
+        max_pending=settings.RENDITION_MAX_PENDING,
+        metrics=metrics
+    )
+
+# Persistent results + per-project rollups for /stats
+result_store = ResultStore(settings.RESULT_STORE_PATH, settings.RESULT_RETENTION_DAYS) if settings.RESULT_STORE_PATH else None
+
+
+def project_for(project_id: Optional[str] = Query(None, description="Project the results belong to"), x_project_id: Optional[str] = Header(None)) -> str:
+    """Dependency resolving the project from X-Project-Id or ?project_id=."""
+    return x_project_id or project_id or settings.DEFAULT_PROJECT_ID
+
+
+def store_results(background_tasks, project_id, kind, rows):
+    """Persist [(source, species, confidence), ...] after the response is sent."""
+    if result_store is not None and rows:
+        background_tasks.add_task(result_store.record, project_id, kind, rows)
+
+
+def prediction_rows(results):
+    return [(r["filename"], r["predicted_species"], r["confidence"]) for r in results if r.get("status") == "success"]
+
+
+def detection_rows(results):
+    return [
+        (r["filename"], d["species"], d["confidence"])
+        for r in results if r.get("status") == "success"
+        for d in r["detections"]
+    ]
+
+# Embedding indexes for /similar, one per classifier version (their vectors aren't comparable)
+embedding_indexes = {}
+embedding_indexes_lock = threading.Lock()
+
+
+def embedding_index(version, dim=None):
+    """The index for a classifier version: loaded from disk, or created once dim is known."""
+    if not settings.EMBEDDING_INDEX_DIR:
+        return None
+    with embedding_indexes_lock:
+        index = embedding_indexes.get(version)
+        if index is None:
+            directory = Path(settings.EMBEDDING_INDEX_DIR) / version
+            options = {
+                "pca_dim": settings.EMBEDDING_PCA_DIM,
+                "pca_train_size": settings.EMBEDDING_PCA_TRAIN_SIZE,
+                "ivf_min_size": settings.EMBEDDING_IVF_MIN_SIZE,
+                "nprobe": settings.EMBEDDING_IVF_NPROBE,
+                "max_size": settings.EMBEDDING_INDEX_MAX_SIZE
+            }
+            if (directory / "meta.json").exists():
+                index = VectorIndex.load(directory, **options)
+            elif dim is not None:
+                index = VectorIndex(dim, **options)
+            else:
+                return None
+            embedding_indexes[version] = index
+        return index
+
+
+def index_embeddings(version, vectors, metas):
+    index = embedding_index(version, dim=len(vectors[0]))
+    index.add(vectors, metas)
+    if index.unsaved >= settings.EMBEDDING_SAVE_EVERY:
+        index.save(Path(settings.EMBEDDING_INDEX_DIR) / version)
+
+
+def save_embedding_indexes():
+    with embedding_indexes_lock:
+        indexes = list(embedding_indexes.items())
+    for version, index in indexes:
+        if index.unsaved:
+            index.save(Path(settings.EMBEDDING_INDEX_DIR) / version)
+
+
+def queue_embeddings(background_tasks, version, embeddings, entries, project_id):
+    """Index {row: vector} embeddings after the response; entries[row] is (source, result)."""
+    if not embeddings:
+        return
+    created_at = datetime.now(timezone.utc).isoformat()
+    rows = sorted(embeddings)
+    metas = [
+        {
+            "source": entries[row][0],
+            "project_id": project_id,
+            "species": entries[row][1]["predicted_species"],
+            "confidence": entries[row][1]["confidence"],
+            "created_at": created_at
+        }
+        for row in rows
+    ]
+    background_tasks.add_task(index_embeddings, version, [embeddings[row] for row in rows], metas)
+
+
+def frame_hashes(contents_list):
+    """dhash of each upload, or None for uploads that don't decode."""
+    hashes = []
+    for contents in contents_list:
+        try:
+            hashes.append(dhash(contents))
+        except Exception:
+            hashes.append(None)
+    return hashes
+
+
+async def find_duplicates(contents_list, namespace):
+    """
+    Hash the frames (in a worker thread, since hashing decodes the full image)
+    and look up a recent near-duplicate of each. Returns one (frame_hash,
+    match or None) per upload.
+    """
+    if dedup_index is None:
+        return [(None, None)] * len(contents_list)
+    found = []
+    for frame_hash in await asyncio.to_thread(frame_hashes, contents_list):
+        if frame_hash is None:
+            found.append((None, None))
+            continue
+        match = dedup_index.lookup(frame_hash, namespace)
+        metrics.increment("dedup.hits" if match else "dedup.misses")
+        found.append((frame_hash, match))
+    return found
+
+
+async def find_duplicate(contents, namespace):
+    return (await find_duplicates([contents], namespace))[0]
+
+
+def remember(frame_hash, namespace, filename, result, prefiltered=False):
+    if dedup_index is not None and frame_hash is not None:
+        dedup_index.add(frame_hash, namespace, {"filename": filename, "result": result, "prefiltered": prefiltered})
+
+
+def dedup_namespace(kind, extra="", version=None):
+    """
+    Dedup entries are per model version, so a hot swap stops serving the
+    previous version's results. Lookups use the active version; results are
+    remembered under the version that served them (a canary's under the
+    candidate's). Fast-tier answers don't depend on the version, so they go
+    under the active one.
+    """
+    if version is None or version == "fast":
+        version = registry.active(kind).version
+    return f"{kind}:{version}{extra}"
+
+
+def collapse_duplicates(pending):
+    """
+    Group near-identical frames within one batch, which the index can't match
+    since none of them has a result yet. pending holds items ending in their
+    frame_hash; returns (leaders, followers), where only the leaders go to the
+    model and followers[leader position] lists (item, distance) pairs that
+    reuse that leader's result.
+    """
+    leaders, followers = [], {}
+    hashes, positions = [], []  # hashes of the leaders that have one, and their positions in leaders
+    for item in pending:
+        frame_hash = item[-1]
+        if dedup_index is not None and frame_hash is not None and hashes:
+            distances = hamming_distances(hashes, frame_hash)
+            best = int(distances.argmin())
+            if distances[best] <= dedup_index.max_distance:
+                followers.setdefault(positions[best], []).append((item, int(distances[best])))
+                metrics.increment("dedup.batch_hits")
+                continue
+        if frame_hash is not None:
+            hashes.append(frame_hash)
+            positions.append(len(leaders))
+        leaders.append(item)
+    return leaders, followers
+
+
+def draw_reused(frames):
+    """Annotated base64 JPEG of each (image bytes, detections) pair whose boxes come from another frame."""
+    return [draw_boxes(Image.open(io.BytesIO(contents)), detections) for contents, detections in frames]
+
+
+def reuse_info(match):
+    if match is None:
+        return {"reused": False}
+    entry, distance = match
+    return {"reused": True, "reused_from": entry["filename"], "hamming_distance": distance}
+
+
+def rendition_sources(pairs):
+    """(variant, image id, bytes) of each (original bytes, annotated base64) pair's images."""
+    sources = []
+    for original, annotated_base64 in pairs:
+        annotated = base64.b64decode(annotated_base64) if annotated_base64 else None
+        sources.append([(variant, source_id(data), data) for variant, data in (("original", original), ("annotated", annotated)) if data])
+    return sources
+
+
+async def rendition_links_many(background_tasks, pairs):
+    """
+    {"original": url, "annotated": url} for each (original bytes, annotated
+    base64) pair. The ids are content hashes, computed off the event loop;
+    the images are handed to the rendition cache after the response is sent.
+    """
+    if renditions is None:
+        return [{} for _ in pairs]
+    links = []
+    for sources in await asyncio.to_thread(rendition_sources, pairs):
+        for _, image_id, data in sources:
+            background_tasks.add_task(renditions.add, image_id, data, settings.RENDITION_PREGENERATE)
+        links.append({variant: f"/renditions/{image_id}" for variant, image_id, _ in sources})
+    return links
+
+
+async def rendition_links(background_tasks, original=None, annotated_base64=None):
+    return (await rendition_links_many(background_tasks, [(original, annotated_base64)]))[0]
+
+
+async def attach_renditions(background_tasks, results, items):
+    """Add rendition links to the successful results of a batch of uploads."""
+    done = [(results[idx], contents) for idx, _, contents in items if results[idx] and results[idx].get("status") == "success"]
+    pairs = [(contents, result.get("annotated_image", "").partition("base64,")[2]) for result, contents in done]
+    for (result, _), links in zip(done, await rendition_links_many(background_tasks, pairs)):
+        result["renditions"] = links
+
+
+def classify(contents, background_tasks, source=None, project_id=None):
+    """Tiered classification on the routed model version, with optional shadow comparison."""
+    primary, shadow = registry.route("classifier")
+    embeddings = {} if settings.EMBEDDING_INDEX_DIR else None
+    start = time.perf_counter()
+    result = classify_tiered(
+        primary.model, contents, fast_model,
+        threshold=settings.TIER_CONFIDENCE_THRESHOLD,
+        top_k=settings.PREDICT_TOP_K,
+        metrics=metrics,
+        embeddings=embeddings
+    )
+    autotuner.observe("classify", time.perf_counter() - start)
+    if result["tier"] != "full":
+        return {**result, "model_version": "fast"}
+    
+    registry.record("classifier", primary.version, time.perf_counter() - start)
+    queue_embeddings(background_tasks, primary.version, embeddings, [(source, result)], project_id)
+    if shadow is not None:
+        background_tasks.add_task(shadow_classify, shadow, contents, result["predicted_species"], primary.version)
+    return {**result, "model_version": primary.version}
+
+
+def shadow_classify(handle, contents, served_species, served_version):
+    start = time.perf_counter()
+    result = classify_tiered(handle.model, contents, top_k=1)
+    registry.record("classifier", handle.version, time.perf_counter() - start)
+    registry.record_agreement("classifier", served_version, handle.version, result["predicted_species"] == served_species)
+
+
+def classify_batch(batch_t, background_tasks, sources=None, project_id=None):
+    """classify() for a preprocessed (N, 3, 224, 224) batch; returns one result per row."""
+    primary, shadow = registry.route("classifier")
+    embeddings = {} if settings.EMBEDDING_INDEX_DIR else None
+    start = time.perf_counter()
+    results = classify_tiered_batch(
+        primary.model, batch_t, fast_model,
+        threshold=settings.TIER_CONFIDENCE_THRESHOLD,
+        top_k=settings.PREDICT_TOP_K,
+        metrics=metrics,
+        embeddings=embeddings
+    )
+    autotuner.observe("classify", time.perf_counter() - start, len(results))
+    full = [i for i, result in enumerate(results) if result["tier"] == "full"]
+    if full:
+        queue_embeddings(background_tasks, primary.version, embeddings, list(zip(sources or [None] * len(results), results)), project_id)
+        per_image = (time.perf_counter() - start) / len(full)
+        for _ in full:
+            registry.record("classifier", primary.version, per_image)
+        if shadow is not None:
+            # Indexing copies the rows, so the shadow run doesn't depend on the batch buffer
+            served = [results[i]["predicted_species"] for i in full]
+            background_tasks.add_task(shadow_classify_batch, shadow, batch_t[full], served, primary.version)
+    return [
+        {**result, "model_version": primary.version if result["tier"] == "full" else "fast"}
+        for result in results
+    ]
+
+
+def shadow_classify_batch(handle, batch_t, served_species, served_version):
+    start = time.perf_counter()
+    results = classify_tiered_batch(handle.model, batch_t, top_k=1)
+    per_image = (time.perf_counter() - start) / len(results)
+    for result, served in zip(results, served_species):
+        registry.record("classifier", handle.version, per_image)
+        registry.record_agreement("classifier", served_version, handle.version, result["predicted_species"] == served)
+
+
+def skip_detector(image, params):
+    """True when the empty-frame gate is on for this request and scores the frame as empty."""
+    return prefilter is not None and params.prefilter and prefilter.is_empty(image)
+
+
+def detect(image, params, background_tasks):
+    """
+    Detection on the routed model version. Returns (detections, annotated
+    base64 JPEG, version, prefiltered); prefiltered frames never reach the
+    detector and come back with no detections.
+    """
+    primary, shadow = registry.route("detector")
+    if skip_detector(image, params):
+        return [], draw_boxes(image, []), primary.version, True
+    start = time.perf_counter()
+    results = run_detection(primary.model, image, params)
+    elapsed = time.perf_counter() - start
+    registry.record("detector", primary.version, elapsed)
+    autotuner.observe("detect", elapsed)
+    if prefilter is not None:
+        prefilter.observe_detector(elapsed)
+    detections = parse_detections(results)
+    if shadow is not None:
+        background_tasks.add_task(shadow_detect, shadow, image, params, sorted(d["species"] for d in detections), primary.version)
+    return detections, annotate(results), primary.version, False
+
+
+def detect_many(contents_list, params, background_tasks):
+    """
+    detect() for several uploads in one detector call. Returns one
+    (detections, annotated base64 JPEG, version, prefiltered) per upload,
+    or None for uploads that don't decode.
+    """
+    primary, shadow = registry.route("detector")
+    outputs = [None] * len(contents_list)
+    images, decoded = [], []
+    for i, contents in enumerate(contents_list):
+        try:
+            image = Image.open(io.BytesIO(contents)).convert("RGB")
+        except Exception:
+            continue
+        if skip_detector(image, params):
+            outputs[i] = ([], draw_boxes(image, []), primary.version, True)
+        else:
+            images.append(image)
+            decoded.append(i)
+    if not images:
+        return outputs
+    
+    start = time.perf_counter()
+    results = run_detection(primary.model, images, params)
+    elapsed = time.perf_counter() - start
+    autotuner.observe("detect", elapsed, len(images))
+    if prefilter is not None:
+        prefilter.observe_detector(elapsed, len(images))
+    for i, image, result in zip(decoded, images, results):
+        registry.record("detector", primary.version, elapsed / len(images))
+        detections = parse_detections([result])
+        if shadow is not None:
+            background_tasks.add_task(shadow_detect, shadow, image, params, sorted(d["species"] for d in detections), primary.version)
+        outputs[i] = (detections, annotate([result]), primary.version, False)
+    return outputs
+
+
+def shadow_detect(handle, image, params, served_species, served_version):
+    start = time.perf_counter()
+    detections = parse_detections(run_detection(handle.model, image, params))
+    registry.record("detector", handle.version, time.perf_counter() - start)
+    registry.record_agreement("detector", served_version, handle.version, sorted(d["species"] for d in detections) == served_species)
+
+
+# Inference scheduler: interactive work is always admitted before bulk work
+scheduler = InferenceScheduler(
+    total_slots=settings.INFERENCE_SLOTS,
+    max_slots=settings.AUTOTUNE_SLOTS_MAX if settings.AUTOTUNE_ENABLED else None,
+    lane_limits={
+        "interactive": settings.LANE_INTERACTIVE_CONCURRENCY,
+        "bulk": settings.LANE_BULK_CONCURRENCY
+    },
+    max_queue={
+        "interactive": settings.LANE_INTERACTIVE_MAX_QUEUE,
+        "bulk": settings.LANE_BULK_MAX_QUEUE
+    },
+    metrics=metrics
+)
+
+
+def tuning_range(value, low, high):
+    """(start, min, max) for an autotuned knob; pinned to the configured value when autotuning is off."""
+    return (value, low, high) if settings.AUTOTUNE_ENABLED else (value, value, value)
+
+
+# Batch sizes, slots and torch threads: fixed from settings, or adjusted at runtime when AUTOTUNE_ENABLED
+cpu_count = os.cpu_count() or 1
+autotuner = Autotuner(
+    scheduler,
+    classify_batch=tuning_range(settings.PREPROCESS_CHUNK_SIZE, settings.AUTOTUNE_CLASSIFY_BATCH_MIN, settings.AUTOTUNE_CLASSIFY_BATCH_MAX),
+    detect_batch=tuning_range(settings.DETECT_BATCH_SIZE, settings.AUTOTUNE_DETECT_BATCH_MIN, settings.AUTOTUNE_DETECT_BATCH_MAX),
+    slots=tuning_range(settings.INFERENCE_SLOTS, settings.AUTOTUNE_SLOTS_MIN, settings.AUTOTUNE_SLOTS_MAX),
+    threads=tuning_range(
+        settings.INFERENCE_THREADS or (max(cpu_count // settings.INFERENCE_SLOTS, 1) if settings.AUTOTUNE_ENABLED else torch.get_num_threads()),
+        settings.AUTOTUNE_THREADS_MIN,
+        settings.AUTOTUNE_THREADS_MAX or cpu_count
+    ),
+    p95_targets={
+        "classify": settings.AUTOTUNE_CLASSIFY_P95_MS / 1000 if settings.AUTOTUNE_CLASSIFY_P95_MS else None,
+        "detect": settings.AUTOTUNE_DETECT_P95_MS / 1000 if settings.AUTOTUNE_DETECT_P95_MS else None
+    },
+    rss_limit_mb=settings.AUTOTUNE_RSS_LIMIT_MB or default_rss_limit_mb(),
+    enabled=settings.AUTOTUNE_ENABLED
+)
+scheduler.before_run = autotuner.apply_threads
+
+
+# Worker processes that decode and transform batch uploads into shared memory
+preprocessor = Preprocessor(settings.PREPROCESS_WORKERS)
+
+
+# Pooled HTTP client for fetching images by URL or object-store key
+fetcher = ImageFetcher(
+    max_bytes=settings.MAX_FILE_SIZE,
+    timeout=settings.FETCH_TIMEOUT_SECONDS,
+    max_concurrency=settings.FETCH_MAX_CONCURRENCY,
+    max_connections=settings.FETCH_MAX_CONNECTIONS,
+    allowed_hosts=settings.FETCH_ALLOWED_HOSTS,
+    key_url_template=settings.OBJECT_STORE_URL_TEMPLATE
+)
+
+
+# Per-request deadline (X-Request-Timeout / REQUEST_TIMEOUT_SECONDS) and disconnect checks
+request_context = request_context_dependency(metrics)
+
+
+def lane_for(default_lane):
+    """Dependency picking the scheduler lane from X-Priority, falling back to the endpoint's default."""
+    def dependency(x_priority: Optional[str] = Header(None)) -> str:
+        if x_priority is None:
+            return default_lane
+        lane = x_priority.strip().lower()
+        if lane not in scheduler.lanes:
+            raise HTTPException(status_code=400, detail=f"X-Priority must be one of {scheduler.lanes}.")
+        return lane
+    return dependency
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set).")
+    if not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
 
 
 @app.post("/predict")
-async def predict_single(file: UploadFile = File(...)):
+async def predict_single(background_tasks: BackgroundTasks, file: UploadFile = File(...), lane: str = Depends(lane_for("interactive")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
     """
     Predict marine species from a single uploaded image.
-    Returns only the predicted species name.
+    Returns the predicted species with its confidence, class probabilities,
+    top-k and which classifier tier answered.
     """
-    logger.info(f"Received prediction request for file: {file.filename}")
-    
     try:
         # Read and validate file
         contents = await file.read()
         file_size = len(contents)
-        logger.info(f"File size: {file_size} bytes")
         
         if not file.content_type.startswith("image/"):
-            logger.warning(f"Invalid file type: {file.content_type}")
+            logger.warning("Invalid file type: %s", file.content_type, extra={"upload": file.filename})
             raise HTTPException(status_code=400, detail="File must be an image.")
         
         if file_size > settings.MAX_FILE_SIZE:
-            logger.warning(f"File too large: {file_size} bytes")
+            logger.warning("File too large: %d bytes", file_size, extra={"upload": file.filename})
             raise HTTPException(
                 status_code=413, 
                 detail=f"File too large. Max {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB."
@@ -97,52 +624,79 @@ async def predict_single(file: UploadFile = File(...)):
         try:
             Image.open(io.BytesIO(contents))
         except Exception as img_error:
-            logger.error(f"Invalid image: {str(img_error)}")
+            logger.warning("Invalid image: %s", img_error, extra={"upload": file.filename})
             raise HTTPException(status_code=400, detail="Invalid or corrupted image file.")
         
+        # Reuse the result of a recent near-identical frame if there is one
+        frame_hash, match = await find_duplicate(contents, dedup_namespace("classifier"))
+        if match is not None:
+            logger.info("Reusing prediction from %s (distance %d)", match[0]['filename'], match[1], extra={"upload": file.filename})
+            result = match[0]["result"]
+            store_results(background_tasks, project_id, "prediction", [(file.filename, result["predicted_species"], result["confidence"])])
+            return JSONResponse(content={**result, **reuse_info(match), "renditions": await rendition_links(background_tasks, contents)})
+        
         # Make prediction
-        logger.info("Running classification...")
-        prediction, _ = predict_species(model, contents, file.filename)
-        logger.info(f"Prediction: {prediction}")
+        result = await scheduler.run(lane, classify, contents, background_tasks, file.filename, project_id, ctx=ctx)
+        logger.info(
+            "Prediction for %s: %s (%s tier)", file.filename, result['predicted_species'], result['tier'],
+            extra={"upload": file.filename, "bytes": file_size, "species": result['predicted_species'], "confidence": result['confidence'], "tier": result['tier']}
+        )
+        remember(frame_hash, dedup_namespace("classifier", version=result["model_version"]), file.filename, result)
+        store_results(background_tasks, project_id, "prediction", [(file.filename, result["predicted_species"], result["confidence"])])
         
-        return JSONResponse(content={"predicted_species": prediction})
+        return JSONResponse(content={**result, **reuse_info(None), "renditions": await rendition_links(background_tasks, contents)})
         
     except HTTPException:
         raise
+    except LaneFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RequestCancelled as e:
+        logger.warning("%s", e)
+        raise cancelled_http_exception(e)
     except Exception as e:
-        logger.error(f"Prediction error: {str(e)}", exc_info=True)
+        logger.error("Prediction error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 @app.on_event("startup")
 async def startup_event():
-    logger.info(f"Server starting on port {os.getenv('PORT', '8000')}")
+    logger.info("Server starting on port %s", os.getenv('PORT', '8000'))
+    preprocessor.warmup()
+    autotuner.start(settings.AUTOTUNE_INTERVAL_SECONDS)
     logger.info("Application ready to accept connections")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Server shutting down")
+    autotuner.stop()
+    scheduler.shutdown()
+    preprocessor.shutdown()
+    await fetcher.close()
+    if result_store is not None:
+        result_store.close()
+    if renditions is not None:
+        renditions.close()
+    save_embedding_indexes()
 
 
 @app.post("/detect")
-async def detect_multiple(file: UploadFile = File(...)):
+async def detect_multiple(background_tasks: BackgroundTasks, file: UploadFile = File(...), params: DetectionParams = Depends(detection_params), lane: str = Depends(lane_for("interactive")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
     """
     Detect multiple marine species in an image with bounding boxes.
     Returns detections with bounding boxes, species info, and annotated image.
+    Optional query params: imgsz, conf, iou, max_det, classes, prefilter.
+    prefiltered is true when the empty-frame gate skipped the detector.
     """
-    logger.info(f"Received detection request for file: {file.filename}")
-    
     try:
         # Read and validate file
         contents = await file.read()
         file_size = len(contents)
-        logger.info(f"File size: {file_size} bytes")
         
         if not file.content_type.startswith("image/"):
-            logger.warning(f"Invalid file type: {file.content_type}")
+            logger.warning("Invalid file type: %s", file.content_type, extra={"upload": file.filename})
             raise HTTPException(status_code=400, detail="File must be an image.")
         
         if file_size > settings.MAX_FILE_SIZE:
-            logger.warning(f"File too large: {file_size} bytes")
+            logger.warning("File too large: %d bytes", file_size, extra={"upload": file.filename})
             raise HTTPException(
                 status_code=413, 
                 detail=f"File too large. Max {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB."
@@ -152,49 +706,36 @@ async def detect_multiple(file: UploadFile = File(...)):
         try:
             image = Image.open(io.BytesIO(contents))
         except Exception as img_error:
-            logger.error(f"Invalid image: {str(img_error)}")
+            logger.warning("Invalid image: %s", img_error, extra={"upload": file.filename})
             raise HTTPException(status_code=400, detail="Invalid or corrupted image file.")
         
-        # Run detection
-        logger.info("Running detection...")
-        results = detection_model(image)
-        
-        # Get annotated image with bounding boxes
-        annotated_image = results[0].plot()
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        annotated_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        # Parse detections
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for i in range(len(boxes)):
-                box = boxes.xyxy[i].cpu().numpy()
-                conf = float(boxes.conf[i].cpu().numpy())
-                cls = int(boxes.cls[i].cpu().numpy())
-                
-                # Map class ID to species name
-                species_name = CLASS_MAPPING.get(cls, f"Unknown_{cls}")
-                
-                detection = {
-                    "species": species_name,
-                    "confidence": conf,
-                    "bbox": {
-                        "x1": float(box[0]),
-                        "y1": float(box[1]),
-                        "x2": float(box[2]),
-                        "y2": float(box[3])
-                    }
-                }
-                detections.append(detection)
+        extra = f":{params.model_dump_json()}"
+        frame_hash, match = await find_duplicate(contents, dedup_namespace("detector", extra))
+        if match is not None:
+            # Near-duplicate of a recent frame: reuse its boxes, draw them on this image
+            logger.info("Reusing detections from %s (distance %d)", match[0]['filename'], match[1], extra={"upload": file.filename})
+            detections = match[0]["result"]
+            annotated_base64 = await asyncio.to_thread(draw_boxes, image, detections)
+            prefiltered = match[0]["prefiltered"]
+        else:
+            # Run detection (unless the empty-frame gate skips it)
+            detections, annotated_base64, version, prefiltered = await scheduler.run(lane, detect, image, params, background_tasks, ctx=ctx)
+            remember(frame_hash, dedup_namespace("detector", extra, version), file.filename, detections, prefiltered)
         
-        logger.info(f"Detection complete: found {len(detections)} species")
+        logger.info(
+            "Detection for %s: %d detections", file.filename, len(detections),
+            extra={"upload": file.filename, "bytes": file_size, "num_detections": len(detections), "imgsz": params.imgsz, "prefiltered": prefiltered}
+        )
+        store_results(background_tasks, project_id, "detection", [(file.filename, d["species"], d["confidence"]) for d in detections])
         
         response = {
             "num_detections": len(detections),
             "detections": detections,
+            "prefiltered": prefiltered,
             "annotated_image": f"data:image/jpeg;base64,{annotated_base64}",
-            "metadata": {"filename": file.filename},
+            "renditions": await rendition_links(background_tasks, contents, annotated_base64),
+            "metadata": {"filename": file.filename, "parameters": params.model_dump()},
+            **reuse_info(match),
             "timestamp": datetime.utcnow().isoformat()
         }
         
@@ -202,207 +743,719 @@ async def detect_multiple(file: UploadFile = File(...)):
         
     except HTTPException:
         raise
+    except LaneFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RequestCancelled as e:
+        logger.warning("%s", e)
+        raise cancelled_http_exception(e)
     except Exception as e:
-        logger.error(f"Detection error: {str(e)}", exc_info=True)
+        logger.error("Detection error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
     
-# ===== Batch Uploads Below =====
-# Allows for multiple image uploads
+# ===== Batch Pipelines =====
+# Shared by the multipart batch endpoints and the URL/key ingest endpoints.
+# Each fills results[index] for its (index, name, contents) items.
 
-@app.post("/predict/batch")
-async def predict_batch(files: List[UploadFile] = File(...)):
+async def classify_into(results, items, lane, background_tasks, ctx, project_id=None):
     """
-    Predict species for multiple images.
-    Returns list of predictions for each image.
+    Reuse near-duplicate results (of recent requests, or of another frame in
+    this batch), then decode the rest in worker processes and classify them
+    chunk by chunk (the next chunk decodes while the classifier runs on the
+    current one). Returns the RequestCancelled that stopped it, or None.
     """
-    logger.info(f"Received batch prediction request for {len(files)} files")
+    pending = []  # (index, name, contents, frame_hash) of items that need the model
+    cancelled = None
     
-    # Validate batch size
-    if len(files) > settings.MAX_BATCH_SIZE:
-        logger.warning(f"Too many files: {len(files)} (max: {settings.MAX_BATCH_SIZE})")
-        raise HTTPException(
-            status_code=400,
-            detail=f"Too many files. Max {settings.MAX_BATCH_SIZE} files per request."
-        )
+    duplicates = await find_duplicates([contents for _, _, contents in items], dedup_namespace("classifier"))
+    for (idx, name, contents), (frame_hash, match) in zip(items, duplicates):
+        if match is not None:
+            results[idx] = {
+                "filename": name,
+                **match[0]["result"],
+                **reuse_info(match),
+                "status": "success"
+            }
+        else:
+            pending.append((idx, name, contents, frame_hash))
+    pending, followers = collapse_duplicates(pending)
     
-    results = []
+    def fill(position, result):
+        # The leader's outcome, copied onto the batch's near-duplicates of it
+        leader_name = pending[position][1]
+        for (idx, name, _, _), distance in followers.get(position, []):
+            if "error" in result:
+                results[idx] = {**result, "filename": name}
+            else:
+                results[idx] = {**result, "filename": name, **reuse_info(({"filename": leader_name}, distance))}
     
-    for idx, file in enumerate(files):
-        logger.info(f"Processing file {idx + 1}/{len(files)}: {file.filename}")
+    chunks = preprocessor.chunks([item[2] for item in pending], autotuner.value("classify_batch"))
+    try:
+        async for offset, batch in chunks:
+            try:
+                chunk_items = pending[offset:offset + len(batch.errors)]
+                good = [i for i, error in enumerate(batch.errors) if error is None]
+                for i, ((idx, filename, _, _), error) in enumerate(zip(chunk_items, batch.errors)):
+                    if error is not None:
+                        results[idx] = {
+                            "filename": filename,
+                            "error": "Invalid or corrupted image"
+                        }
+                        fill(offset + i, results[idx])
+                if not good:
+                    continue
+                
+                # Stop doing work once the client is gone or the deadline has passed
+                await ctx.check(f"files {offset + 1}-{offset + len(chunk_items)}/{len(pending)}")
+                logger.debug("Classifying %d files (%d-%d of %d)", len(good), offset + 1, offset + len(chunk_items), len(pending), extra=SAMPLED)
+                rows = batch.tensor if len(good) == len(chunk_items) else batch.tensor[good]
+                sources = [chunk_items[i][1] for i in good]
+                chunk_results = await scheduler.run(lane, classify_batch, rows, background_tasks, sources, project_id, ctx=ctx)
+                
+                for i, result in zip(good, chunk_results):
+                    idx, filename, _, frame_hash = chunk_items[i]
+                    remember(frame_hash, dedup_namespace("classifier", version=result["model_version"]), filename, result)
+                    results[idx] = {
+                        "filename": filename,
+                        **result,
+                        **reuse_info(None),
+                        "status": "success"
+                    }
+                    fill(offset + i, results[idx])
+            finally:
+                batch.close()
+    except RequestCancelled as e:
+        cancelled = e
+    except Exception as e:
+        logger.error("Batch classification error: %s", e, exc_info=True)
+        for position, (idx, filename, _, _) in enumerate(pending):
+            if results[idx] is None:
+                results[idx] = {
+                    "filename": filename,
+                    "error": str(e),
+                    "status": "failed"
+                }
+                fill(position, results[idx])
+    finally:
+        await chunks.aclose()
+    
+    return cancelled
+
+
+async def detect_into(results, items, params, lane, background_tasks, ctx):
+    """
+    Detect on the items in groups of the current detector batch size, one
+    model call per group; near-duplicates within a group reuse one run.
+    Returns the RequestCancelled that stopped it, or None.
+    """
+    extra = f":{params.model_dump_json()}"
+    done = 0
+    
+    while done < len(items):
+        group = items[done:done + autotuner.value("detect_batch")]
+        label = f"files {done + 1}-{done + len(group)}/{len(items)}"
+        done += len(group)
+        logger.debug("Processing %s", label, extra=SAMPLED)
         
         try:
-            # Read and validate file
+            # Stop doing work once the client is gone or the deadline has passed
+            await ctx.check(label)
+            
+            to_detect = []  # (idx, name, contents, frame_hash) of items that need the model
+            reused = []  # (idx, name, contents, match) of items answered by a recent frame
+            duplicates = await find_duplicates([contents for _, _, contents in group], dedup_namespace("detector", extra))
+            for (idx, name, contents), (frame_hash, match) in zip(group, duplicates):
+                if match is None:
+                    to_detect.append((idx, name, contents, frame_hash))
+                else:
+                    reused.append((idx, name, contents, match))
+            drawn = await asyncio.to_thread(draw_reused, [(contents, match[0]["result"]) for _, _, contents, match in reused])
+            for (idx, name, _, match), annotated_base64 in zip(reused, drawn):
+                detections = match[0]["result"]
+                results[idx] = {
+                    "filename": name,
+                    "num_detections": len(detections),
+                    "detections": detections,
+                    "annotated_image": f"data:image/jpeg;base64,{annotated_base64}",
+                    "prefiltered": match[0]["prefiltered"],
+                    **reuse_info(match),
+                    "status": "success"
+                }
+            if not to_detect:
+                continue
+            to_detect, followers = collapse_duplicates(to_detect)
+            
+            outputs = await scheduler.run(lane, detect_many, [item[2] for item in to_detect], params, background_tasks, ctx=ctx)
+            reusing = []  # (follower idx, name, contents, leader name, distance, detections, prefiltered)
+            for position, ((idx, name, _, frame_hash), output) in enumerate(zip(to_detect, outputs)):
+                if output is None:
+                    results[idx] = {
+                        "filename": name,
+                        "error": "Invalid or corrupted image"
+                    }
+                    for (follower_idx, follower_name, _, _), _ in followers.get(position, []):
+                        results[follower_idx] = {**results[idx], "filename": follower_name}
+                    continue
+                detections, annotated_base64, version, prefiltered = output
+                remember(frame_hash, dedup_namespace("detector", extra, version), name, detections, prefiltered)
+                results[idx] = {
+                    "filename": name,
+                    "num_detections": len(detections),
+                    "detections": detections,
+                    "annotated_image": f"data:image/jpeg;base64,{annotated_base64}",
+                    "prefiltered": prefiltered,
+                    **reuse_info(None),
+                    "status": "success"
+                }
+                for (follower_idx, follower_name, follower_contents, _), distance in followers.get(position, []):
+                    reusing.append((follower_idx, follower_name, follower_contents, name, distance, detections, prefiltered))
+            
+            # Followers get the leader's boxes drawn on their own image, off the event loop
+            drawn = await asyncio.to_thread(draw_reused, [(contents, detections) for _, _, contents, _, _, detections, _ in reusing])
+            for (idx, name, _, leader, distance, detections, prefiltered), annotated_base64 in zip(reusing, drawn):
+                results[idx] = {
+                    "filename": name,
+                    "num_detections": len(detections),
+                    "detections": detections,
+                    "annotated_image": f"data:image/jpeg;base64,{annotated_base64}",
+                    "prefiltered": prefiltered,
+                    **reuse_info(({"filename": leader}, distance)),
+                    "status": "success"
+                }
+            
+        except RequestCancelled as e:
+            return e
+        except Exception as e:
+            logger.error("Error processing %s: %s", label, e)
+            for idx, name, _ in group:
+                if results[idx] is None:
+                    results[idx] = {
+                        "filename": name,
+                        "error": str(e),
+                        "status": "failed"
+                    }
+    return None
+
+
+def finish_batch(results, names, cancelled, label):
+    """Mark unprocessed items as cancelled; a disconnected client gets no body at all."""
+    if cancelled is None:
+        return
+    for idx, name in enumerate(names):
+        if results[idx] is None:
+            results[idx] = {
+                "filename": name,
+                "error": str(cancelled),
+                "status": "cancelled"
+            }
+    skipped = len([r for r in results if r.get("status") == "cancelled"])
+    metrics.increment("cancelled.skipped_files", skipped)
+    logger.warning("Batch %s cancelled (%s): skipped %d files", label, cancelled.reason, skipped, extra={"reason": cancelled.reason, "skipped": skipped})
+    if cancelled.reason == "disconnected":
+        raise cancelled_http_exception(cancelled)
+
+
+def batch_summary(results):
+    return {
+        "total_files": len(results),
+        "successful": len([r for r in results if r.get("status") == "success"]),
+        "failed": len([r for r in results if r.get("status") == "failed"]),
+        "cancelled": len([r for r in results if r.get("status") == "cancelled"]),
+    }
+
+
+async def read_uploads(files):
+    """Read and validate multipart uploads. Returns (results, items) with invalid files already filled in."""
+    results = [None] * len(files)
+    items = []
+    for idx, file in enumerate(files):
+        try:
             contents = await file.read()
-            file_size = len(contents)
             
             if not file.content_type.startswith("image/"):
-                results.append({
+                results[idx] = {
                     "filename": file.filename,
                     "error": "File must be an image"
-                })
+                }
                 continue
             
-            if file_size > settings.MAX_FILE_SIZE:
-                results.append({
+            if len(contents) > settings.MAX_FILE_SIZE:
+                results[idx] = {
                     "filename": file.filename,
                     "error": f"File too large. Max {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB"
-                })
-                continue
-            
-            # Validate image
-            try:
-                Image.open(io.BytesIO(contents))
-            except Exception:
-                results.append({
-                    "filename": file.filename,
-                    "error": "Invalid or corrupted image"
-                })
+                }
                 continue
             
-            # Make prediction
-            prediction, _ = predict_species(model, contents, file.filename)
-            
-            results.append({
-                "filename": file.filename,
-                "predicted_species": prediction,
-                "status": "success"
-            })
+            items.append((idx, file.filename, contents))
             
         except Exception as e:
-            logger.error(f"Error processing {file.filename}: {str(e)}")
-            results.append({
+            logger.error("Error reading %s: %s", file.filename, e)
+            results[idx] = {
                 "filename": file.filename,
                 "error": str(e),
                 "status": "failed"
-            })
+            }
+    return results, items
+
+
+async def fetch_sources(body: IngestRequest, ctx: RequestContext):
+    """Fetch the request's URLs and keys. Returns (results, items, names) like read_uploads."""
+    try:
+        with stage("fetch"):
+            fetched = await asyncio.wait_for(fetcher.fetch_all(body.urls, body.keys), timeout=ctx.remaining())
+    except asyncio.TimeoutError:
+        metrics.increment("cancelled.deadline")
+        raise RequestCancelled("deadline", "fetching images")
+    
+    results = [None] * len(fetched)
+    items = []
+    for idx, (source, contents) in enumerate(fetched):
+        if isinstance(contents, FetchError):
+            metrics.increment("fetch.failed")
+            results[idx] = {
+                "filename": source,
+                "error": str(contents),
+                "status": "failed"
+            }
+        else:
+            metrics.increment("fetch.succeeded")
+            items.append((idx, source, contents))
+    return results, items, [source for source, _ in fetched]
+
+
+def validate_ingest(body: IngestRequest):
+    count = len(body.urls) + len(body.keys)
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Provide at least one URL or key.")
+    if count > settings.MAX_BATCH_SIZE:
+        logger.warning("Too many sources: %d (max: %d)", count, settings.MAX_BATCH_SIZE)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images. Max {settings.MAX_BATCH_SIZE} per request."
+        )
+
+
+# ===== Batch Uploads Below =====
+# Allows for multiple image uploads
+
+@app.post("/predict/batch")
+async def predict_batch(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...), lane: str = Depends(lane_for("bulk")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
+    """
+    Predict species for multiple images.
+    Returns list of predictions for each image.
+    Images are decoded in worker processes in chunks of the classifier batch
+    size (PREPROCESS_CHUNK_SIZE, or the autotuner's current choice); the next
+    chunk decodes while the classifier runs on the current one.
+    """
+    # Validate batch size
+    if len(files) > settings.MAX_BATCH_SIZE:
+        logger.warning("Too many files: %d (max: %d)", len(files), settings.MAX_BATCH_SIZE)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Max {settings.MAX_BATCH_SIZE} files per request."
+        )
     
-    logger.info(f"Batch prediction complete: {len(results)} files processed")
+    results, items = await read_uploads(files)
+    cancelled = await classify_into(results, items, lane, background_tasks, ctx, project_id)
+    finish_batch(results, [file.filename for file in files], cancelled, "prediction")
+    store_results(background_tasks, project_id, "prediction", prediction_rows(results))
+    await attach_renditions(background_tasks, results, items)
     
-    return JSONResponse(content={
-        "total_files": len(files),
-        "successful": len([r for r in results if r.get("status") == "success"]),
-        "failed": len([r for r in results if r.get("status") == "failed"]),
-        "results": results
-    })
+    summary = batch_summary(results)
+    logger.info("Batch prediction complete: %d files processed", len(results), extra=summary)
+    
+    return JSONResponse(content={**summary, "results": results})
 
 
 @app.post("/detect/batch")
-async def detect_batch(files: List[UploadFile] = File(...)):
+async def detect_batch(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...), params: DetectionParams = Depends(detection_params), lane: str = Depends(lane_for("bulk")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
     """
     Detect multiple species across multiple images.
     Returns detections for each image.
+    Images go through the detector DETECT_BATCH_SIZE (or the autotuner's
+    current choice) at a time.
     """
-    logger.info(f"Received batch detection request for {len(files)} files")
-    
     # Validate batch size
     if len(files) > settings.MAX_BATCH_SIZE:
-        logger.warning(f"Too many files: {len(files)} (max: {settings.MAX_BATCH_SIZE})")
+        logger.warning("Too many files: %d (max: %d)", len(files), settings.MAX_BATCH_SIZE)
         raise HTTPException(
             status_code=400,
             detail=f"Too many files. Max {settings.MAX_BATCH_SIZE} files per request."
         )
     
-    results = []
+    results, items = await read_uploads(files)
+    cancelled = await detect_into(results, items, params, lane, background_tasks, ctx)
+    finish_batch(results, [file.filename for file in files], cancelled, "detection")
+    store_results(background_tasks, project_id, "detection", detection_rows(results))
+    await attach_renditions(background_tasks, results, items)
     
-    for idx, file in enumerate(files):
-        logger.info(f"Processing file {idx + 1}/{len(files)}: {file.filename}")
-        
-        try:
-            # Read and validate file
-            contents = await file.read()
-            file_size = len(contents)
-            
-            if not file.content_type.startswith("image/"):
-                results.append({
-                    "filename": file.filename,
-                    "error": "File must be an image"
-                })
-                continue
-            
-            if file_size > settings.MAX_FILE_SIZE:
-                results.append({
-                    "filename": file.filename,
-                    "error": f"File too large. Max {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB"
-                })
-                continue
-            
-            # Open and validate image
-            try:
-                image = Image.open(io.BytesIO(contents))
-            except Exception:
-                results.append({
-                    "filename": file.filename,
-                    "error": "Invalid or corrupted image"
-                })
-                continue
-            
-            # Run detection
-            detection_results = detection_model(image)
-            
-            # Get annotated image
-            annotated_image = detection_results[0].plot()
-            _, buffer = cv2.imencode('.jpg', annotated_image)
-            annotated_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            # Parse detections
-            detections = []
-            for result in detection_results:
-                boxes = result.boxes
-                for i in range(len(boxes)):
-                    box = boxes.xyxy[i].cpu().numpy()
-                    conf = float(boxes.conf[i].cpu().numpy())
-                    cls = int(boxes.cls[i].cpu().numpy())
-                    
-                    species_name = CLASS_MAPPING.get(cls, f"Unknown_{cls}")
-                    
-                    detections.append({
-                        "species": species_name,
-                        "confidence": conf,
-                        "bbox": {
-                            "x1": float(box[0]),
-                            "y1": float(box[1]),
-                            "x2": float(box[2]),
-                            "y2": float(box[3])
-                        }
-                    })
-            
-            results.append({
-                "filename": file.filename,
-                "num_detections": len(detections),
-                "detections": detections,
-                "annotated_image": f"data:image/jpeg;base64,{annotated_base64}",
-                "status": "success"
-            })
-            
-        except Exception as e:
-            logger.error(f"Error processing {file.filename}: {str(e)}")
-            results.append({
-                "filename": file.filename,
-                "error": str(e),
-                "status": "failed"
-            })
+    summary = batch_summary(results)
+    logger.info("Batch detection complete: %d files processed", len(results), extra=summary)
     
-    logger.info(f"Batch detection complete: {len(results)} files processed")
+    return JSONResponse(content={
+        **summary,
+        "parameters": params.model_dump(),
+        "results": results
+    })
+
+
+# ===== Remote Ingest =====
+# Fetch images from URLs or object-store keys instead of multipart uploads
+
+@app.post("/predict/urls")
+async def predict_urls(body: IngestRequest, background_tasks: BackgroundTasks, lane: str = Depends(lane_for("bulk")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
+    """
+    Predict species for images fetched server-side from URLs and/or bucket keys.
+    Same response as /predict/batch; filename is the URL or key.
+    """
+    validate_ingest(body)
+    try:
+        results, items, names = await fetch_sources(body, ctx)
+    except RequestCancelled as e:
+        logger.warning("%s", e)
+        raise cancelled_http_exception(e)
+    cancelled = await classify_into(results, items, lane, background_tasks, ctx, project_id)
+    finish_batch(results, names, cancelled, "URL prediction")
+    store_results(background_tasks, project_id, "prediction", prediction_rows(results))
+    await attach_renditions(background_tasks, results, items)
+    
+    summary = batch_summary(results)
+    logger.info("URL prediction complete: %d images processed", len(results), extra={**summary, "urls": len(body.urls), "keys": len(body.keys)})
+    
+    return JSONResponse(content={**summary, "results": results})
+
+
+@app.post("/detect/urls")
+async def detect_urls(body: IngestRequest, background_tasks: BackgroundTasks, params: DetectionParams = Depends(detection_params), lane: str = Depends(lane_for("bulk")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
+    """
+    Detect species in images fetched server-side from URLs and/or bucket keys.
+    Same response as /detect/batch; filename is the URL or key.
+    """
+    validate_ingest(body)
+    try:
+        results, items, names = await fetch_sources(body, ctx)
+    except RequestCancelled as e:
+        logger.warning("%s", e)
+        raise cancelled_http_exception(e)
+    cancelled = await detect_into(results, items, params, lane, background_tasks, ctx)
+    finish_batch(results, names, cancelled, "URL detection")
+    store_results(background_tasks, project_id, "detection", detection_rows(results))
+    await attach_renditions(background_tasks, results, items)
+    
+    summary = batch_summary(results)
+    logger.info("URL detection complete: %d images processed", len(results), extra={**summary, "urls": len(body.urls), "keys": len(body.keys)})
     
     return JSONResponse(content={
-        "total_files": len(files),
-        "successful": len([r for r in results if r.get("status") == "success"]),
-        "failed": len([r for r in results if r.get("status") == "failed"]),
+        **summary,
+        "parameters": params.model_dump(),
         "results": results
     })
 
 
+@app.post("/analyze")
+async def analyze(background_tasks: BackgroundTasks, file: UploadFile = File(...), params: DetectionParams = Depends(detection_params), lane: str = Depends(lane_for("interactive")), ctx: RequestContext = Depends(request_context), project_id: str = Depends(project_for)):
+    """
+    Two-stage analysis: detect every animal, then classify all box crops
+    in one batched classifier pass. Each detection carries both the
+    detector's and the classifier's label plus the merged species.
+    """
+    try:
+        # Read and validate file
+        contents = await file.read()
+        file_size = len(contents)
+        
+        if not file.content_type.startswith("image/"):
+            logger.warning("Invalid file type: %s", file.content_type, extra={"upload": file.filename})
+            raise HTTPException(status_code=400, detail="File must be an image.")
+        
+        if file_size > settings.MAX_FILE_SIZE:
+            logger.warning("File too large: %d bytes", file_size, extra={"upload": file.filename})
+            raise HTTPException(
+                status_code=413, 
+                detail=f"File too large. Max {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB."
+            )
+        
+        # Decode once; the detector and the crop classifier share this array
+        try:
+            image = Image.open(io.BytesIO(contents)).convert("RGB")
+        except Exception as img_error:
+            logger.warning("Invalid image: %s", img_error, extra={"upload": file.filename})
+            raise HTTPException(status_code=400, detail="Invalid or corrupted image file.")
+        image_array = np.asarray(image)
+        
+        # Stage 1: detection
+        detections, annotated_base64, _, prefiltered = await scheduler.run(lane, detect, image, params, background_tasks, ctx=ctx)
+        
+        # Stage 2: classify all crops in one batch
+        await ctx.check("crop classification")
+        boxes = [(d["bbox"]["x1"], d["bbox"]["y1"], d["bbox"]["x2"], d["bbox"]["y2"]) for d in detections]
+        classifications = await scheduler.run(
+            lane, classify_crops,
+            registry.active("classifier").model, image_array, boxes,
+            padding=settings.ANALYZE_CROP_PADDING,
+            max_batch=settings.ANALYZE_MAX_CROP_BATCH,
+            ctx=ctx
+        )
+        
+        for detection, (cls_species, cls_conf) in zip(detections, classifications):
+            detection["detector_species"] = detection["species"]
+            detection["detector_confidence"] = detection["confidence"]
+            detection["classifier_species"] = cls_species
+            detection["classifier_confidence"] = cls_conf
+            detection["agreement"] = cls_species == detection["detector_species"]
+            if cls_conf >= settings.ANALYZE_CLASSIFIER_MIN_CONF:
+                detection["species"] = cls_species
+                detection["confidence"] = cls_conf
+        
+        logger.info(
+            "Analyze for %s: %d boxes classified", file.filename, len(detections),
+            extra={"upload": file.filename, "bytes": file_size, "num_detections": len(detections)}
+        )
+        store_results(background_tasks, project_id, "detection", [(file.filename, d["species"], d["confidence"]) for d in detections])
+        
+        return JSONResponse(content={
+            "num_detections": len(detections),
+            "detections": detections,
+            "prefiltered": prefiltered,
+            "annotated_image": f"data:image/jpeg;base64,{annotated_base64}",
+            "renditions": await rendition_links(background_tasks, contents, annotated_base64),
+            "metadata": {"filename": file.filename, "parameters": params.model_dump()},
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        
+    except HTTPException:
+        raise
+    except LaneFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RequestCancelled as e:
+        logger.warning("%s", e)
+        raise cancelled_http_exception(e)
+    except Exception as e:
+        logger.error("Analyze error: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Analyze failed: {str(e)}")
+
+
+@app.get("/renditions/{image_id}")
+async def get_rendition(
+    image_id: str,
+    size: str = Query("thumb", description="One of RENDITION_SIZES, e.g. thumb, small, medium"),
+    format: Optional[str] = Query(None, description="webp or jpeg; webp when the client accepts it"),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Downscaled WebP/JPEG copy of an uploaded or annotated image, from the
+    "renditions" links in results. Rendered on first request (off the
+    inference slots) and cached on disk. Ids are content hashes, so a
+    rendition never changes: long-lived Cache-Control plus an ETag.
+    """
+    if renditions is None or not re.fullmatch(r"[0-9a-f]{32}", image_id):
+        raise HTTPException(status_code=404, detail="Rendition not found.")
+    if size not in settings.RENDITION_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(settings.RENDITION_SIZES)}.")
+    if format is not None and format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(FORMATS)}.")
+    fmt = format or ("webp" if accept and "image/webp" in accept else "jpeg")
+
+    etag = f'"{image_id}-{size}-{fmt}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.RENDITION_MAX_AGE_SECONDS}, immutable",
+    }
+    if format is None:
+        headers["Vary"] = "Accept"
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    path = renditions.cached(image_id, size, fmt)
+    if path is None:
+        path = await asyncio.wrap_future(renditions.executor.submit(renditions.render, image_id, size, fmt))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Rendition not found (the image was never uploaded or has been evicted).")
+    return FileResponse(path, media_type=FORMATS[fmt][0], headers=headers)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "classification_model_loaded": model is not None,
-        "detection_model_loaded": detection_model is not None,
+        "classification_model_loaded": registry.active("classifier") is not None,
+        "fast_classification_model_loaded": fast_model is not None,
+        "detection_model_loaded": registry.active("detector") is not None,
+        "classifier_mode": compile_status(registry.active("classifier").model),
+        "model_versions": {
+            "classifier": registry.active("classifier").version,
+            "detector": registry.active("detector").version
+        },
         "timestamp": datetime.utcnow().isoformat(),
         "version": settings.VERSION
     }
 
+# ===== Model Admin =====
+# Hot swap and shadow/canary routing for registry versions
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+async def admin_models():
+    """Active/candidate versions, available registry versions and per-version stats"""
+    return registry.status()
+
+
+@app.post("/admin/models/{kind}/activate", status_code=202, dependencies=[Depends(require_admin)])
+async def admin_activate(kind: str, version: str, background_tasks: BackgroundTasks):
+    """Load and warm up a version in the background, then swap it in"""
+    if kind not in ("classifier", "detector"):
+        raise HTTPException(status_code=404, detail=f"Unknown model kind: {kind}")
+    if version not in registry.list_versions(kind):
+        raise HTTPException(status_code=404, detail=f"No {kind} version '{version}' in the registry.")
+    background_tasks.add_task(registry.activate, kind, version)
+    return {"status": "loading", "kind": kind, "version": version}
+
+
+@app.post("/admin/models/{kind}/candidate", status_code=202, dependencies=[Depends(require_admin)])
+async def admin_candidate(kind: str, version: str, background_tasks: BackgroundTasks, mode: str = "shadow", percent: float = 10.0):
+    """Route percent% of traffic to a version as a shadow (compared only) or canary (served, and compared against the active version)"""
+    if kind not in ("classifier", "detector"):
+        raise HTTPException(status_code=404, detail=f"Unknown model kind: {kind}")
+    if version not in registry.list_versions(kind):
+        raise HTTPException(status_code=404, detail=f"No {kind} version '{version}' in the registry.")
+    if mode not in ("shadow", "canary") or not 0 <= percent <= 100:
+        raise HTTPException(status_code=400, detail="mode must be shadow or canary and percent between 0 and 100.")
+    background_tasks.add_task(registry.set_candidate, kind, version, mode, percent)
+    return {"status": "loading", "kind": kind, "version": version, "mode": mode, "percent": percent}
+
+
+@app.post("/admin/models/{kind}/promote", dependencies=[Depends(require_admin)])
+async def admin_promote(kind: str):
+    """Make the current candidate the active version"""
+    try:
+        registry.promote_candidate(kind)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return registry.status()[kind]
+
+
+@app.delete("/admin/models/{kind}/candidate", dependencies=[Depends(require_admin)])
+async def admin_clear_candidate(kind: str):
+    """Stop routing traffic to the candidate"""
+    try:
+        registry.clear_candidate(kind)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return registry.status()[kind]
+
+
+@app.post("/similar")
+async def similar(
+    file: UploadFile = File(...),
+    k: int = Query(10, ge=1, description="Number of neighbours to return"),
+    project_id: Optional[str] = Query(None, description="Only search this project (default: all projects)"),
+    lane: str = Depends(lane_for("interactive")),
+    ctx: RequestContext = Depends(request_context)
+):
+    """
+    Find the k most similar previously classified images, by cosine similarity
+    of the active classifier's pooled features. Only images the full
+    classifier ran on are indexed (not ones answered by the fast tier).
+    """
+    try:
+        contents = await file.read()
+        
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image.")
+        
+        if len(contents) > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413, 
+                detail=f"File too large. Max {settings.MAX_FILE_SIZE / (1024*1024):.0f}MB."
+            )
+        
+        if k > settings.SIMILAR_MAX_K:
+            raise HTTPException(status_code=400, detail=f"k cannot exceed {settings.SIMILAR_MAX_K}.")
+        
+        if not settings.EMBEDDING_INDEX_DIR:
+            raise HTTPException(status_code=404, detail="Similarity search is disabled (EMBEDDING_INDEX_DIR not set).")
+        
+        try:
+            Image.open(io.BytesIO(contents))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid or corrupted image file.")
+        
+        handle = registry.active("classifier")
+        index = embedding_index(handle.version)
+        if index is None or len(index) == 0:
+            return {"model_version": handle.version, "indexed": 0, "results": []}
+        
+        vector = await scheduler.run(lane, embed_image, handle.model, contents, ctx=ctx)
+        started = time.perf_counter()
+        matches = await asyncio.to_thread(index.search, vector, k, project_id)
+        metrics.observe("similar.search", time.perf_counter() - started)
+        add_stage("search", time.perf_counter() - started)
+        
+        return {
+            "model_version": handle.version,
+            "indexed": len(index),
+            "results": [{**meta, "similarity": score} for meta, score in matches]
+        }
+        
+    except HTTPException:
+        raise
+    except LaneFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RequestCancelled as e:
+        logger.warning("%s", e)
+        raise cancelled_http_exception(e)
+    except Exception as e:
+        logger.error("Similarity search error: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Similarity search failed: {str(e)}")
+
+
+@app.get("/stats")
+async def get_stats(
+    project_id: Optional[str] = Query(None, description="Only this project (default: all projects)"),
+    x_project_id: Optional[str] = Header(None),
+    kind: Optional[str] = Query(None, description="prediction or detection"),
+    start: Optional[date] = Query(None, description="First day (UTC), inclusive"),
+    end: Optional[date] = Query(None, description="Last day (UTC), inclusive"),
+):
+    """Species counts and mean confidence by species, day and project, read from the incremental rollups"""
+    if result_store is None:
+        raise HTTPException(status_code=404, detail="Result store is disabled (RESULT_STORE_PATH not set).")
+    if kind not in (None, "prediction", "detection"):
+        raise HTTPException(status_code=400, detail="kind must be prediction or detection.")
+    
+    started = time.perf_counter()
+    project = x_project_id or project_id
+    stats = result_store.stats(
+        project_id=project,
+        kind=kind,
+        start=start.isoformat() if start else None,
+        end=end.isoformat() if end else None
+    )
+    return {
+        "project_id": project,
+        "kind": kind,
+        **stats,
+        "query_ms": (time.perf_counter() - started) * 1000
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters and latency summaries"""
+    metrics.set_gauge("logging.dropped", log_handler.dropped)
+    snapshot = metrics.snapshot()
+    if prefilter is not None:
+        snapshot["prefilter"] = prefilter.snapshot()
+    if renditions is not None:
+        snapshot["renditions"] = renditions.snapshot()
+    return snapshot
+
+
+@app.get("/autotune")
+async def get_autotune():
+    """Current batch sizes, slots and threads, the measurements behind them and recent changes"""
+    return autotuner.snapshot()
+
 # Root
 @app.get("/")
 async def root():
@@ -415,7 +1468,15 @@ async def root():
             "predict_batch": "/predict/batch - Batch species classification",
             "detect": "/detect - Multi-species detection with bounding boxes",
             "detect_batch": "/detect/batch - Batch multi-species detection",
+            "predict_urls": "/predict/urls - Batch classification of images fetched by URL or bucket key",
+            "detect_urls": "/detect/urls - Batch detection of images fetched by URL or bucket key",
+            "analyze": "/analyze - Detection followed by batched classification of each box",
+            "similar": "/similar - Nearest previously classified images",
+            "stats": "/stats - Species counts per project and day",
+            "renditions": "/renditions/{id}?size=thumb - Downscaled WebP/JPEG copies of uploaded and annotated images",
             "health": "/health - Health check",
+            "metrics": "/metrics - Counters and latency summaries",
+            "autotune": "/autotune - Current batch size / concurrency decisions",
             "docs": "/docs - Interactive API documentation"
         }
     }
\ No newline at end of file
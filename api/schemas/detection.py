@@ -0,0 +1,24 @@
+# schemas/detection.py
+from pydantic import BaseModel
+from typing import List, Optional
+
+# Detector settings for a single request (filled from query params + server defaults)
+class DetectionParams(BaseModel):
+    imgsz: int
+    conf: float
+    iou: float
+    max_det: int
+    classes: Optional[List[int]] = None
+    prefilter: bool = True  # Let the empty-frame gate skip the detector (when PREFILTER_ENABLED)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "imgsz": 320,
+                "conf": 0.25,
+                "iou": 0.7,
+                "max_det": 100,
+                "classes": [0, 4],
+                "prefilter": True
+            }
+        }
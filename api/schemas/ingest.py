@@ -0,0 +1,16 @@
+# schemas/ingest.py
+from pydantic import BaseModel
+from typing import List
+
+# Images to fetch server-side instead of uploading them
+class IngestRequest(BaseModel):
+    urls: List[str] = []
+    keys: List[str] = []  # Object-store keys, resolved with OBJECT_STORE_URL_TEMPLATE
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "urls": ["https://firebasestorage.googleapis.com/v0/b/aquasense.appspot.com/o/uploads%2Fframe_001.jpg?alt=media"],
+                "keys": ["uploads/frame_002.jpg"]
+            }
+        }
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# The API imports its modules as top-level packages (utils, schemas, config), as when run from api/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,145 @@
+# tests/test_fetch.py
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.fetch import FetchError, ImageFetcher
+
+MAX_BYTES = 1000
+TIMEOUT = 0.5
+IMAGE = b"\xff\xd8" + b"x" * 500
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Local stand-in for the object store."""
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path in ("/image.jpg", "/o/site%2Fframe%201.jpg"):
+            self.reply(200, IMAGE)
+        elif path == "/declared-large.jpg":
+            self.reply(200, b"x" * (MAX_BYTES + 1))
+        elif path == "/streamed-large.jpg":
+            # No Content-Length: the limit has to be enforced while streaming
+            self.send_response(200)
+            self.end_headers()
+            for _ in range(4):
+                self.wfile.write(b"x" * (MAX_BYTES // 2))
+        elif path == "/slow.jpg":
+            time.sleep(TIMEOUT * 4)
+            self.reply(200, IMAGE)
+        elif path == "/redirect.jpg":
+            self.send_response(302)
+            self.send_header("Location", "/image.jpg")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.reply(404, b"not found")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_fetcher(**options):
+    return ImageFetcher(
+        max_bytes=options.pop("max_bytes", MAX_BYTES),
+        timeout=options.pop("timeout", TIMEOUT),
+        max_concurrency=4,
+        max_connections=4,
+        **options
+    )
+
+
+def run(coro_fn, **options):
+    """Run coro_fn(fetcher) on a fresh fetcher and event loop, closing the client afterwards."""
+    async def main():
+        fetcher = make_fetcher(**options)
+        try:
+            return await coro_fn(fetcher)
+        finally:
+            await fetcher.close()
+    return asyncio.run(main())
+
+
+def test_fetch_returns_body(server):
+    assert run(lambda f: f.fetch(f"{server}/image.jpg")) == IMAGE
+
+
+def test_declared_size_over_limit(server):
+    with pytest.raises(FetchError, match="too large"):
+        run(lambda f: f.fetch(f"{server}/declared-large.jpg"))
+
+
+def test_streamed_size_over_limit(server):
+    with pytest.raises(FetchError, match=f"over {MAX_BYTES} bytes"):
+        run(lambda f: f.fetch(f"{server}/streamed-large.jpg"))
+
+
+def test_timeout(server):
+    with pytest.raises(FetchError, match="Timed out"):
+        run(lambda f: f.fetch(f"{server}/slow.jpg"))
+
+
+def test_http_errors_and_redirects_are_not_followed(server):
+    with pytest.raises(FetchError, match="HTTP 404"):
+        run(lambda f: f.fetch(f"{server}/missing.jpg"))
+    with pytest.raises(FetchError, match="HTTP 302"):
+        run(lambda f: f.fetch(f"{server}/redirect.jpg"))
+
+
+def test_host_allow_list(server):
+    assert run(lambda f: f.fetch(f"{server}/image.jpg"), allowed_hosts=["127.0.0.1"]) == IMAGE
+    with pytest.raises(FetchError, match="Host not allowed"):
+        run(lambda f: f.fetch(f"{server.replace('127.0.0.1', 'localhost')}/image.jpg"), allowed_hosts=["127.0.0.1"])
+    with pytest.raises(FetchError, match="Only http"):
+        run(lambda f: f.fetch("file:///etc/passwd"))
+
+
+def test_key_template():
+    fetcher = make_fetcher(key_url_template="https://store.example/o/{key}?alt=media")
+    assert fetcher.key_url("site/frame 1.jpg") == "https://store.example/o/site%2Fframe%201.jpg?alt=media"
+    for key in ("", "/abs.jpg", "site/../secret.jpg"):
+        with pytest.raises(FetchError, match="Invalid key"):
+            fetcher.key_url(key)
+    with pytest.raises(FetchError, match="not enabled"):
+        make_fetcher().key_url("a.jpg")
+
+
+def test_fetch_all_keeps_order_and_skips_allow_list_for_keys(server):
+    results = run(
+        lambda f: f.fetch_all(urls=[f"{server}/image.jpg", f"{server}/missing.jpg"], keys=["site/frame 1.jpg"]),
+        allowed_hosts=["storage.googleapis.com", "127.0.0.1"],
+        key_url_template=f"{server}/o/{{key}}?alt=media"
+    )
+    assert [source for source, _ in results] == [f"{server}/image.jpg", f"{server}/missing.jpg", "site/frame 1.jpg"]
+    assert results[0][1] == IMAGE
+    assert isinstance(results[1][1], FetchError)
+    assert results[2][1] == IMAGE
+
+    # Key URLs are built by the server itself, so they aren't checked against the allow-list
+    results = run(
+        lambda f: f.fetch_all(keys=["site/frame 1.jpg"]),
+        allowed_hosts=["storage.googleapis.com"],
+        key_url_template=f"{server}/o/{{key}}?alt=media"
+    )
+    assert results == [("site/frame 1.jpg", IMAGE)]
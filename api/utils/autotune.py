@@ -0,0 +1,230 @@
+# utils/autotune.py
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Grow only while comfortably inside the targets, so decisions don't flap around them
+HEADROOM = 0.7
+# A batch-size increase must cut per-image time by at least this much to be kept
+MIN_GAIN = 0.05
+# Ticks a batch size stays put after a back-off or a reverted increase
+HOLD_TICKS = 6
+
+def current_rss_mb():
+    """Resident memory of this process, or None where it can't be read cheaply."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def default_rss_limit_mb(fraction=0.8):
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) * fraction
+    except (ValueError, AttributeError, OSError):
+        return None
+
+class Knob:
+    def __init__(self, value, low, high):
+        self.low, self.high = low, high
+        self.value = min(max(value, low), high)
+
+    def set(self, value):
+        value = min(max(int(value), self.low), self.high)
+        changed = value != self.value
+        self.value = value
+        return changed
+
+    def describe(self):
+        return {"value": self.value, "min": self.low, "max": self.high}
+
+class Autotuner:
+    """
+    Picks the classifier/detector batch sizes, inference slots and torch
+    threads at runtime. Every interval it looks at the model-call latencies
+    recorded since the last tick and the process RSS:
+
+    - RSS over the limit halves both batch sizes and drops a slot;
+    - a stage whose p95 is over target halves its batch size, or drops a
+      slot once the batch size is at its minimum;
+    - with headroom on both, a stage that is filling its batches grows them,
+      keeping the increase only if it cuts the time per image;
+    - work queued behind the scheduler adds a slot;
+    - threads are split evenly between the slots.
+
+    Disabled, it just holds the configured values.
+    """
+
+    def __init__(self, scheduler, classify_batch, detect_batch, slots, threads,
+                 p95_targets, rss_limit_mb=None, enabled=False, history=50):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.knobs = {
+            "classify_batch": Knob(*classify_batch),
+            "detect_batch": Knob(*detect_batch),
+            "slots": Knob(*slots),
+            "threads": Knob(*threads),
+        }
+        self.stage_knobs = {"classify": "classify_batch", "detect": "detect_batch"}
+        self.p95_targets = dict(p95_targets)  # stage -> seconds
+        self.rss_limit_mb = rss_limit_mb
+        self.cpu_count = os.cpu_count() or 1
+        self.history = deque(maxlen=history)
+        self.last = {}  # Measurements behind the latest decisions
+        self._samples = defaultdict(list)  # stage -> [(seconds, items)] since the last tick
+        self._lock = threading.Lock()
+        self._trial = {}  # knob -> (previous value, its seconds per image) while an increase is on trial
+        self._hold = defaultdict(int)
+        self._task = None
+        self.scheduler.resize(self.knobs["slots"].value)
+
+    def value(self, name):
+        return self.knobs[name].value
+
+    def observe(self, stage, seconds, items=1):
+        """Record one model call of a stage (e.g. a classifier forward over items images)."""
+        with self._lock:
+            self._samples[stage].append((seconds, items))
+
+    def apply_threads(self):
+        """Runs on the inference thread before each call: torch's thread count is per thread."""
+        threads = self.knobs["threads"].value
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+
+    def _decide(self, name, value, reason):
+        old = self.knobs[name].value
+        if self.knobs[name].set(value):
+            self.history.append({
+                "at": datetime.now(timezone.utc).isoformat(),
+                "knob": name,
+                "from": old,
+                "to": self.knobs[name].value,
+                "reason": reason
+            })
+            logger.info("Autotune: %s %s -> %s (%s)", name, old, self.knobs[name].value, reason)
+            return True
+        return False
+
+    def _measure(self):
+        with self._lock:
+            samples, self._samples = self._samples, defaultdict(list)
+        stages = {}
+        for stage, calls in samples.items():
+            times = sorted(seconds for seconds, _ in calls)
+            items = sum(n for _, n in calls)
+            stages[stage] = {
+                "calls": len(calls),
+                "p95_s": times[min(int(0.95 * len(times)), len(times) - 1)],
+                "per_image_s": sum(times) / max(items, 1),
+                "largest_batch": max(n for _, n in calls),
+            }
+        return stages
+
+    def _tune_batch(self, stage, m, memory_ok, room):
+        name = self.stage_knobs[stage]
+        knob = self.knobs[name]
+        target = self.p95_targets.get(stage)
+        if self._hold[name] > 0:
+            self._hold[name] -= 1
+
+        if name in self._trial:
+            # Judge the last increase on the time per image it produced
+            previous, previous_per_image = self._trial.pop(name)
+            if m["per_image_s"] > previous_per_image * (1 - MIN_GAIN):
+                self._decide(name, previous, f"no throughput gain at {knob.value}")
+                self._hold[name] = HOLD_TICKS
+                return
+
+        if target is not None and m["p95_s"] > target:
+            if not self._decide(name, knob.value // 2, f"{stage} p95 {m['p95_s'] * 1000:.0f}ms over target"):
+                # Already at the smallest batch: the calls themselves are contending
+                self._decide("slots", self.knobs["slots"].value - 1, f"{stage} p95 over target at minimum batch")
+            self._hold[name] = HOLD_TICKS
+            return
+
+        within = target is None or m["p95_s"] < target * HEADROOM
+        if memory_ok and room and within and self._hold[name] == 0 and m["largest_batch"] >= knob.value:
+            previous = knob.value
+            if self._decide(name, knob.value + max(1, knob.value // 4), f"{stage} has headroom"):
+                self._trial[name] = (previous, m["per_image_s"])
+
+    def tick(self):
+        """One round of measurements and decisions. Called every interval from run()."""
+        stages = self._measure()
+        rss = current_rss_mb()
+        memory_ok = rss is None or self.rss_limit_mb is None or rss < self.rss_limit_mb
+        room = rss is None or self.rss_limit_mb is None or rss < self.rss_limit_mb * HEADROOM
+
+        if not memory_ok:
+            reason = f"RSS {rss:.0f}MB over {self.rss_limit_mb:.0f}MB"
+            for name in self.stage_knobs.values():
+                self._decide(name, self.knobs[name].value // 2, reason)
+                self._trial.pop(name, None)
+                self._hold[name] = HOLD_TICKS
+            self._decide("slots", self.knobs["slots"].value - 1, reason)
+        else:
+            for stage, m in stages.items():
+                if stage in self.stage_knobs:
+                    self._tune_batch(stage, m, memory_ok, room)
+
+            over = any(
+                stages[s]["p95_s"] > self.p95_targets[s]
+                for s in stages if self.p95_targets.get(s) is not None
+            )
+            queued = sum(self.scheduler.queue_depths().values())
+            if queued and room and not over:
+                self._decide("slots", self.knobs["slots"].value + 1, f"{queued} calls queued")
+
+        self._decide("threads", self.cpu_count // self.knobs["slots"].value, "threads split across slots")
+        self.scheduler.resize(self.knobs["slots"].value)
+        self.last = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "rss_mb": rss,
+            "stages": {
+                stage: {
+                    "calls": m["calls"],
+                    "p95_ms": m["p95_s"] * 1000,
+                    "per_image_ms": m["per_image_s"] * 1000,
+                    "largest_batch": m["largest_batch"],
+                }
+                for stage, m in stages.items()
+            }
+        }
+
+    async def run(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Autotune tick failed: %s", e, exc_info=True)
+
+    def start(self, interval):
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(interval))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self):
+        return {
+            "enabled": self.enabled,
+            "knobs": {name: knob.describe() for name, knob in self.knobs.items()},
+            "targets": {
+                "p95_ms": {stage: seconds * 1000 for stage, seconds in self.p95_targets.items() if seconds is not None},
+                "rss_limit_mb": self.rss_limit_mb
+            },
+            "rss_mb": current_rss_mb(),
+            "last_tick": self.last,
+            "history": list(self.history)
+        }
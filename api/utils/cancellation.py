@@ -0,0 +1,60 @@
+# utils/cancellation.py
+import time
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request
+
+from config import settings
+
+class RequestCancelled(Exception):
+    """The client went away or the request ran past its deadline."""
+
+    def __init__(self, reason, stage):
+        super().__init__(f"Request cancelled ({reason}) before {stage}")
+        self.reason = reason  # "deadline" or "disconnected"
+        self.stage = stage
+
+# Deadline and client-disconnect state for one request, checked between pipeline stages
+class RequestContext:
+    def __init__(self, request: Request, deadline: Optional[float] = None, metrics=None):
+        self.request = request
+        self.deadline = deadline  # time.monotonic() value, or None for no deadline
+        self.metrics = metrics
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    async def cancel_reason(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "deadline"
+        if await self.request.is_disconnected():
+            return "disconnected"
+        return None
+
+    async def check(self, stage):
+        """Raise RequestCancelled if there's no longer any point doing stage."""
+        reason = await self.cancel_reason()
+        if reason is not None:
+            if self.metrics is not None:
+                self.metrics.increment(f"cancelled.{reason}")
+            raise RequestCancelled(reason, stage)
+
+def request_context_dependency(metrics=None):
+    """Build the dependency that creates a RequestContext from X-Request-Timeout or REQUEST_TIMEOUT_SECONDS."""
+    def dependency(request: Request, x_request_timeout: Optional[float] = Header(None)) -> RequestContext:
+        timeout = settings.REQUEST_TIMEOUT_SECONDS if x_request_timeout is None else x_request_timeout
+        if timeout is not None:
+            if timeout <= 0:
+                raise HTTPException(status_code=400, detail="X-Request-Timeout must be positive.")
+            timeout = min(timeout, settings.REQUEST_TIMEOUT_MAX_SECONDS)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return RequestContext(request, deadline, metrics)
+    return dependency
+
+def cancelled_http_exception(error: RequestCancelled):
+    # 499 is the de-facto "client closed request" code; nobody will read it anyway
+    if error.reason == "disconnected":
+        return HTTPException(status_code=499, detail=str(error))
+    return HTTPException(status_code=504, detail=str(error))
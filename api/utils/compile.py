@@ -0,0 +1,88 @@
+# utils/compile.py
+import functools
+import logging
+import os
+import time
+
+import torch
+import torch._dynamo.exc
+import torch._inductor.exc
+
+logger = logging.getLogger(__name__)
+
+# What torch.compile raises when it can't build a graph (tracing, lowering or the C++ toolchain).
+# Anything else comes from running the model and is the caller's to handle.
+COMPILE_ERRORS = (torch._dynamo.exc.TorchDynamoException, torch._inductor.exc.InductorError)
+
+def configure_compile_cache(cache_dir):
+    """
+    Keep Inductor's compiled graphs in cache_dir instead of /tmp, so a
+    restart (or another worker) with the same model and torch version loads
+    the generated kernels instead of compiling them again.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = os.path.abspath(cache_dir)
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+class CompiledForward:
+    """
+    Stands in for fn: runs the torch.compile'd version and, the first time
+    compilation fails (compiler missing, unsupported op, a failed recompile
+    for a new shape), logs it and runs eagerly from then on. Errors from the
+    model itself - including inputs it rejects while being traced - propagate
+    without disabling the compiled path.
+    """
+
+    def __init__(self, fn, mode="default", dynamic=None):
+        self.eager = fn
+        self.compiled = torch.compile(fn, mode=mode, dynamic=dynamic)
+        self.error = None
+
+    def __call__(self, *args, **kwargs):
+        if self.error is None:
+            try:
+                return self.compiled(*args, **kwargs)
+            except COMPILE_ERRORS as e:
+                # Eager raises too if the input is at fault, and the compiled path stays on
+                result = self.eager(*args, **kwargs)
+                self.error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+                logger.warning("Compilation failed, falling back to eager: %s", self.error, exc_info=True)
+                return result
+        return self.eager(*args, **kwargs)
+
+def compile_classifier(model, mode="default", dynamic=None):
+    """
+    Compile model's forward and its features+logits path (what
+    embed_and_predict runs when embeddings are indexed) in place. The model
+    keeps its class and submodules, and compilation itself happens lazily on
+    the first calls - see warmup_compiled.
+    """
+    # Imported here so the training scripts can load this module by path (see machine_learning_models/compile.py)
+    from utils.inference import features_and_logits
+
+    model.forward = CompiledForward(model.forward, mode=mode, dynamic=dynamic)
+    model.compiled_features_and_logits = CompiledForward(functools.partial(features_and_logits, model), mode=mode, dynamic=dynamic)
+    return model
+
+def compile_status(model):
+    forward = getattr(model, "forward", None)
+    if not isinstance(forward, CompiledForward):
+        return "eager"
+    return "eager (compile failed)" if forward.error else "compiled"
+
+def warmup_compiled(model, batch_sizes, image_size=224, embeddings=False):
+    """
+    Run model once per batch size so every graph serving needs is built
+    before the first request. Batch size 1 gets its own graph; the next
+    size marks the batch dimension dynamic, which then covers the rest.
+    With embeddings, the features+logits graph is built the same way.
+    """
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        with torch.no_grad():
+            batch = torch.zeros(batch_size, 3, image_size, image_size)
+            model(batch)
+            if embeddings:
+                model.compiled_features_and_logits(batch)
+        logger.info("Classifier warm-up at batch size %d: %.1fs (%s)", batch_size, time.perf_counter() - start, compile_status(model))
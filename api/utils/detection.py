@@ -0,0 +1,121 @@
+# utils/detection.py
+import base64
+from typing import Optional
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, Query
+
+from config import settings
+from schemas.detection import DetectionParams
+
+# Class ID to species name mapping for detection model
+CLASS_MAPPING = {
+    0: 'Crab',
+    1: 'Eel',
+    2: 'Flatfish',
+    3: 'Roundfish',
+    4: 'Scallop',
+    5: 'Skate',
+    6: 'Whelk'
+}
+
+# Dependency that turns query parameters into validated detector settings
+def detection_params(
+    imgsz: Optional[int] = Query(None, description="Inference size in pixels (see DETECT_ALLOWED_IMGSZ)"),
+    conf: Optional[float] = Query(None, ge=0.0, le=1.0, description="Minimum box confidence"),
+    iou: Optional[float] = Query(None, ge=0.0, le=1.0, description="NMS IoU threshold"),
+    max_det: Optional[int] = Query(None, ge=1, description="Maximum detections per image"),
+    classes: Optional[str] = Query(None, description="Comma-separated species to keep, e.g. Crab,Scallop"),
+    prefilter: bool = Query(True, description="Allow frames scored as empty to skip the detector (false forces a detector pass)"),
+) -> DetectionParams:
+    imgsz = settings.DETECT_IMGSZ if imgsz is None else imgsz
+    if imgsz not in settings.DETECT_ALLOWED_IMGSZ:
+        raise HTTPException(
+            status_code=400,
+            detail=f"imgsz must be one of {settings.DETECT_ALLOWED_IMGSZ}."
+        )
+
+    max_det = settings.DETECT_MAX_DET if max_det is None else max_det
+    if max_det > settings.DETECT_MAX_DET_CAP:
+        raise HTTPException(
+            status_code=400,
+            detail=f"max_det cannot exceed {settings.DETECT_MAX_DET_CAP}."
+        )
+
+    class_ids = None
+    if classes:
+        name_to_id = {name.lower(): cls for cls, name in CLASS_MAPPING.items()}
+        requested = [c.strip().lower() for c in classes.split(",") if c.strip()]
+        unknown = [c for c in requested if c not in name_to_id]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown species in classes: {', '.join(unknown)}. Valid: {', '.join(CLASS_MAPPING.values())}."
+            )
+        class_ids = sorted({name_to_id[c] for c in requested})
+
+    return DetectionParams(
+        imgsz=imgsz,
+        conf=settings.DETECT_CONF if conf is None else conf,
+        iou=settings.DETECT_IOU if iou is None else iou,
+        max_det=max_det,
+        classes=class_ids,
+        prefilter=prefilter,
+    )
+
+def run_detection(detection_model, image, params: DetectionParams):
+    return detection_model(
+        image,
+        imgsz=params.imgsz,
+        conf=params.conf,
+        iou=params.iou,
+        max_det=params.max_det,
+        classes=params.classes,
+        verbose=False,
+    )
+
+# Convert Ultralytics results into the API's detection dicts
+def parse_detections(results):
+    detections = []
+    for result in results:
+        boxes = result.boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        confs = boxes.conf.cpu().numpy()
+        classes = boxes.cls.cpu().numpy().astype(int)
+        for box, conf, cls in zip(xyxy, confs, classes):
+            detections.append({
+                "species": CLASS_MAPPING.get(int(cls), f"Unknown_{cls}"),
+                "confidence": float(conf),
+                "bbox": {
+                    "x1": float(box[0]),
+                    "y1": float(box[1]),
+                    "x2": float(box[2]),
+                    "y2": float(box[3])
+                }
+            })
+    return detections
+
+# Annotated image with bounding boxes as a base64 JPEG
+def annotate(results):
+    annotated_image = results[0].plot()
+    _, buffer = cv2.imencode('.jpg', annotated_image)
+    return base64.b64encode(buffer).decode('utf-8')
+
+# Draw already-known detections onto an image (used when a result is reused for a near-duplicate frame)
+def draw_boxes(image, detections):
+    canvas = cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    for detection in detections:
+        bbox = detection["bbox"]
+        p1 = (int(bbox["x1"]), int(bbox["y1"]))
+        p2 = (int(bbox["x2"]), int(bbox["y2"]))
+        cv2.rectangle(canvas, p1, p2, (255, 56, 56), 2)
+        label = f"{detection['species']} {detection['confidence']:.2f}"
+        cv2.putText(canvas, label, (p1[0], max(p1[1] - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 56, 56), 1)
+    _, buffer = cv2.imencode('.jpg', canvas)
+    return base64.b64encode(buffer).decode('utf-8')
+
+# Run one dummy frame at every allowed size so the first real request doesn't pay for setup
+def warmup_detector(detection_model, sizes):
+    for imgsz in sizes:
+        detection_model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
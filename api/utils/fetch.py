@@ -0,0 +1,85 @@
+# utils/fetch.py
+import asyncio
+from urllib.parse import quote, urlparse
+
+import httpx
+
+class FetchError(Exception):
+    """An image could not be fetched (bad URL, disallowed host, HTTP error, too large, timeout)."""
+
+class ImageFetcher:
+    """
+    Concurrent image downloads over one pooled AsyncClient, so keep-alive
+    connections to the object store are reused across requests. Each body is
+    streamed and abandoned as soon as it exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes, timeout, max_concurrency, max_connections, allowed_hosts=None, key_url_template=None):
+        self.max_bytes = max_bytes
+        self.allowed_hosts = {host.lower() for host in allowed_hosts or []}
+        self.key_url_template = key_url_template
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=False
+        )
+
+    def key_url(self, key):
+        """Object-store URL for a bucket key, e.g. Firebase's .../o/{key}?alt=media."""
+        if not self.key_url_template:
+            raise FetchError("Bucket keys are not enabled (OBJECT_STORE_URL_TEMPLATE not set)")
+        if not key or key.startswith("/") or ".." in key.split("/"):
+            raise FetchError(f"Invalid key: {key}")
+        return self.key_url_template.format(key=quote(key, safe=""))
+
+    def check_url(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise FetchError(f"Only http(s) URLs can be fetched: {url}")
+        if self.allowed_hosts and parsed.hostname.lower() not in self.allowed_hosts:
+            raise FetchError(f"Host not allowed: {parsed.hostname}")
+
+    async def fetch(self, url, trusted=False):
+        """Download one image. trusted skips the host allow-list (used for key URLs we built ourselves)."""
+        if not trusted:
+            self.check_url(url)
+        async with self._semaphore:
+            try:
+                async with self._client.stream("GET", url) as response:
+                    if response.status_code != 200:
+                        raise FetchError(f"HTTP {response.status_code} from {url}")
+                    length = response.headers.get("content-length")
+                    if length is not None and length.isdigit() and int(length) > self.max_bytes:
+                        raise FetchError(f"Image too large ({int(length)} bytes)")
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise FetchError(f"Image too large (over {self.max_bytes} bytes)")
+                        chunks.append(chunk)
+                    return b"".join(chunks)
+            except httpx.TimeoutException:
+                raise FetchError(f"Timed out fetching {url}")
+            except httpx.HTTPError as e:
+                raise FetchError(f"Could not fetch {url}: {e}")
+
+    async def fetch_all(self, urls=(), keys=()):
+        """
+        Fetch URLs and bucket keys concurrently. Returns (source, bytes or
+        FetchError) pairs in request order: URLs first, then keys.
+        """
+        async def one(source, is_key):
+            try:
+                if is_key:
+                    return await self.fetch(self.key_url(source), trusted=True)
+                return await self.fetch(source)
+            except FetchError as e:
+                return e
+
+        sources = [(url, False) for url in urls] + [(key, True) for key in keys]
+        fetched = await asyncio.gather(*[one(source, is_key) for source, is_key in sources])
+        return [(source, result) for (source, _), result in zip(sources, fetched)]
+
+    async def close(self):
+        await self._client.aclose()
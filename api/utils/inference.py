@@ -2,30 +2,215 @@
 import torch
 from torchvision import transforms, models
 from PIL import Image
+import functools
 import io
+import json
+import time
+
+from utils.vit import ViT, VIT_DEFAULTS
+
+# Read the metadata header of an exported .safetensors file (no tensor data is loaded)
+def load_metadata(weights_path):
+    from safetensors import safe_open
+    with safe_open(weights_path, framework="pt") as f:
+        metadata = f.metadata() or {}
+    for key in ("classes", "input_size", "resize_size", "mean", "std", "vit_config"):
+        if key in metadata:
+            metadata[key] = json.loads(metadata[key])
+    return metadata
+
+# Build an (untrained) classifier with a 7-way head for the given architecture.
+# vit_config holds the ViT's shape (patch size, width, heads) as saved in its checkpoint.
+def build_model(arch="resnet50", num_classes=7, vit_config=None):
+    if arch in ("resnet50", "resnet18"):
+        model = getattr(models, arch)(weights=None)
+        model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+    elif arch in ("mobilenet_v3_small", "mobilenet_v3_large", "efficientnet_b0"):
+        model = getattr(models, arch)(weights=None)
+        model.classifier[-1] = torch.nn.Linear(model.classifier[-1].in_features, num_classes)
+    elif arch == "vit":
+        model = ViT(num_classes, **{**VIT_DEFAULTS, **(vit_config or {})})
+    else:
+        raise ValueError(f"Unsupported classifier architecture: {arch}")
+    return model
 
 # Load ML model for species prediction
-def load_model(checkpoint_path):
-    from torchvision.models import resnet50
-    model = resnet50(weights=None)
-    model.fc = torch.nn.Linear(model.fc.in_features, 7)
-    
-    checkpoint = torch.load(checkpoint_path, map_location='cpu')
-    
+def load_model(checkpoint_path, arch="resnet50"):
+    if str(checkpoint_path).endswith(".safetensors"):
+        # Exported weights-only file: memory-mapped, no optimizer state to skip over
+        from safetensors.torch import load_file
+        metadata = load_metadata(checkpoint_path)
+        classes = metadata.get("classes", species_classes)
+        if list(classes) != species_classes:
+            raise ValueError(f"Checkpoint classes {classes} do not match API classes {species_classes}")
+        arch = metadata.get("arch", arch)
+
+        state_dict = load_file(checkpoint_path, device="cpu")
+        # The CPU path serves in float32, so a float16 (--half) export is upcast here into a
+        # regular in-memory copy; only float32 exports stay memory-mapped (zero-copy)
+        state_dict = {k: (v.float() if v.is_floating_point() and v.dtype != torch.float32 else v) for k, v in state_dict.items()}
+
+        # Build on the meta device so we don't allocate and initialise weights we're about to replace
+        with torch.device("meta"):
+            model = build_model(arch, len(species_classes), metadata.get("vit_config"))
+        model.load_state_dict(state_dict, assign=True)
+        model.eval()
+        return model
+
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', mmap=True)
+
     # Try loading with 'model_state_dict' key first, otherwise load directly
     if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        model = build_model(checkpoint.get('arch', arch), len(species_classes), checkpoint.get('vit_config'))
         model.load_state_dict(checkpoint['model_state_dict'])
     else:
+        model = build_model(arch, len(species_classes))
         model.load_state_dict(checkpoint)
-    
+
     model.eval()
     return model
 
+# One dummy forward pass so the first request doesn't pay for lazy initialisation
+def warmup_classifier(model):
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224))
+
 species_classes = ['Crab', 'Eel', 'Flatfish', 'Roundfish', 'Scallop', 'Skate', 'Whelk']
 
-weights = models.ResNet50_Weights.DEFAULT  
+weights = models.ResNet50_Weights.DEFAULT
 transform = weights.transforms()
 
+# Classify every box of one decoded image in a single batched forward pass.
+# image_array is an HxWx3 uint8 RGB array; crops are views into it (no re-encode).
+def classify_crops(model, image_array, boxes, padding=0.0, max_batch=64):
+    if len(boxes) == 0:
+        return []
+    image_t = torch.from_numpy(image_array).permute(2, 0, 1)
+    height, width = image_array.shape[:2]
+
+    crops = []
+    for x1, y1, x2, y2 in boxes:
+        pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+        left, top = min(max(int(x1 - pad_x), 0), width - 1), min(max(int(y1 - pad_y), 0), height - 1)
+        right, bottom = min(int(round(x2 + pad_x)), width), min(int(round(y2 + pad_y)), height)
+        right, bottom = max(right, left + 1), max(bottom, top + 1)
+        crops.append(transform(image_t[:, top:bottom, left:right]))
+
+    results = []
+    with torch.no_grad():
+        for start in range(0, len(crops), max_batch):
+            probs = torch.softmax(model(torch.stack(crops[start:start + max_batch])), dim=1)
+            conf, predicted = probs.max(dim=1)
+            results.extend(
+                (species_classes[p], float(c)) for p, c in zip(predicted.tolist(), conf.tolist())
+            )
+    return results
+
+# Softmax probabilities for a batch of preprocessed images
+def predict_probabilities(model, image_t):
+    with torch.no_grad():
+        return torch.softmax(model(image_t), dim=1)
+
+# Logits plus the pooled features that feed the final layer (2048-d for ResNet-50,
+# the [CLS] token for the ViT).
+# Spelled out rather than using a forward hook, since one model instance serves several threads.
+def features_and_logits(model, image_t):
+    if isinstance(model, models.ResNet):
+        x = model.maxpool(model.relu(model.bn1(model.conv1(image_t))))
+        x = model.layer4(model.layer3(model.layer2(model.layer1(x))))
+        features = torch.flatten(model.avgpool(x), 1)
+        logits = model.fc(features)
+    elif hasattr(model, "features") and hasattr(model, "classifier"):
+        features = torch.flatten(model.avgpool(model.features(image_t)), 1)
+        logits = model.classifier(features)
+    elif isinstance(model, ViT):
+        features = model.forward_features(image_t)
+        logits = model.mlp_head(features)
+    else:
+        raise ValueError(f"Cannot extract embeddings from {model.__class__.__name__}")
+    return logits, features
+
+# Softmax probabilities and features, on the compiled graph when compile_classifier set one up
+def embed_and_predict(model, image_t):
+    run = getattr(model, "compiled_features_and_logits", None) or functools.partial(features_and_logits, model)
+    with torch.no_grad():
+        logits, features = run(image_t)
+    return torch.softmax(logits, dim=1), features
+
+# Embedding of one uploaded image (used as a similarity query)
+def embed_image(model, image_bytes):
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    _, features = embed_and_predict(model, transform(image).unsqueeze(0))
+    return features[0].numpy()
+
+def _summarize(probs, top_k):
+    conf, order = probs.sort(descending=True)
+    return {
+        "predicted_species": species_classes[order[0].item()],
+        "confidence": conf[0].item(),
+        "probabilities": {name: round(p, 6) for name, p in zip(species_classes, probs.tolist())},
+        "top_k": [
+            {"species": species_classes[i], "confidence": c}
+            for i, c in zip(order[:top_k].tolist(), conf[:top_k].tolist())
+        ],
+    }
+
+def classify_tiered(model, image_bytes, fast_model=None, threshold=0.0, top_k=3, metrics=None, embeddings=None):
+    """
+    Confidence-gated classification. The fast model answers first; only images
+    whose top-1 probability is below threshold are re-run on the full model.
+    Without a fast model every image goes straight to the full model.
+    """
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    image_t = transform(image).unsqueeze(0)
+    return classify_tiered_batch(model, image_t, fast_model, threshold, top_k, metrics, embeddings)[0]
+
+def classify_tiered_batch(model, batch_t, fast_model=None, threshold=0.0, top_k=3, metrics=None, embeddings=None):
+    """
+    classify_tiered for an already-preprocessed (N, 3, 224, 224) batch; escalates only the unsure rows.
+    If embeddings is a dict it is filled with {row: feature vector} for the rows the full model ran on.
+    """
+    results = [None] * len(batch_t)
+    fast_results = [None] * len(batch_t)
+    escalate = list(range(len(batch_t)))
+
+    if fast_model is not None:
+        start = time.perf_counter()
+        fast_probs = predict_probabilities(fast_model, batch_t)
+        if metrics is not None:
+            metrics.observe("classifier.fast.seconds", time.perf_counter() - start)
+        escalate = []
+        for i, probs in enumerate(fast_probs):
+            fast_results[i] = _summarize(probs, top_k)
+            if metrics is not None:
+                metrics.increment(f"classifier.fast.confidence_bin.{min(int(fast_results[i]['confidence'] * 10), 9)}")
+            if fast_results[i]["confidence"] >= threshold:
+                if metrics is not None:
+                    metrics.increment("classifier.tier.fast")
+                results[i] = {**fast_results[i], "tier": "fast"}
+            else:
+                escalate.append(i)
+
+    if escalate:
+        start = time.perf_counter()
+        rows = batch_t if len(escalate) == len(batch_t) else batch_t[escalate]
+        if embeddings is None:
+            full_probs = predict_probabilities(model, rows)
+        else:
+            full_probs, features = embed_and_predict(model, rows)
+            embeddings.update(zip(escalate, features.numpy()))
+        if metrics is not None:
+            metrics.observe("classifier.full.seconds", time.perf_counter() - start)
+        for i, probs in zip(escalate, full_probs):
+            result = _summarize(probs, top_k)
+            if metrics is not None:
+                metrics.increment("classifier.tier.full")
+                if fast_results[i] is not None:
+                    agreed = fast_results[i]["predicted_species"] == result["predicted_species"]
+                    metrics.increment("classifier.escalated.agree" if agreed else "classifier.escalated.disagree")
+            results[i] = {**result, "tier": "full"}
+    return results
+
 def predict_species(model, image_bytes, filename):
     image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
     image_t = transform(image).unsqueeze(0)
@@ -34,4 +219,4 @@ def predict_species(model, image_bytes, filename):
         _, predicted = torch.max(outputs, 1)
     species = species_classes[predicted.item()]
     metadata = {"filename": filename}
-    return species, metadata
\ No newline at end of file
+    return species, metadata
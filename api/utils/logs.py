@@ -0,0 +1,186 @@
+# utils/logs.py
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Set per request by RequestLogMiddleware; copied into inference threads by the scheduler
+request_id_var = ContextVar("request_id", default=None)
+_stages_var = ContextVar("stages", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra= and is written out as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sampled"}
+
+def add_stage(name, seconds):
+    """Add time spent in a stage to the current request's timings (no-op outside a request)."""
+    stages = _stages_var.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds * 1000
+
+class stage:
+    """Context manager timing a block into the current request's stage timings."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_stage(self.name, time.perf_counter() - self._start)
+        return False
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the request id of the thread/task that logged them."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class SampleFilter(logging.Filter):
+    """
+    Keeps 1 in every `every` records logged with extra={"sampled": True},
+    counted per call site, so per-file lines in batch loops don't flood the log.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(int(every), 1)
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.every == 1 or not getattr(record, "sampled", False):
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            n = self._counts[key]
+            self._counts[key] = n + 1
+        record.sample_every = self.every
+        return n % self.every == 0
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id, plus any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread; never blocks the caller, drops (and counts) when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the args and render any traceback now, while they're still valid;
+        # the formatting into JSON/text happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(level="INFO", fmt="json", module_levels=None, sample_every=1, queue_size=10000):
+    """
+    Route all logging through a queue to a single writer thread. Returns the
+    queue handler (its .dropped counts records lost to a full queue).
+    """
+    stream = logging.StreamHandler()
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SampleFilter(sample_every))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level.upper())
+
+    listener = logging.handlers.QueueListener(handler.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware giving every request an id (X-Request-Id from the client,
+    or a new one), echoed in the response headers and attached to every log
+    record, and writing one access record with the status, duration and
+    per-stage timings.
+    """
+
+    def __init__(self, app, logger_name="access"):
+        self.app = app
+        self.logger = logging.getLogger(logger_name)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:128] or uuid.uuid4().hex
+        id_token = request_id_var.set(request_id)
+        stages = {}
+        stages_token = _stages_var.set(stages)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.logger.info(
+                "%s %s %s", scope["method"], scope["path"], status,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "stages_ms": {name: round(ms, 2) for name, ms in stages.items()}
+                }
+            )
+            _stages_var.reset(stages_token)
+            request_id_var.reset(id_token)
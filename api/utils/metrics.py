@@ -0,0 +1,57 @@
+# utils/metrics.py
+import threading
+from collections import defaultdict, deque
+
+# In-process counters and latency windows, exposed on /metrics
+class Metrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = defaultdict(lambda: deque(maxlen=self._window))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._timings[name].append(seconds)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, name, q):
+        with self._lock:
+            values = sorted(self._timings.get(name, ()))
+        if not values:
+            return None
+        return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timings = {name: sorted(values) for name, values in self._timings.items()}
+
+        summaries = {}
+        for name, values in timings.items():
+            if not values:
+                continue
+            n = len(values)
+            summaries[name] = {
+                "count": n,
+                "mean_ms": sum(values) / n * 1000,
+                "p50_ms": values[n // 2] * 1000,
+                "p95_ms": values[min(int(0.95 * n), n - 1)] * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+        return {"counters": counters, "gauges": gauges, "timings": summaries}
+
+metrics = Metrics()
@@ -0,0 +1,76 @@
+# utils/phash.py
+import io
+import threading
+import time
+import zlib
+
+import numpy as np
+from PIL import Image
+
+# 64-bit difference hash computed on a tiny grayscale decode of the image
+def dhash(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes))
+    # For JPEGs, draft() makes the decoder produce a downscaled image directly
+    image.draft("L", (64, 64))
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def hamming_distances(hashes, frame_hash):
+    """Bits by which each of hashes differs from frame_hash."""
+    return _popcount(np.asarray(hashes, dtype=np.uint64) ^ np.uint64(frame_hash))
+
+class NearDuplicateIndex:
+    """
+    Bounded ring buffer of recent frame hashes and their results. A lookup
+    XORs the query against every live entry at once and returns the closest
+    result within max_distance bits that is younger than window_seconds.
+    """
+
+    def __init__(self, max_entries=2048, window_seconds=300.0, max_distance=4):
+        self.max_entries = max_entries
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._hashes = np.zeros(max_entries, dtype=np.uint64)
+        self._namespaces = np.zeros(max_entries, dtype=np.uint32)
+        self._timestamps = np.full(max_entries, -np.inf)
+        self._results = [None] * max_entries
+        self._next = 0
+
+    @staticmethod
+    def _namespace_id(namespace):
+        return zlib.crc32(namespace.encode("utf-8"))
+
+    def lookup(self, frame_hash, namespace):
+        """Return (result, distance) for the nearest recent match, or None."""
+        now = time.monotonic()
+        with self._lock:
+            live = (self._timestamps >= now - self.window_seconds) & (self._namespaces == self._namespace_id(namespace))
+            if not live.any():
+                return None
+            candidates = np.nonzero(live)[0]
+            distances = hamming_distances(self._hashes[candidates], frame_hash)
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                return None
+            return self._results[candidates[best]], int(distances[best])
+
+    def add(self, frame_hash, namespace, result):
+        with self._lock:
+            slot = self._next
+            self._hashes[slot] = np.uint64(frame_hash)
+            self._namespaces[slot] = self._namespace_id(namespace)
+            self._timestamps[slot] = time.monotonic()
+            self._results[slot] = result
+            self._next = (slot + 1) % self.max_entries
+
+    def __len__(self):
+        now = time.monotonic()
+        with self._lock:
+            return int((self._timestamps >= now - self.window_seconds).sum())
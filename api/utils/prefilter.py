@@ -0,0 +1,134 @@
+# utils/prefilter.py
+import json
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+# Image statistics the empty-frame gate scores. train_prefilter.py computes them through
+# machine_learning_models/prefilter.py, which loads this file, so training and serving share them.
+FEATURE_SIZE = 96
+TILES = 4
+FEATURE_NAMES = [
+    "mean_r", "mean_g", "mean_b", "std_r", "std_g", "std_b",
+    "gray_std", "grad_mean", "grad_std", "edge_fraction", "laplacian_var", "gray_entropy",
+    "sat_mean", "sat_std",
+    "tile_mean_std", "tile_mean_max_dev", "tile_grad_max_ratio", "tile_std_max_ratio",
+]
+
+
+def frame_features(image, size=FEATURE_SIZE):
+    """
+    Colour, texture and edge statistics of a frame, on a size x size
+    thumbnail. The tile features pick up a single animal on otherwise
+    uniform sand: one tile whose brightness, edges or contrast stand out.
+    """
+    rgb = np.asarray(image.convert("RGB").resize((size, size), Image.BILINEAR), dtype=np.float32) / 255.0
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    gy, gx = np.gradient(gray)
+    grad = np.hypot(gx, gy)
+    laplacian = gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1]
+    hist = np.histogram(gray, bins=32, range=(0.0, 1.0))[0] / gray.size
+    hist = hist[hist > 0]
+    high, low = rgb.max(axis=2), rgb.min(axis=2)
+    saturation = (high - low) / np.maximum(high, 1e-6)
+
+    # Per-tile statistics, (TILES, TILES)
+    t = size // TILES
+    def tiles(a):
+        return a[:t * TILES, :t * TILES].reshape(TILES, t, TILES, t).swapaxes(1, 2).reshape(TILES, TILES, -1)
+    tile_mean = tiles(gray).mean(axis=2)
+    tile_std = tiles(gray).std(axis=2)
+    tile_grad = tiles(grad).mean(axis=2)
+
+    return np.array([
+        *rgb.mean(axis=(0, 1)), *rgb.std(axis=(0, 1)),
+        gray.std(), grad.mean(), grad.std(), (grad > 0.1).mean(), laplacian.var(), -(hist * np.log2(hist)).sum(),
+        saturation.mean(), saturation.std(),
+        tile_mean.std(), np.abs(tile_mean - gray.mean()).max(),
+        tile_grad.max() / max(grad.mean(), 1e-6), tile_std.max() / max(np.median(tile_std), 1e-6),
+    ], dtype=np.float64)
+
+
+class EmptyFrameGate:
+    """
+    Logistic gate over frame_features, trained by train_prefilter.py. Frames
+    scoring below the threshold are treated as empty and skip the detector.
+    The threshold is the highest one on the gate's held-out operating curve
+    that keeps recall_target (default: the one it was trained for) of the
+    occupied frames.
+    """
+
+    def __init__(self, path, recall_target=None, metrics=None):
+        with open(path) as f:
+            gate = json.load(f)
+        self.size = gate["size"]
+        self.mean = np.array(gate["mean"])
+        self.scale = np.array(gate["scale"])
+        self.coef = np.array(gate["coef"])
+        self.intercept = gate["intercept"]
+        self.recall_target = gate["recall_target"] if recall_target is None else recall_target
+        self.point = self._operating_point(gate["curve"], self.recall_target)
+        self.metrics = metrics
+        # Running mean of the detector's seconds per frame, to price the skipped passes
+        self._lock = threading.Lock()
+        self._detector_seconds = 0.0
+        self._detector_frames = 0
+        self.checked = 0
+        self.skipped = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _operating_point(curve, recall_target):
+        # Same choice train_prefilter.py makes, so the gate's own target gives its stored threshold
+        passing = [point for point in curve if point["recall"] >= recall_target]
+        if not passing:
+            return {"threshold": 0.0, "recall": 1.0, "skip_rate": 0.0}
+        return max(passing, key=lambda point: point["threshold"])
+
+    @property
+    def threshold(self):
+        return self.point["threshold"]
+
+    def score(self, image):
+        """Probability that the frame contains an animal."""
+        z = ((frame_features(image, self.size) - self.mean) / self.scale) @ self.coef + self.intercept
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def is_empty(self, image):
+        start = time.perf_counter()
+        empty = self.score(image) < self.threshold
+        with self._lock:
+            self.checked += 1
+            if empty:
+                self.skipped += 1
+                if self._detector_frames:
+                    self.saved_seconds += self._detector_seconds / self._detector_frames
+        if self.metrics is not None:
+            self.metrics.observe("prefilter", time.perf_counter() - start)
+            self.metrics.increment("prefilter.checked")
+            if empty:
+                self.metrics.increment("prefilter.skipped")
+                self.metrics.set_gauge("prefilter.detector_seconds_saved", round(self.saved_seconds, 3))
+        return empty
+
+    def observe_detector(self, seconds, frames=1):
+        with self._lock:
+            self._detector_seconds += seconds
+            self._detector_frames += frames
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "recall_target": self.recall_target,
+                "expected_recall": self.point["recall"],
+                "expected_skip_rate": self.point["skip_rate"],
+                "frames_checked": self.checked,
+                "frames_skipped": self.skipped,
+                "skip_rate": self.skipped / self.checked if self.checked else None,
+                "detector_seconds_saved": self.saved_seconds,
+                "detector_seconds_per_frame": self._detector_seconds / self._detector_frames if self._detector_frames else None,
+            }
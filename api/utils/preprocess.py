@@ -0,0 +1,135 @@
+# utils/preprocess.py
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.inference import transform
+
+# Shape of one preprocessed classifier input (matches the ResNet transform's center crop)
+IMAGE_SHAPE = (3, 224, 224)
+
+def _decode(image_bytes, out):
+    """Decode + transform one image into out (a (3, 224, 224) float32 view). Returns an error or None."""
+    try:
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        out[...] = transform(image).numpy()
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+def _init_worker():
+    # One decode per process; let the process count provide the parallelism
+    torch.set_num_threads(1)
+
+def _decode_into(shm_name, batch_size, slot, image_bytes):
+    """Worker entry point: decode straight into slot of the shared batch."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        batch = np.ndarray((batch_size, *IMAGE_SHAPE), dtype=np.float32, buffer=shm.buf)
+        error = _decode(image_bytes, batch[slot])
+        del batch
+        return error
+    finally:
+        shm.close()
+
+def _decode_all(images):
+    # In-process fallback when no worker pool is configured
+    batch = np.empty((len(images), *IMAGE_SHAPE), dtype=np.float32)
+    return batch, [_decode(image_bytes, batch[slot]) for slot, image_bytes in enumerate(images)]
+
+class PreprocessedBatch:
+    """A (N, 3, 224, 224) float tensor (backed by shared memory when shm is set), plus per-image decode errors."""
+
+    def __init__(self, array, errors, shm=None):
+        self._shm = shm
+        self.tensor = torch.from_numpy(array)
+        self.errors = errors
+
+    def close(self):
+        self.tensor = None
+        shm, self._shm = self._shm, None
+        if shm is None:
+            return
+        try:
+            shm.close()
+        except BufferError:
+            pass  # A forward pass still holds a view; the mapping goes away with it
+        shm.unlink()
+
+class Preprocessor:
+    """
+    Decodes and transforms images in worker processes. Workers write pixels
+    into a shared-memory block, so only the compressed bytes and a short
+    status travel over the pipe. With workers=0 decoding happens on a
+    thread in this process instead.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pool = None
+        if workers > 0:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+
+    async def _run(self, images):
+        if self._pool is None:
+            array, errors = await asyncio.to_thread(_decode_all, images)
+            return PreprocessedBatch(array, errors)
+
+        size = len(images)
+        shm = SharedMemory(create=True, size=max(size * int(np.prod(IMAGE_SHAPE)) * 4, 1))
+        loop = asyncio.get_running_loop()
+        try:
+            errors = await asyncio.gather(*[
+                loop.run_in_executor(self._pool, _decode_into, shm.name, size, slot, image_bytes)
+                for slot, image_bytes in enumerate(images)
+            ])
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        array = np.ndarray((size, *IMAGE_SHAPE), dtype=np.float32, buffer=shm.buf)
+        return PreprocessedBatch(array, list(errors), shm)
+
+    def submit(self, images):
+        """Start preprocessing a chunk of image bytes; await the returned task for a PreprocessedBatch."""
+        return asyncio.ensure_future(self._run(images))
+
+    async def chunks(self, images, chunk_size):
+        """
+        Yield (offset, PreprocessedBatch) for consecutive chunks. The next chunk
+        is already decoding while the caller runs the model on the current one.
+        The caller must close() each batch it receives.
+        """
+        starts = list(range(0, len(images), chunk_size))
+        pending = self.submit(images[0:chunk_size]) if starts else None
+        for i, start in enumerate(starts):
+            batch = await pending
+            pending = None
+            if i + 1 < len(starts):
+                pending = self.submit(images[starts[i + 1]:starts[i + 1] + chunk_size])
+            try:
+                yield start, batch
+            except BaseException:
+                if pending is not None:
+                    (await pending).close()
+                raise
+
+    def warmup(self):
+        """Start the worker processes now so the first batch doesn't pay for spawning them."""
+        if self._pool is not None:
+            for future in [self._pool.submit(_init_worker) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,219 @@
+# utils/registry.py
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Sort key that orders digit runs by value, so v10 comes after v9 (and 2024-10 after 2024-9)
+def _natural_key(name):
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", name) if part]
+
+# A loaded, warmed-up model and the manifest it came from
+class ModelHandle:
+    def __init__(self, kind, version, model, manifest):
+        self.kind = kind
+        self.version = version
+        self.model = model
+        self.manifest = manifest
+        self.loaded_at = time.time()
+
+class VersionStats:
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.latencies = deque(maxlen=window)
+        self.agree = 0
+        self.disagree = 0
+
+    def summary(self):
+        values = sorted(self.latencies)
+        n = len(values)
+        compared = self.agree + self.disagree
+        return {
+            "requests": self.requests,
+            "p50_ms": values[n // 2] * 1000 if n else None,
+            "p95_ms": values[min(int(0.95 * n), n - 1)] * 1000 if n else None,
+            "compared": compared,
+            "agreement": self.agree / compared if compared else None,
+        }
+
+# Active model for one kind (classifier/detector) plus an optional shadow or canary candidate
+class ModelSlot:
+    def __init__(self):
+        self.active = None
+        self.candidate = None
+        self.candidate_mode = None  # "shadow" or "canary"
+        self.candidate_percent = 0.0
+        self.loading = None
+        self.last_error = None
+        self.stats = {}
+
+class ModelRegistry:
+    """
+    Versioned model artifacts on disk, laid out as
+        <root>/<kind>/<version>/manifest.json
+    where the manifest names the weights file (and optionally arch, notes,
+    metrics). New versions are loaded and warmed up off the request path and
+    swapped in by replacing a single reference, so requests that already
+    picked up the old handle finish on it.
+    """
+
+    def __init__(self, root, loaders, warmups=None):
+        self.root = Path(root)
+        self.loaders = loaders
+        self.warmups = warmups or {}
+        self._lock = threading.Lock()
+        self._slots = {kind: ModelSlot() for kind in loaders}
+
+    def _slot(self, kind):
+        if kind not in self._slots:
+            raise KeyError(f"Unknown model kind: {kind}")
+        return self._slots[kind]
+
+    def list_versions(self, kind):
+        """Versions with a manifest, oldest first (natural order: v9 before v10)."""
+        kind_dir = self.root / kind
+        if not kind_dir.is_dir():
+            return []
+        return sorted((p.parent.name for p in kind_dir.glob("*/manifest.json")), key=_natural_key)
+
+    def read_manifest(self, kind, version):
+        manifest_path = self.root / kind / version / "manifest.json"
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No manifest for {kind} version {version} in {self.root}")
+        manifest = json.loads(manifest_path.read_text())
+        manifest["path"] = str(manifest_path.parent / manifest["file"])
+        return manifest
+
+    def load(self, kind, version, manifest=None):
+        """Load and warm up a version without making it active."""
+        manifest = manifest or self.read_manifest(kind, version)
+        start = time.perf_counter()
+        model = self.loaders[kind](manifest["path"], manifest)
+        if kind in self.warmups:
+            self.warmups[kind](model)
+        logger.info("Loaded %s %s in %.2fs", kind, version, time.perf_counter() - start)
+        return ModelHandle(kind, version, model, manifest)
+
+    def install(self, kind, handle):
+        """Atomically make handle the active model for kind."""
+        with self._lock:
+            slot = self._slot(kind)
+            previous = slot.active
+            slot.active = handle
+            slot.stats.setdefault(handle.version, VersionStats())
+        logger.info("Activated %s %s (previous: %s)", kind, handle.version, previous.version if previous else None)
+        return previous
+
+    def _load_in_slot(self, kind, version):
+        slot = self._slot(kind)
+        with self._lock:
+            slot.loading = version
+            slot.last_error = None
+        try:
+            return self.load(kind, version)
+        except Exception as e:
+            logger.error("Failed to load %s %s: %s", kind, version, e, exc_info=True)
+            with self._lock:
+                slot.last_error = f"{version}: {e}"
+            return None
+        finally:
+            with self._lock:
+                slot.loading = None
+
+    def activate(self, kind, version):
+        """Load, warm up and swap in a version. Meant to run in a background task."""
+        handle = self._load_in_slot(kind, version)
+        if handle is not None:
+            self.install(kind, handle)
+
+    def set_candidate(self, kind, version, mode, percent):
+        """Load a version and route percent% of traffic to it as a shadow or canary."""
+        if mode not in ("shadow", "canary"):
+            raise ValueError("mode must be 'shadow' or 'canary'")
+        handle = self._load_in_slot(kind, version)
+        if handle is None:
+            return
+        with self._lock:
+            slot = self._slot(kind)
+            slot.candidate = handle
+            slot.candidate_mode = mode
+            slot.candidate_percent = percent
+            slot.stats.setdefault(version, VersionStats())
+
+    def clear_candidate(self, kind):
+        with self._lock:
+            slot = self._slot(kind)
+            slot.candidate = None
+            slot.candidate_mode = None
+            slot.candidate_percent = 0.0
+
+    def promote_candidate(self, kind):
+        with self._lock:
+            candidate = self._slot(kind).candidate
+        if candidate is None:
+            raise ValueError(f"No candidate loaded for {kind}")
+        self.install(kind, candidate)
+        self.clear_candidate(kind)
+
+    def active(self, kind):
+        return self._slot(kind).active
+
+    def route(self, kind):
+        """
+        Pick the handle that serves this request and the handle that should
+        also run in the background for comparison. Returns (primary, shadow).
+        Shadow traffic is served by the active version and re-run on the
+        candidate; canary traffic is served by the candidate and re-run on the
+        active version, so the candidate's agreement is measured either way.
+        """
+        with self._lock:
+            slot = self._slot(kind)
+            active, candidate = slot.active, slot.candidate
+            mode, percent = slot.candidate_mode, slot.candidate_percent
+        if candidate is None or random.random() * 100 >= percent:
+            return active, None
+        if mode == "canary":
+            return candidate, active
+        return active, candidate
+
+    def record(self, kind, version, seconds):
+        with self._lock:
+            stats = self._slot(kind).stats.setdefault(version, VersionStats())
+            stats.requests += 1
+            stats.latencies.append(seconds)
+
+    def record_agreement(self, kind, served_version, shadow_version, agreed):
+        """Count whether the served and background runs agreed, against whichever of the two isn't the active version."""
+        with self._lock:
+            slot = self._slot(kind)
+            active = slot.active.version if slot.active else None
+            version = served_version if shadow_version == active else shadow_version
+            stats = slot.stats.setdefault(version, VersionStats())
+            if agreed:
+                stats.agree += 1
+            else:
+                stats.disagree += 1
+
+    def status(self):
+        # Directory listing stays outside the lock, which the request path takes on every route()
+        available = {kind: self.list_versions(kind) for kind in self._slots}
+        with self._lock:
+            return {
+                kind: {
+                    "active": slot.active.version if slot.active else None,
+                    "candidate": slot.candidate.version if slot.candidate else None,
+                    "candidate_mode": slot.candidate_mode,
+                    "candidate_percent": slot.candidate_percent,
+                    "loading": slot.loading,
+                    "last_error": slot.last_error,
+                    "available": available[kind],
+                    "stats": {version: stats.summary() for version, stats in slot.stats.items()},
+                }
+                for kind, slot in self._slots.items()
+            }
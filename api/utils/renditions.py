@@ -0,0 +1,211 @@
+# utils/renditions.py
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# format -> (media type, PIL encoder)
+FORMATS = {
+    "webp": ("image/webp", "WEBP"),
+    "jpeg": ("image/jpeg", "JPEG"),
+}
+
+def source_id(data):
+    """Content address of an image: the same bytes always get the same id, so its renditions never change."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class RenditionCache:
+    """
+    Downscaled WebP/JPEG copies of uploaded and annotated images, on disk.
+
+    Each source image lives in its own directory with its renditions
+    (<root>/<id[:2]>/<id>/source, thumb.webp, ...). Directories are the unit
+    of the LRU: any access refreshes the whole entry, and the least recently
+    used entries are deleted once the total passes max_bytes. Access order is
+    kept in the directory mtimes, so it survives restarts.
+
+    All encoding runs on the cache's own worker threads, never on the
+    inference slots. At most max_pending pre-renders wait for those threads;
+    past that they are skipped and made on first request instead.
+    """
+
+    def __init__(self, root, max_bytes, sizes, quality=80, workers=1, max_pending=64, metrics=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.sizes = dict(sizes)  # name -> longest edge in pixels
+        self.quality = quality
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rendition")
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> bytes on disk, least recently used first
+        self._total = 0
+        self._pending = 0  # Pre-renders queued or running
+        self._scan()
+
+    def _count(self, name, value=1):
+        if self.metrics is not None:
+            self.metrics.increment(f"renditions.{name}", value)
+
+    def _dir(self, image_id):
+        return self.root / image_id[:2] / image_id
+
+    def _scan(self):
+        entries = []
+        for entry in self.root.glob("*/*"):
+            if entry.is_dir():
+                entries.append((entry.stat().st_mtime, entry.name, sum(f.stat().st_size for f in entry.iterdir())))
+        for _, image_id, size in sorted(entries):
+            self._entries[image_id] = size
+            self._total += size
+        self._evict()
+
+    def _touch(self, image_id, added=0):
+        with self._lock:
+            if image_id in self._entries:
+                self._entries[image_id] += added
+                self._entries.move_to_end(image_id)
+            else:
+                self._entries[image_id] = added
+            self._total += added
+        try:
+            os.utime(self._dir(image_id))
+        except OSError:
+            pass
+
+    def _evict(self):
+        victims = []
+        with self._lock:
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                image_id, size = self._entries.popitem(last=False)
+                self._total -= size
+                victims.append(image_id)
+        for image_id in victims:
+            shutil.rmtree(self._dir(image_id), ignore_errors=True)
+        if victims:
+            self._count("evicted", len(victims))
+
+    def add(self, image_id, data, pregenerate=(), fmt="webp"):
+        """
+        Store a source image and queue its missing pregenerate renditions.
+        The source is written here, so call this off the event loop (e.g. as
+        a background task); only the image id waits in the render queue.
+        """
+        try:
+            directory = self._dir(image_id)
+            source = directory / "source"
+            if source.exists():
+                self._touch(image_id)
+            else:
+                directory.mkdir(parents=True, exist_ok=True)
+                # Write-then-rename, so a reader never sees half a file
+                tmp = source.with_name(f".source.{threading.get_ident()}")
+                tmp.write_bytes(data)
+                # Identical uploads can be added concurrently: only the first one counts its bytes
+                with self._lock:
+                    new = not source.exists()
+                    if new:
+                        os.replace(tmp, source)
+                if not new:
+                    tmp.unlink()
+                self._touch(image_id, len(data) if new else 0)
+        except OSError as e:
+            logger.warning("Could not store rendition source %s: %s", image_id, e)
+            return
+
+        missing = tuple(size for size in pregenerate if not self.path(image_id, size, fmt).exists())
+        if missing:
+            with self._lock:
+                queued = self._pending < self.max_pending
+                if queued:
+                    self._pending += 1
+            if queued:
+                self.executor.submit(self._pregenerate, image_id, missing, fmt)
+            else:
+                self._count("pregenerate_skipped")
+        self._evict()
+
+    def _pregenerate(self, image_id, sizes, fmt):
+        try:
+            for size in sizes:
+                if not self.path(image_id, size, fmt).exists():
+                    self._render(image_id, size, fmt)
+            self._evict()
+        except FileNotFoundError:
+            pass  # Evicted before its turn came
+        except Exception as e:
+            logger.warning("Rendition pre-generation failed for %s: %s", image_id, e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def path(self, image_id, size, fmt):
+        return self._dir(image_id) / f"{size}.{fmt}"
+
+    def has_source(self, image_id):
+        return (self._dir(image_id) / "source").exists()
+
+    def _render(self, image_id, size, fmt):
+        start = time.perf_counter()
+        edge = self.sizes[size]
+        with Image.open(self._dir(image_id) / "source") as image:
+            # JPEG sources decode straight at a reduced scale (DCT scaling) when that's still big enough
+            image.draft("RGB", (edge, edge))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            out = self.path(image_id, size, fmt)
+            tmp = out.with_name(f".{out.name}.{threading.get_ident()}")
+            if fmt == "webp":
+                image.save(tmp, FORMATS[fmt][1], quality=self.quality, method=4)
+            else:
+                image.save(tmp, FORMATS[fmt][1], quality=self.quality, optimize=True, progressive=True)
+        os.replace(tmp, out)
+        self._touch(image_id, out.stat().st_size)
+        self._count("generated")
+        if self.metrics is not None:
+            self.metrics.observe("rendition", time.perf_counter() - start)
+        return out
+
+    def cached(self, image_id, size, fmt):
+        """Path of a rendition already on disk, or None. Cheap enough for the event loop."""
+        out = self.path(image_id, size, fmt)
+        if not out.exists():
+            return None
+        self._count("hits")
+        self._touch(image_id)
+        return out
+
+    def render(self, image_id, size, fmt):
+        """
+        Render a missing rendition (run it on self.executor). None when the
+        source isn't, or is no longer, in the cache.
+        """
+        out = self.path(image_id, size, fmt)
+        if out.exists():
+            return out  # Rendered while this call was queued
+        if not self.has_source(image_id):
+            return None
+        self._count("misses")
+        try:
+            out = self._render(image_id, size, fmt)
+        except FileNotFoundError:
+            return None  # Evicted in the meantime
+        self._evict()
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes, "pending": self._pending}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
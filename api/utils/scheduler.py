@@ -0,0 +1,163 @@
+# utils/scheduler.py
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cancellation import RequestCancelled
+from utils.logs import add_stage
+
+# How often queued work re-checks its request for a disconnect
+CANCEL_POLL_SECONDS = 0.25
+
+class LaneFull(Exception):
+    """Raised when a lane's queue is already at its limit."""
+
+class InferenceScheduler:
+    """
+    Strict-priority admission in front of the models. Work runs on a fixed
+    pool of total_slots threads; each lane also has its own concurrency cap
+    and queue limit. When a slot frees up, waiters in earlier lanes are
+    always admitted before later ones, so interactive requests only ever
+    wait for in-flight work, never behind queued bulk work. Keeping the bulk
+    cap below total_slots reserves capacity for interactive traffic.
+
+    total_slots can be changed at runtime with resize(), up to max_slots
+    threads. before_run, if set, is called on the inference thread ahead of
+    every piece of work.
+    """
+
+    def __init__(self, total_slots, lane_limits, max_queue, metrics=None, max_slots=None, before_run=None):
+        self.total_slots = total_slots
+        self.max_slots = max(max_slots or total_slots, total_slots)
+        self.lanes = list(lane_limits)  # Priority order, highest first
+        self.lane_limits = dict(lane_limits)
+        self.max_queue = dict(max_queue)
+        self.metrics = metrics
+        self.before_run = before_run
+        self._executor = ThreadPoolExecutor(max_workers=self.max_slots, thread_name_prefix="inference")
+        self._waiters = {lane: deque() for lane in self.lanes}
+        self._running = {lane: 0 for lane in self.lanes}
+
+    def _in_use(self):
+        return sum(self._running.values())
+
+    def _can_start(self, lane):
+        return self._in_use() < self.total_slots and self._running[lane] < self.lane_limits[lane]
+
+    def queue_depths(self):
+        return {lane: len(self._waiters[lane]) for lane in self.lanes}
+
+    def resize(self, total_slots):
+        """Change how many calls may run at once (event loop thread only). Running work is never interrupted."""
+        self.total_slots = min(max(int(total_slots), 1), self.max_slots)
+        self._dispatch()
+
+    def _call(self, fn, args, kwargs):
+        if self.before_run is not None:
+            self.before_run()
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            add_stage(getattr(fn, "__name__", "inference"), time.perf_counter() - start)
+
+    def _publish(self):
+        if self.metrics is None:
+            return
+        self.metrics.set_gauge("scheduler.total_slots", self.total_slots)
+        for lane in self.lanes:
+            self.metrics.set_gauge(f"scheduler.{lane}.queue_depth", len(self._waiters[lane]))
+            self.metrics.set_gauge(f"scheduler.{lane}.running", self._running[lane])
+
+    def _dispatch(self):
+        # Admit waiters in priority order while there is capacity
+        for lane in self.lanes:
+            waiters = self._waiters[lane]
+            while waiters and self._can_start(lane):
+                future = waiters.popleft()
+                if future.done():  # Cancelled while queued
+                    continue
+                self._running[lane] += 1
+                future.set_result(None)
+        self._publish()
+
+    async def _wait(self, future, lane, ctx):
+        """Wait for a slot; give up (and leave the queue) if ctx is cancelled meanwhile."""
+        if ctx is None:
+            await future
+            return
+        while not future.done():
+            remaining = ctx.remaining()
+            timeout = CANCEL_POLL_SECONDS if remaining is None else max(min(remaining, CANCEL_POLL_SECONDS), 0)
+            await asyncio.wait({future}, timeout=timeout)
+            if future.done():
+                return
+            reason = await ctx.cancel_reason()
+            if reason is not None:
+                if self.metrics is not None:
+                    self.metrics.increment(f"cancelled.{reason}")
+                    self.metrics.increment(f"scheduler.{lane}.dropped")
+                raise RequestCancelled(reason, "queued inference")
+
+    async def _acquire(self, lane, ctx=None):
+        # Higher-priority waiters that could start have already been dispatched,
+        # so only keep FIFO order within this lane
+        if not self._waiters[lane] and self._can_start(lane):
+            self._running[lane] += 1
+            self._publish()
+            return
+        if len(self._waiters[lane]) >= self.max_queue[lane]:
+            if self.metrics is not None:
+                self.metrics.increment(f"scheduler.{lane}.rejected")
+            raise LaneFull(f"The {lane} queue is full, try again later.")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        self._publish()
+        try:
+            await self._wait(future, lane, ctx)
+        except (asyncio.CancelledError, RequestCancelled):
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled; hand it back
+                self._release(lane)
+            else:
+                future.cancel()
+                try:
+                    self._waiters[lane].remove(future)
+                except ValueError:
+                    pass
+                self._publish()
+            raise
+
+    def _release(self, lane):
+        self._running[lane] -= 1
+        self._dispatch()
+
+    async def run(self, lane, fn, *args, ctx=None, **kwargs):
+        """
+        Wait for a slot in lane, then run fn(*args, **kwargs) on the inference
+        pool. With a RequestContext, work whose client disconnected or whose
+        deadline passed is dropped from the queue instead of being run.
+        """
+        if lane not in self._waiters:
+            raise ValueError(f"Unknown lane: {lane}")
+        if ctx is not None:
+            await ctx.check("queued inference")
+        queued_at = time.perf_counter()
+        await self._acquire(lane, ctx)
+        waited = time.perf_counter() - queued_at
+        add_stage("queue_wait", waited)
+        if self.metrics is not None:
+            self.metrics.observe(f"scheduler.{lane}.wait", waited)
+        loop = asyncio.get_running_loop()
+        # Run in a copy of this context so the work's logs and stage timings belong to this request
+        context = contextvars.copy_context()
+        work = loop.run_in_executor(self._executor, context.run, self._call, fn, args, kwargs)
+        # Free the slot when the work actually finishes, even if the caller stops waiting
+        work.add_done_callback(lambda _: self._release(lane))
+        return await work
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,120 @@
+# utils/store.py
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    kind TEXT NOT NULL,          -- 'prediction' or 'detection'
+    source TEXT,                 -- filename, URL or key
+    species TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    created_at TEXT NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_project_day ON results (project_id, day);
+
+-- One row per (project, day, kind, species), updated in the same transaction as the insert
+CREATE TABLE IF NOT EXISTS rollups (
+    project_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    species TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (project_id, day, kind, species)
+);
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO rollups (project_id, day, kind, species, count, confidence_sum)
+VALUES (?, ?, ?, ?, 1, ?)
+ON CONFLICT (project_id, day, kind, species)
+DO UPDATE SET count = count + 1, confidence_sum = confidence_sum + excluded.confidence_sum
+"""
+
+class ResultStore:
+    """
+    Every prediction/detection result in SQLite, plus per project/day/species
+    rollups kept up to date on write. Aggregate queries only read the rollups,
+    whose size grows with projects x days x species, not with images.
+    With retention_days set, raw results older than that are deleted (once a
+    day, on the first write of the day); the rollups are kept, so /stats
+    still covers every day.
+    """
+
+    def __init__(self, path, retention_days=None):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.retention_days = retention_days
+        self._pruned_day = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def record(self, project_id, kind, rows):
+        """Store [(source, species, confidence), ...] and bump the rollups in one transaction."""
+        if not rows:
+            return
+        now = datetime.now(timezone.utc)
+        created_at, day = now.isoformat(), now.date().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO results (project_id, kind, source, species, confidence, created_at, day) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(project_id, kind, source, species, confidence, created_at, day) for source, species, confidence in rows]
+            )
+            self._conn.executemany(
+                UPSERT_ROLLUP,
+                [(project_id, day, kind, species, confidence) for _, species, confidence in rows]
+            )
+            if self.retention_days and self._pruned_day != day:
+                cutoff = (now.date() - timedelta(days=self.retention_days)).isoformat()
+                self._conn.execute("DELETE FROM results WHERE day < ?", (cutoff,))
+                self._pruned_day = day
+
+    def stats(self, project_id=None, kind=None, start=None, end=None):
+        """Totals by species, day and project from the rollups. start/end are inclusive ISO dates."""
+        where, params = [], []
+        for column, op, value in (("project_id", "=", project_id), ("kind", "=", kind), ("day", ">=", start), ("day", "<=", end)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                params.append(value)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        def grouped(column):
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {column}, SUM(count), SUM(confidence_sum) FROM rollups {clause} GROUP BY {column} ORDER BY {column}",
+                    params
+                ).fetchall()
+            return {key: {"count": count, "mean_confidence": conf_sum / count} for key, count, conf_sum in rows}
+
+        by_species = grouped("species")
+        return {
+            "total": sum(v["count"] for v in by_species.values()),
+            "by_species": by_species,
+            "by_day": {day: v["count"] for day, v in grouped("day").items()},
+            "by_project": {project: v["count"] for project, v in grouped("project_id").items()},
+        }
+
+    def rebuild_rollups(self):
+        """
+        Recompute the rollups from the raw results (e.g. after editing results
+        by hand). Days already pruned by retention_days drop out of them.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rollups")
+            self._conn.execute(
+                "INSERT INTO rollups (project_id, day, kind, species, count, confidence_sum) "
+                "SELECT project_id, day, kind, species, COUNT(*), SUM(confidence) FROM results GROUP BY project_id, day, kind, species"
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,207 @@
+# utils/vectors.py
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Rows scored per matmul during brute-force search (bounds the float32 temporary)
+SEARCH_CHUNK = 65536
+
+def _write_atomic(path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+def _normalize(x):
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+class VectorIndex:
+    """
+    Cosine-similarity index over classifier embeddings, stored as float16.
+
+    Small collections are searched by brute force (one matmul per chunk).
+    With pca_dim set, vectors are reduced by PCA once pca_train_size have
+    been collected. Past ivf_min_size the index also builds an inverted file
+    (k-means coarse quantizer, ~sqrt(N) lists) and only scores the nprobe
+    lists nearest the query; it is rebuilt whenever the collection doubles.
+    With max_size set, adding past it evicts the oldest vectors (a tenth of
+    max_size at a time, so the buffers aren't compacted on every add).
+    """
+
+    def __init__(self, dim, pca_dim=None, pca_train_size=5000, ivf_min_size=50000, nprobe=8, max_size=None):
+        self.dim = dim
+        self.pca_dim = pca_dim
+        self.pca_train_size = pca_train_size
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.max_size = max_size
+        self.mean = None
+        self.components = None  # (pca_dim, dim) once trained
+        self.centroids = None  # (nlist, stored_dim) once the IVF is built
+        self.meta = []
+        self._vectors = np.zeros((0, dim), dtype=np.float16)
+        self._lists = np.zeros(0, dtype=np.int32)  # IVF list of each vector
+        self._projects = np.zeros(0, dtype=np.int32)
+        self._project_codes = {}
+        self._ivf_size = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self.unsaved = 0  # Vectors added since the last save()
+
+    def __len__(self):
+        return len(self.meta)
+
+    def _project(self, x):
+        x = _normalize(np.asarray(x, dtype=np.float32).reshape(-1, self.dim))
+        if self.components is not None:
+            x = _normalize((x - self.mean) @ self.components.T)
+        return x
+
+    def _grow(self, extra):
+        n = len(self.meta)
+        if n + extra <= len(self._vectors):
+            return
+        capacity = max(2 * len(self._vectors), n + extra, 1024)
+        for name in ("_vectors", "_lists", "_projects"):
+            old = getattr(self, name)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+    def add(self, vectors, metas):
+        """Add raw embeddings with their metadata dicts (source, project_id, species, ...)."""
+        with self._lock:
+            x = self._project(vectors)
+            n = len(self.meta)
+            self._grow(len(x))
+            self._vectors[n:n + len(x), :x.shape[1]] = x
+            for i, meta in enumerate(metas):
+                code = self._project_codes.setdefault(meta.get("project_id"), len(self._project_codes))
+                self._projects[n + i] = code
+                self.meta.append({**meta, "id": self._next_id + i})
+            self._next_id += len(x)
+            self.unsaved += len(x)
+            if self.centroids is not None:
+                self._lists[n:n + len(x)] = np.argmax(x @ self.centroids.T, axis=1)
+            if self.max_size and len(self.meta) > self.max_size:
+                self._evict(len(self.meta) - self.max_size + self.max_size // 10)
+
+            if self.pca_dim and self.components is None and len(self.meta) >= self.pca_train_size:
+                self._train_pca()
+            if len(self.meta) >= self.ivf_min_size and len(self.meta) >= 2 * self._ivf_size:
+                self._build_ivf()
+
+    def _evict(self, count):
+        """Drop the count oldest vectors, compacting the buffers in place."""
+        n = len(self.meta)
+        count = min(count, n)
+        for name in ("_vectors", "_lists", "_projects"):
+            buffer = getattr(self, name)
+            buffer[:n - count] = buffer[count:n]
+        del self.meta[:count]
+        self.unsaved += count
+
+    def _stored(self):
+        n = len(self.meta)
+        width = self.components.shape[0] if self.components is not None else self.dim
+        return self._vectors[:n, :width]
+
+    def _train_pca(self):
+        x = self._stored().astype(np.float32)
+        self.mean = x.mean(axis=0)
+        _, _, vt = np.linalg.svd(x - self.mean, full_matrices=False)
+        self.components = vt[:self.pca_dim].astype(np.float32)
+        reduced = _normalize((x - self.mean) @ self.components.T)
+        # Keep the reduced vectors only, so the buffer shrinks to pca_dim columns
+        vectors = np.zeros((len(self._vectors), self.pca_dim), dtype=np.float16)
+        vectors[:len(reduced)] = reduced
+        self._vectors = vectors
+        self.centroids, self._ivf_size = None, 0
+
+    def _build_ivf(self, iterations=10, seed=0):
+        x = self._stored()
+        n = len(x)
+        nlist = max(int(np.sqrt(n)), 1)
+        rng = np.random.default_rng(seed)
+        sample = x[rng.choice(n, size=min(n, nlist * 40), replace=False)].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        for start in range(0, n, SEARCH_CHUNK):
+            chunk = x[start:start + SEARCH_CHUNK].astype(np.float32)
+            self._lists[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        self._ivf_size = n
+
+    def search(self, vector, k=10, project_id=None):
+        """The k most similar stored items as [(meta, cosine similarity)], best first."""
+        with self._lock:
+            if not self.meta:
+                return []
+            q = self._project(vector)[0]
+            stored = self._stored()
+            candidates = None
+            if self.centroids is not None:
+                probes = np.argsort(-(self.centroids @ q))[:self.nprobe]
+                candidates = np.flatnonzero(np.isin(self._lists[:len(stored)], probes))
+            if project_id is not None:
+                code = self._project_codes.get(project_id)
+                if code is None:
+                    return []
+                in_project = self._projects[:len(stored)] == code
+                candidates = np.flatnonzero(in_project) if candidates is None else candidates[in_project[candidates]]
+
+            rows = np.arange(len(stored)) if candidates is None else candidates
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), SEARCH_CHUNK):
+                chunk = rows[start:start + SEARCH_CHUNK]
+                scores[start:start + len(chunk)] = stored[chunk].astype(np.float32) @ q
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            return [(self.meta[rows[i]], float(scores[i])) for i in top]
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stored = self._stored()
+            arrays = {} if self.components is None else {"mean": self.mean, "components": self.components}
+            meta = json.dumps({"dim": self.dim, "pca_dim": self.pca_dim, "items": self.meta[:len(stored)]})
+            _write_atomic(directory / "vectors.npy", lambda f: np.save(f, stored))
+            _write_atomic(directory / "pca.npz", lambda f: np.savez(f, **arrays))
+            _write_atomic(directory / "meta.json", lambda f: f.write(meta.encode()))
+            self.unsaved = 0
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        directory = Path(directory)
+        saved = json.loads((directory / "meta.json").read_text())
+        index = cls(saved["dim"], **kwargs)
+        pca = np.load(directory / "pca.npz")
+        if "components" in pca:
+            # Stored vectors are already reduced, whatever pca_dim is configured now
+            index.mean, index.components = pca["mean"], pca["components"]
+            index.pca_dim = index.components.shape[0]
+        vectors = np.load(directory / "vectors.npy")
+        items = saved["items"]
+        index._vectors = vectors.copy()
+        index._lists = np.zeros(len(vectors), dtype=np.int32)
+        index._projects = np.array(
+            [index._project_codes.setdefault(m.get("project_id"), len(index._project_codes)) for m in items],
+            dtype=np.int32
+        ).reshape(-1)
+        index.meta = items
+        index._next_id = max((m["id"] for m in items), default=-1) + 1
+        if index.max_size and len(items) > index.max_size:
+            index._evict(len(items) - index.max_size)
+        if len(index.meta) >= index.ivf_min_size:
+            index._build_ivf()
+        return index
@@ -0,0 +1,150 @@
+# utils/vit.py
+# The one definition of the ViT: machine_learning_models/vit.py loads this file, so the
+# training scripts and the API always build the same model from a checkpoint
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# Small ViT that runs comfortably on a CPU (~2.8M parameters, 197 tokens at 224px).
+# For lower-resolution inputs drop image_size and patch_size together, e.g. 112/8.
+VIT_DEFAULTS = {
+    "image_size": 224,
+    "patch_size": 16,
+    "embed_dim": 192,
+    "attn_heads": [3, 3, 3, 3, 3, 3],
+    "mlp_scale": 4,
+    "drop_rate": 0.0,
+}
+
+
+class Patchify(nn.Module):
+    """(B, C, H, W) -> (B, num_patches, patch_size * patch_size * C), patches in row-major order."""
+
+    def __init__(self, patch_size):
+        super().__init__()
+        self.patch_size = patch_size
+
+    def forward(self, x):
+        B, C, H, W = x.shape
+        p = self.patch_size
+        # Same layout as einops "b c (h p1) (w p2) -> b (h w) (p1 p2 c)", without the dependency
+        x = x.reshape(B, C, H // p, p, W // p, p).permute(0, 2, 4, 3, 5, 1)
+        return x.reshape(B, (H // p) * (W // p), p * p * C)
+
+
+class FF(nn.Module):
+    def __init__(self, embed_dim, mlp_scale=4, drop_rate=0.0):
+        super().__init__()
+        self.fc1 = nn.Linear(embed_dim, embed_dim * mlp_scale)
+        self.activation = nn.GELU()
+        self.fc2 = nn.Linear(embed_dim * mlp_scale, embed_dim)
+        self.dropout = nn.Dropout(p=drop_rate)
+
+    def forward(self, x):
+        return self.dropout(self.fc2(self.activation(self.fc1(x))))
+
+
+class MHSA(nn.Module):
+    """
+    Multi-head self-attention on the fused scaled_dot_product_attention kernel,
+    which never materialises the (tokens x tokens) score matrix per head.
+    Q, K and V come out of a single projection.
+    """
+
+    def __init__(self, embed_dim, num_heads, drop_rate=0.0):
+        super().__init__()
+        assert embed_dim % num_heads == 0, "embed_dim is indivisible by num_heads"
+        self.num_heads = num_heads
+        self.head_dim = embed_dim // num_heads
+        self.drop_rate = drop_rate
+        self.qkv = nn.Linear(embed_dim, 3 * embed_dim)
+
+    def forward(self, x):
+        B, N, D = x.shape
+        # (B, N, 3D) -> 3 x (B, heads, N, head_dim)
+        q, k, v = self.qkv(x).view(B, N, 3, self.num_heads, self.head_dim).permute(2, 0, 3, 1, 4)
+        out = F.scaled_dot_product_attention(q, k, v, dropout_p=self.drop_rate if self.training else 0.0)
+        return out.transpose(1, 2).reshape(B, N, D)
+
+
+class EncoderBlock(nn.Module):
+    def __init__(self, embed_dim, num_heads, mlp_scale=4, drop_rate=0.0):
+        super().__init__()
+        self.LN1 = nn.LayerNorm(embed_dim)
+        self.attn = MHSA(embed_dim, num_heads, drop_rate)
+        self.c_proj = nn.Linear(embed_dim, embed_dim)
+        self.LN2 = nn.LayerNorm(embed_dim)
+        self.FF = FF(embed_dim, mlp_scale, drop_rate)
+        self.dropout = nn.Dropout(p=drop_rate)
+
+    def forward(self, x):
+        # Pre-norm: attention sees the normalised tokens, the residual carries the raw ones
+        x = x + self.dropout(self.c_proj(self.attn(self.LN1(x))))
+        return x + self.FF(self.LN2(x))
+
+
+class ViT(nn.Module):
+    """
+    Vision transformer classifier. Inputs of any size are resized to
+    image_size first, so it takes the same 224x224 tensors as the CNNs.
+    config() returns the keyword arguments needed to rebuild it; checkpoints
+    store them under 'vit_config'.
+    """
+
+    def __init__(self, num_classes=7, image_size=224, patch_size=16, embed_dim=192,
+                 attn_heads=(3, 3, 3, 3, 3, 3), mlp_scale=4, drop_rate=0.0):
+        super().__init__()
+        assert image_size % patch_size == 0, "image_size must be divisible by patch_size"
+        self.image_size = image_size
+        self.patch_size = patch_size
+        self.embed_dim = embed_dim
+        self.attn_heads = list(attn_heads)
+        self.mlp_scale = mlp_scale
+        self.drop_rate = drop_rate
+
+        num_patches = (image_size // patch_size) ** 2
+        patch_dim = 3 * patch_size ** 2
+        self.patch_embedding = nn.Sequential(
+            Patchify(patch_size),
+            nn.LayerNorm(patch_dim),
+            nn.Linear(patch_dim, embed_dim),
+            nn.LayerNorm(embed_dim),
+        )
+        self.cls_token = nn.Parameter(torch.zeros(1, 1, embed_dim))
+        self.pos_embedding = nn.Parameter(torch.zeros(1, num_patches + 1, embed_dim))
+        self.dropout = nn.Dropout(p=drop_rate)
+        self.layers = nn.ModuleList(EncoderBlock(embed_dim, heads, mlp_scale, drop_rate) for heads in self.attn_heads)
+        self.norm = nn.LayerNorm(embed_dim)
+        self.mlp_head = nn.Linear(embed_dim, num_classes)
+
+        nn.init.trunc_normal_(self.pos_embedding, std=0.02)
+        nn.init.trunc_normal_(self.cls_token, std=0.02)
+        for module in self.modules():
+            if isinstance(module, nn.Linear):
+                nn.init.trunc_normal_(module.weight, std=0.02)
+                if module.bias is not None:
+                    nn.init.zeros_(module.bias)
+
+    def config(self):
+        return {
+            "image_size": self.image_size,
+            "patch_size": self.patch_size,
+            "embed_dim": self.embed_dim,
+            "attn_heads": self.attn_heads,
+            "mlp_scale": self.mlp_scale,
+            "drop_rate": self.drop_rate,
+        }
+
+    def forward_features(self, x):
+        """Final [CLS] embedding, (B, embed_dim)."""
+        if x.shape[-2:] != (self.image_size, self.image_size):
+            x = F.interpolate(x, size=(self.image_size, self.image_size), mode="bilinear", antialias=True, align_corners=False)
+        x = self.patch_embedding(x)
+        x = torch.cat((self.cls_token.expand(x.size(0), -1, -1), x), dim=1)
+        x = self.dropout(x + self.pos_embedding)
+        for layer in self.layers:
+            x = layer(x)
+        return self.norm(x[:, 0])
+
+    def forward(self, x):
+        return self.mlp_head(self.forward_features(x))
@@ -1,6 +1,6 @@
-import pandas as pd
+import argparse
 from pathlib import Path
-from sklearn.model_selection import train_test_split
+import sys
 from sklearn.preprocessing import LabelEncoder
 from PIL import Image
 from tqdm import tqdm
@@ -17,34 +17,14 @@ from einops.layers.torch import Rearrange
 
 
 
-# Path setup
-dataset_dir = Path("C:/Users/ricks/Downloads/Data/Data/classification_dataset/images")
-labels_file = Path("C:/Users/ricks/Downloads/Data/Data/classification_dataset/labels.txt")
-
-# Read the text file (filename label)
-df = pd.read_csv(labels_file, sep=" ", header=None, names=["filename", "label"])
-
-# Add full path column
-df["path"] = df["filename"].apply(lambda x: dataset_dir / x)
-
-
-label_map = {
-    "crab": 0,
-    "Eel": 1,
-    "flatfish": 2,
-    "roundfish": 3,
-    "Scallop": 4,
-    "skate": 5,
-    "whelk": 6
-}
-
-
-df['label_id'] = df['label'].map(label_map)
-
-
-train_val_df, test_df = train_test_split(df, test_size=0.1, stratify=df["label_id"], random_state=42)
-
-train_df, val_df = train_test_split(train_val_df, test_size=0.2, stratify=train_val_df["label_id"], random_state=42)
+# Frozen split from the dataset manifest (see ../manifest.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dataset import dataset_dir, load_splits
+parser = argparse.ArgumentParser(description="Train the original ViT on the frozen manifest split")
+parser.add_argument("--dataset-dir", default=str(dataset_dir))
+parser.add_argument("--manifest", default=None, help="Dataset manifest from manifest.py (default: manifest.csv next to --dataset-dir)")
+args = parser.parse_args()
+train_df, val_df, test_df = load_splits(args.dataset_dir, args.manifest)
 
 
 transform = transforms.Compose([
@@ -212,7 +192,7 @@ class EncoderBlock(nn.Module):
         x_norm = self.LN1(x)
 
         # We pass this to our attention block
-        attn,attn_weights = self.attn(x)
+        attn,attn_weights = self.attn(x_norm)
 
         attn = self.c_proj(attn) # Optional projection layer - done for you
 
@@ -0,0 +1,75 @@
+import torch
+
+
+class EagerBackend:
+    """Plain PyTorch nn.Module (the training checkpoint)."""
+    kind = "eager"
+
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def __call__(self, images):
+        return self.model(images)
+
+
+class TorchScriptBackend:
+    """Scripted/traced module written by export_weights.py --format torchscript (or int8)."""
+    kind = "torchscript"
+
+    def __init__(self, path):
+        self.model = torch.jit.load(str(path), map_location="cpu").eval()
+
+    def __call__(self, images):
+        return self.model(images.cpu())
+
+
+class OnnxBackend:
+    """ONNX graph run through onnxruntime on CPU."""
+    kind = "onnx"
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images):
+        outputs = self.session.run(None, {self.input_name: images.cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+
+class DynamicInt8Backend(EagerBackend):
+    """Eager model with dynamic int8 quantization of its Linear layers, built on the fly."""
+    kind = "int8"
+
+    def __init__(self, model):
+        quantized = torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized)
+
+    def __call__(self, images):
+        return self.model(images.cpu())
+
+
+def parse_backend_spec(spec):
+    """
+    Split a "name=kind:path" (or "kind:path") command line spec into its parts.
+    kind is one of eager, torchscript, onnx, int8.
+    """
+    name, _, rest = spec.rpartition("=")
+    kind, _, path = rest.partition(":")
+    if kind not in ("eager", "torchscript", "onnx", "int8") or not path:
+        raise ValueError(f"Invalid backend spec '{spec}', expected name=kind:path")
+    return (name or kind), kind, path
+
+
+def build_backend(kind, path, load_classifier, device):
+    if kind == "eager":
+        model, _ = load_classifier(path, device)
+        return EagerBackend(model)
+    if kind == "int8":
+        model, _ = load_classifier(path, torch.device("cpu"))
+        return DynamicInt8Backend(model)
+    if kind == "torchscript":
+        return TorchScriptBackend(path)
+    return OnnxBackend(path)
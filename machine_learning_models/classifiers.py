@@ -0,0 +1,63 @@
+import json
+
+import torch
+import torch.nn as nn
+from torchvision import models
+
+from vit import ViT, VIT_DEFAULTS
+
+# Architectures the API's load_model can serve (see api/utils/inference.py build_model)
+ARCHS = ("resnet50", "resnet18", "mobilenet_v3_small", "mobilenet_v3_large", "efficientnet_b0", "vit")
+
+# ImageNet weights used to initialise a fresh model of each architecture (the ViT always starts from scratch)
+PRETRAINED_WEIGHTS = {
+    "resnet50": models.ResNet50_Weights.DEFAULT,
+    "resnet18": models.ResNet18_Weights.DEFAULT,
+    "mobilenet_v3_small": models.MobileNet_V3_Small_Weights.DEFAULT,
+    "mobilenet_v3_large": models.MobileNet_V3_Large_Weights.DEFAULT,
+    "efficientnet_b0": models.EfficientNet_B0_Weights.DEFAULT,
+}
+
+
+def build_classifier(arch="resnet50", num_classes=7, pretrained=False, vit_config=None):
+    """
+    torchvision backbone with a num_classes-way head, laid out exactly like
+    the API expects. vit_config overrides VIT_DEFAULTS for arch="vit".
+    """
+    if arch not in ARCHS:
+        raise ValueError(f"Unsupported architecture {arch}, choose from {ARCHS}")
+    if arch == "vit":
+        return ViT(num_classes, **{**VIT_DEFAULTS, **(vit_config or {})})
+    model = getattr(models, arch)(weights=PRETRAINED_WEIGHTS[arch] if pretrained else None)
+    if arch.startswith("resnet"):
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    else:
+        model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+    return model
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    Return (state_dict, info) from a training checkpoint, a bare state dict or
+    an exported .safetensors file. info always has an 'arch' key (older
+    checkpoints without one are ResNet-50); ViT checkpoints also carry
+    'vit_config'.
+    """
+    info = {}
+    if str(checkpoint_path).endswith(".safetensors"):
+        from safetensors import safe_open
+        from safetensors.torch import load_file
+        with safe_open(str(checkpoint_path), framework="pt") as f:
+            info = dict(f.metadata() or {})
+        state_dict = {k: v.float() if v.is_floating_point() else v for k, v in load_file(str(checkpoint_path)).items()}
+    else:
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', mmap=True)
+        if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+            state_dict = checkpoint['model_state_dict']
+            info = {k: v for k, v in checkpoint.items() if k not in ('model_state_dict', 'optimizer_state_dict')}
+        else:
+            state_dict = checkpoint
+    if isinstance(info.get("vit_config"), str):
+        info["vit_config"] = json.loads(info["vit_config"])
+    info.setdefault("arch", "resnet50")
+    return state_dict, info
@@ -0,0 +1,13 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+# The compile helpers are defined once, in the API's utils/compile.py, and loaded from there
+# by path so training recognises the same compile failures and uses the same on-disk cache.
+_spec = importlib.util.spec_from_file_location("aquasense_compile", Path(__file__).resolve().parent.parent / "api" / "utils" / "compile.py")
+_compile = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = _compile
+_spec.loader.exec_module(_compile)
+
+COMPILE_ERRORS = _compile.COMPILE_ERRORS
+configure_compile_cache = _compile.configure_compile_cache
@@ -0,0 +1,108 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from classifiers import build_classifier
+from dataset import species_classes
+from distill import cpu_latency
+from evaluate import load_classifier
+
+
+def _load(checkpoint):
+    if checkpoint and os.path.exists(checkpoint):
+        model, info = load_classifier(checkpoint, torch.device("cpu"))
+        return model, info["arch"]
+    return build_classifier("resnet50", len(species_classes)).eval(), "resnet50"
+
+
+def _run(checkpoint, mode, batch_sizes, threads, cache_dir, runs):
+    """
+    Runs in a fresh process so every run starts with an empty in-memory
+    compiler state: only the on-disk cache in cache_dir carries over.
+    mode None is the eager baseline.
+    """
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = cache_dir
+    os.environ["TORCHINDUCTOR_FX_GRAPH_CACHE"] = "1"
+    os.environ["TORCHINDUCTOR_AUTOGRAD_CACHE"] = "1"
+    torch.set_num_threads(threads)
+    model, arch = _load(checkpoint)
+    if mode is not None:
+        model = torch.compile(model, mode=mode)
+
+    result = {"arch": arch, "first_call_s": {}, "cpu_latency": {}}
+    with torch.no_grad():
+        # Same order as the API's warm-up: batch size 1, then the size that makes the batch dim dynamic
+        for bs in batch_sizes:
+            start = time.perf_counter()
+            model(torch.zeros(bs, 3, 224, 224))
+            result["first_call_s"][str(bs)] = time.perf_counter() - start
+        for bs in batch_sizes:
+            result["cpu_latency"][str(bs)] = cpu_latency(model, bs, runs=runs)
+    return result
+
+
+def run_isolated(*args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_run, *args).result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark torch.compile against eager for the classifier on the CPU")
+    parser.add_argument("--checkpoint", default="best_model.pth", help="Checkpoint to benchmark (an untrained ResNet-50 if missing)")
+    parser.add_argument("--modes", nargs="+", default=["default", "max-autotune-no-cudagraphs"], help="torch.compile modes to compare")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--cache-dir", default=None, help="Compile cache to reuse (default: a fresh temporary one, removed afterwards)")
+    parser.add_argument("--report", default="compile_benchmark.json")
+    args = parser.parse_args(argv)
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="compile_cache_")
+    try:
+        runs = {"eager": run_isolated(args.checkpoint, None, args.batch_sizes, args.threads, cache_dir, args.runs)}
+        for mode in args.modes:
+            # Second run of each mode is a restart against the cache the first one filled
+            try:
+                cold = run_isolated(args.checkpoint, mode, args.batch_sizes, args.threads, cache_dir, args.runs)
+                warm = run_isolated(args.checkpoint, mode, args.batch_sizes, args.threads, cache_dir, args.runs)
+            except Exception as e:
+                print(f"{mode}: compile failed ({type(e).__name__}: {e}); the API would serve this eagerly")
+                runs[mode] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            runs[mode] = {**warm, "first_call_s": {"cold": cold["first_call_s"], "cached": warm["first_call_s"]}}
+    finally:
+        if args.cache_dir is None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    eager = runs["eager"]["cpu_latency"]
+    for name, run in runs.items():
+        if "cpu_latency" in run:
+            run["speedup"] = {bs: eager[bs]["p50_ms"] / run["cpu_latency"][bs]["p50_ms"] for bs in eager}
+    with open(args.report, "w") as f:
+        json.dump({"checkpoint": args.checkpoint, "threads": args.threads, "runs": runs}, f, indent=2)
+
+    print(f"{'mode':<28}{'batch':>6}{'p50 ms':>10}{'p95 ms':>10}{'speedup':>9}{'compile s':>11}{'cached s':>10}")
+    for name, run in runs.items():
+        if "cpu_latency" not in run:
+            continue
+        for bs in map(str, args.batch_sizes):
+            latency = run["cpu_latency"][bs]
+            if name == "eager":
+                first = f"{'-':>11}{'-':>10}"
+            else:
+                first = f"{run['first_call_s']['cold'][bs]:>11.1f}{run['first_call_s']['cached'][bs]:>10.1f}"
+            print(f"{name:<28}{bs:>6}{latency['p50_ms']:>10.1f}{latency['p95_ms']:>10.1f}{run['speedup'][bs]:>9.2f}{first}")
+    print(f"Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+from torch.utils.data import Dataset
+
+# Path setup
+dataset_dir = Path("C:/Users/ricks/Downloads/Data/Data/classification_dataset/images")
+labels_file = Path("C:/Users/ricks/Downloads/Data/Data/classification_dataset/labels.txt")
+
+# One row per image with its frozen split; built and updated by manifest.py
+MANIFEST_COLUMNS = ["filename", "sha256", "width", "height", "size", "mtime_ns", "label", "split"]
+SPLIT_FRACTIONS = {"train": 0.72, "val": 0.18, "test": 0.10}
+
+label_map = {
+    "crab": 0,
+    "Eel": 1,
+    "flatfish": 2,
+    "roundfish": 3,
+    "Scallop": 4,
+    "skate": 5,
+    "whelk": 6
+}
+
+# Display names in label id order (same order the API uses)
+species_classes = ['Crab', 'Eel', 'Flatfish', 'Roundfish', 'Scallop', 'Skate', 'Whelk']
+
+
+def manifest_path(dataset_dir=dataset_dir):
+    return Path(dataset_dir).parent / "manifest.csv"
+
+
+def read_manifest(manifest_file):
+    return pd.read_csv(manifest_file, dtype={"filename": str, "sha256": str, "label": str, "split": str})
+
+
+def load_splits(dataset_dir=dataset_dir, manifest_file=None):
+    """
+    Return the (train, val, test) dataframes frozen in the dataset manifest
+    (default: manifest.csv next to the image directory). Build or update
+    it with manifest.py; the first build reproduces the stratified 72/18/10
+    split every training script has used.
+    """
+    dataset_dir = Path(dataset_dir)
+    manifest_file = Path(manifest_file or manifest_path(dataset_dir))
+    if not manifest_file.exists():
+        raise FileNotFoundError(f"{manifest_file} not found - build it with: python manifest.py --dataset-dir {dataset_dir} --labels-file <labels.txt>")
+
+    df = read_manifest(manifest_file)
+    df["path"] = df["filename"].apply(lambda x: dataset_dir / x)
+    df['label_id'] = df['label'].map(label_map)
+    return tuple(df[df["split"] == split].reset_index(drop=True) for split in SPLIT_FRACTIONS)
+
+
+class BenthicDataset(Dataset):
+    def __init__(self, df, transform):
+        self.df = df.reset_index(drop = True)
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.df)
+
+    def __getitem__(self,idx):
+        row = self.df.iloc[idx]
+        image = Image.open(row['path']).convert("RGB")
+        label = row['label_id']
+        image = self.transform(image)
+        return image, label
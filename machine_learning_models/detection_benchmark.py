@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# Same id -> species mapping the API uses for the detection model
+CLASS_MAPPING = {
+    0: 'Crab',
+    1: 'Eel',
+    2: 'Flatfish',
+    3: 'Roundfish',
+    4: 'Scallop',
+    5: 'Skate',
+    6: 'Whelk'
+}
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def load_labels(label_path, width, height):
+    """Read a YOLO label file (cls cx cy w h, normalized) into pixel xyxy boxes."""
+    if not label_path.exists() or label_path.stat().st_size == 0:
+        return np.zeros((0,), dtype=np.int64), np.zeros((0, 4), dtype=np.float32)
+    rows = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    cls = rows[:, 0].astype(np.int64)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return cls, boxes
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_predictions(pred_cls, pred_boxes, gt_cls, gt_boxes):
+    """
+    Mark each prediction as a true positive at each IoU threshold. Every ground
+    truth box can be claimed by at most one prediction (highest IoU wins).
+    """
+    tp = np.zeros((len(pred_cls), len(IOU_THRESHOLDS)), dtype=bool)
+    if len(pred_cls) == 0 or len(gt_cls) == 0:
+        return tp
+    iou = box_iou(pred_boxes, gt_boxes) * (pred_cls[:, None] == gt_cls[None, :])
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        pi, gi = np.nonzero(iou >= threshold)
+        if len(pi) == 0:
+            continue
+        # np.unique keeps the first occurrence and returns it in index order, so sort by IoU
+        # before each pass: the best pair per prediction, then the best of those per ground truth
+        order = np.argsort(-iou[pi, gi], kind="stable")
+        pi, gi = pi[order], gi[order]
+        _, first_pred = np.unique(pi, return_index=True)
+        pi, gi = pi[first_pred], gi[first_pred]
+        order = np.argsort(-iou[pi, gi], kind="stable")
+        pi, gi = pi[order], gi[order]
+        _, first_gt = np.unique(gi, return_index=True)
+        tp[pi[first_gt], t] = True
+    return tp
+
+
+def average_precision(tp, conf, pred_cls, num_gt, num_classes):
+    """
+    COCO-style 101-point interpolated AP per class and IoU threshold.
+    Returns (ap[num_classes, num_thresholds], precision curves at IoU 0.5).
+    """
+    recall_grid = np.linspace(0, 1, 101)
+    ap = np.zeros((num_classes, tp.shape[1]))
+    pr_curves = np.zeros((num_classes, len(recall_grid)))
+
+    order = np.argsort(-conf, kind="stable")
+    tp, pred_cls = tp[order], pred_cls[order]
+
+    for c in range(num_classes):
+        mask = pred_cls == c
+        if num_gt[c] == 0 or not mask.any():
+            continue
+        tpc = np.cumsum(tp[mask], axis=0)
+        fpc = np.cumsum(~tp[mask], axis=0)
+        recall = tpc / num_gt[c]
+        precision = tpc / (tpc + fpc)
+        for t in range(tp.shape[1]):
+            # Precision envelope (monotonically decreasing) then sample on the recall grid
+            envelope = np.maximum.accumulate(precision[::-1, t])[::-1]
+            idx = np.searchsorted(recall[:, t], recall_grid, side="left")
+            sampled = np.where(idx < len(envelope), envelope[np.minimum(idx, len(envelope) - 1)], 0.0)
+            ap[c, t] = sampled.mean()
+            if t == 0:
+                pr_curves[c] = sampled
+    return ap, pr_curves
+
+
+def list_images(data_dir):
+    image_dir = data_dir / "images" if (data_dir / "images").is_dir() else data_dir
+    label_dir = data_dir / "labels" if (data_dir / "labels").is_dir() else data_dir
+    images = sorted(p for p in image_dir.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    return images, [label_dir / p.relative_to(image_dir).with_suffix(".txt") for p in images]
+
+
+def run_size(model, images, labels, imgsz, batch_size, conf, iou, workers, num_classes):
+    all_tp, all_conf, all_cls = [], [], []
+    num_gt = np.zeros(num_classes, dtype=np.int64)
+    batch_seconds = []
+    decoded = errors = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(images), batch_size):
+            paths = images[start:start + batch_size]
+            # Decode outside the timed region so throughput reflects the model, not disk
+            frames = list(pool.map(lambda p: cv2.imread(str(p)), paths))
+            # cv2.imread returns None for unreadable files; count them and benchmark the rest
+            readable = [i for i, frame in enumerate(frames) if frame is not None]
+            errors += len(frames) - len(readable)
+            if not readable:
+                continue
+            frames = [frames[i] for i in readable]
+            batch_labels = [labels[start + i] for i in readable]
+            decoded += len(frames)
+
+            t0 = time.perf_counter()
+            results = model.predict(frames, imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+            batch_seconds.append(time.perf_counter() - t0)
+
+            for frame, label_path, result in zip(frames, batch_labels, results):
+                h, w = frame.shape[:2]
+                gt_cls, gt_boxes = load_labels(label_path, w, h)
+                num_gt += np.bincount(gt_cls, minlength=num_classes)[:num_classes]
+
+                boxes = result.boxes
+                pred_boxes = boxes.xyxy.cpu().numpy()
+                pred_conf = boxes.conf.cpu().numpy()
+                pred_cls = boxes.cls.cpu().numpy().astype(np.int64)
+                all_tp.append(match_predictions(pred_cls, pred_boxes, gt_cls, gt_boxes))
+                all_conf.append(pred_conf)
+                all_cls.append(pred_cls)
+
+    tp = np.concatenate(all_tp) if all_tp else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+    ap, pr_curves = average_precision(
+        tp, np.concatenate(all_conf) if all_conf else np.zeros(0),
+        np.concatenate(all_cls) if all_cls else np.zeros(0, dtype=np.int64),
+        num_gt, num_classes,
+    )
+    present = num_gt > 0
+    seconds = float(np.sum(batch_seconds))
+    return {
+        "imgsz": imgsz,
+        "map50": float(ap[present, 0].mean()) if present.any() else 0.0,
+        "map50_95": float(ap[present].mean()) if present.any() else 0.0,
+        "images_per_sec": decoded / seconds if seconds > 0 else 0.0,
+        "errors": errors,
+        "per_class": {
+            CLASS_MAPPING[c]: {"ap50": float(ap[c, 0]), "ap50_95": float(ap[c].mean()), "instances": int(num_gt[c])}
+            for c in range(num_classes)
+        },
+    }, pr_curves
+
+
+def measure_latency(model, images, imgsz, conf, iou, samples, warmup):
+    """Single-image (API-style) latency percentiles in milliseconds, at the same thresholds as the accuracy run."""
+    frames = [frame for frame in (cv2.imread(str(p)) for p in images[:samples]) if frame is not None]
+    for frame in frames[:warmup]:
+        model.predict(frame, imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+    latencies = []
+    for frame in frames:
+        t0 = time.perf_counter()
+        model.predict(frame, imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {f"latency_p{q}_ms": float(np.percentile(latencies, q)) for q in (50, 90, 95, 99)}
+
+
+def save_pr_curve(pr_curves, imgsz, output_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    recall = np.linspace(0, 1, 101)
+    fig, ax = plt.subplots(figsize=(8, 6))
+    for c, name in CLASS_MAPPING.items():
+        ax.plot(recall, pr_curves[c], linewidth=1, label=name)
+    ax.plot(recall, pr_curves.mean(axis=0), linewidth=3, color="blue", label="all classes")
+    ax.set_xlabel("Recall")
+    ax.set_ylabel("Precision")
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.set_title(f"Precision-Recall @ IoU 0.5 (imgsz {imgsz})")
+    ax.legend(loc="lower left")
+    fig.tight_layout()
+    fig.savefig(output_dir / f"pr_curve_{imgsz}.png", dpi=150)
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="mAP and throughput benchmark for the YOLO detector")
+    parser.add_argument("--weights", default="multi_species.pt")
+    parser.add_argument("--data-dir", required=True, help="Folder with images/ and labels/ in YOLO format")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[320, 480, 640])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--conf", type=float, default=0.001, help="Low threshold so the PR curve is complete")
+    parser.add_argument("--iou", type=float, default=0.7, help="NMS IoU threshold")
+    parser.add_argument("--workers", type=int, default=8, help="Image decode threads")
+    parser.add_argument("--latency-samples", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-map50", type=float, default=None, help="Accuracy bar used to recommend an imgsz")
+    parser.add_argument("--output-dir", default="detection_benchmark")
+    args = parser.parse_args(argv)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    images, labels = list_images(Path(args.data_dir))
+    if not images:
+        print(f"No images found under {args.data_dir}")
+        return 1
+
+    model = YOLO(args.weights)
+    num_classes = len(CLASS_MAPPING)
+    rows = []
+    for imgsz in args.imgsz:
+        print(f"Benchmarking imgsz={imgsz} on {len(images)} images...")
+        row, pr_curves = run_size(model, images, labels, imgsz, args.batch_size, args.conf, args.iou,
+                                  args.workers, num_classes)
+        if row["errors"]:
+            print(f"Skipped {row['errors']} unreadable images")
+        row.update(measure_latency(model, images, imgsz, args.conf, args.iou, args.latency_samples, args.warmup))
+        save_pr_curve(pr_curves, imgsz, output_dir)
+        rows.append(row)
+
+    with open(output_dir / "detection_benchmark.json", "w") as f:
+        json.dump(rows, f, indent=2)
+    fields = ["imgsz", "map50", "map50_95", "images_per_sec", "latency_p50_ms", "latency_p90_ms", "latency_p95_ms", "latency_p99_ms", "errors"]
+    with open(output_dir / "detection_benchmark.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"{'imgsz':>6}{'mAP50':>9}{'mAP50-95':>10}{'img/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in rows:
+        print(f"{row['imgsz']:>6}{row['map50']:>9.3f}{row['map50_95']:>10.3f}{row['images_per_sec']:>9.1f}"
+              f"{row['latency_p50_ms']:>9.1f}{row['latency_p95_ms']:>9.1f}")
+
+    if args.min_map50 is not None:
+        passing = [r for r in rows if r["map50"] >= args.min_map50]
+        if passing:
+            best = max(passing, key=lambda r: r["images_per_sec"])
+            print(f"Fastest imgsz meeting mAP50 >= {args.min_map50}: {best['imgsz']}")
+        else:
+            print(f"No imgsz meets mAP50 >= {args.min_map50}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
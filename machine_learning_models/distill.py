@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset
+from torchvision import models
+from tqdm import tqdm
+
+from backends import EagerBackend
+from classifiers import ARCHS, build_classifier
+from dataset import BenthicDataset, load_splits, species_classes, dataset_dir
+from evaluate import compare_backends, load_classifier, make_loader
+
+
+class IndexedDataset(Dataset):
+    """BenthicDataset that also returns the row index, to look up cached teacher logits."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        image, label = self.dataset[idx]
+        return image, label, idx
+
+
+@torch.inference_mode()
+def teacher_logits(teacher, dataset, batch_size, num_workers, device):
+    """
+    Run the teacher over the training split once. The transforms are
+    deterministic, so these logits are valid for every epoch and the
+    ResNet-50 never has to run inside the training loop.
+    """
+    loader = DataLoader(IndexedDataset(dataset), batch_size=batch_size, num_workers=num_workers)
+    logits = torch.empty(len(dataset), len(species_classes))
+    for images, _, idx in tqdm(loader, ncols=100, desc="Teacher logits"):
+        logits[idx] = teacher(images.to(device)).float().cpu()
+    return logits
+
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature, alpha, label_smoothing=0.1):
+    # Soft targets (scaled by T^2 so their gradients match the hard loss) + the usual hard-label loss
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean"
+    ) * temperature ** 2
+    hard = F.cross_entropy(student_logits, labels, label_smoothing=label_smoothing)
+    return alpha * soft + (1 - alpha) * hard
+
+
+@torch.inference_mode()
+def accuracy(model, loader, device):
+    model.eval()
+    correct = total = 0
+    for images, labels in loader:
+        preds = model(images.to(device)).argmax(dim=1).cpu()
+        correct += (preds == labels).sum().item()
+        total += labels.size(0)
+    return correct / max(total, 1)
+
+
+@torch.inference_mode()
+def cpu_latency(model, batch_size, runs=30, warmup=5):
+    """Median and p95 milliseconds per forward pass on the CPU at this batch size."""
+    model = model.cpu().eval()
+    images = torch.randn(batch_size, 3, 224, 224)
+    for _ in range(warmup):
+        model(images)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model(images)
+        times.append(time.perf_counter() - start)
+    times = torch.tensor(times)
+    return {"p50_ms": times.quantile(0.5).item() * 1000, "p95_ms": times.quantile(0.95).item() * 1000}
+
+
+def distill(teacher, student, train_df, val_df, args, device):
+    """Train the student on cached teacher soft targets; keeps the best-val-accuracy weights in args.output."""
+    transform = models.ResNet50_Weights.DEFAULT.transforms()
+    train_dataset = BenthicDataset(train_df, transform)
+    soft_targets = teacher_logits(teacher, train_dataset, args.batch_size, args.num_workers, device)
+
+    train_loader = DataLoader(IndexedDataset(train_dataset), batch_size=args.batch_size, shuffle=True,
+                              num_workers=args.num_workers, pin_memory=device.type == "cuda")
+    val_loader = make_loader(val_df, args.batch_size, args.num_workers, device)
+
+    optimizer = optim.AdamW(student.parameters(), lr=args.lr, weight_decay=1e-4)
+    scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs)
+    best_val_acc = 0.0
+
+    for epoch in range(args.epochs):
+        student.train()
+        loop = tqdm(train_loader, total=len(train_loader), ncols=100, desc=f"Epoch {epoch+1}/{args.epochs}")
+        running_loss = 0.0
+        correct = 0
+        total = 0
+
+        for images, labels, idx in loop:
+            images = images.to(device)
+            labels = labels.to(device)
+
+            optimizer.zero_grad()
+            outputs = student(images)
+            loss = distillation_loss(outputs, soft_targets[idx].to(device), labels, args.temperature, args.alpha)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item() * images.size(0)
+            correct += (outputs.argmax(dim=1) == labels).sum().item()
+            total += labels.size(0)
+            loop.set_postfix(loss=running_loss/total, acc=correct/total)
+        scheduler.step()
+
+        val_acc = accuracy(student, val_loader, device)
+        loop.write(f"Epoch {epoch+1}/{args.epochs} —  Train Loss: {running_loss/total:.4f}, Train Acc: {correct/total:.4f}, Val Acc: {val_acc:.4f}")
+
+        if val_acc > best_val_acc or epoch == 0:
+            best_val_acc = val_acc
+            # 'arch' lets the API's load_model (and evaluate.py) rebuild the right network
+            torch.save({
+                'arch': args.student,
+                'vit_config': student.config() if args.student == "vit" else None,
+                'epoch': epoch + 1,
+                'model_state_dict': student.state_dict(),
+                'val_acc': val_acc,
+                'teacher': str(args.teacher),
+                'temperature': args.temperature,
+                'alpha': args.alpha
+            }, args.output)
+            tqdm.write(f"Student saved at epoch {epoch+1} with Val Acc: {val_acc:.4f}")
+    return best_val_acc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distill the ResNet-50 teacher into a smaller student classifier")
+    parser.add_argument("--teacher", default="best_model.pth", help="Teacher checkpoint (.pth or .safetensors)")
+    parser.add_argument("--student", choices=[a for a in ARCHS if a != "resnet50"], default="mobilenet_v3_large")
+    parser.add_argument("--output", default=None, help="Student checkpoint path (default: student_<arch>.pth)")
+    parser.add_argument("--dataset-dir", default=str(dataset_dir))
+    parser.add_argument("--manifest", default=None, help="Dataset manifest from manifest.py (default: manifest.csv next to --dataset-dir)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--temperature", type=float, default=4.0, help="Softmax temperature for the soft targets")
+    parser.add_argument("--alpha", type=float, default=0.7, help="Weight of the soft-target loss (1 - alpha on the labels)")
+    parser.add_argument("--no-pretrained", action="store_true", help="Start the student from random weights instead of ImageNet")
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency-batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--report", default=None, help="JSON report path (default: <output>.report.json)")
+    args = parser.parse_args(argv)
+    args.output = args.output or f"student_{args.student}.pth"
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print("Using device:", device)
+
+    # Same stratified split as pretrained_cnn.py, so test images stay unseen by both models
+    train_df, val_df, test_df = load_splits(args.dataset_dir, args.manifest)
+
+    teacher, _ = load_classifier(args.teacher, device)
+    student = build_classifier(args.student, len(species_classes), pretrained=not args.no_pretrained).to(device)
+
+    best_val_acc = distill(teacher, student, train_df, val_df, args, device)
+
+    # Compare the best student with the teacher on the held-out test split
+    student, _ = load_classifier(args.output, device)
+    test_loader = make_loader(test_df, args.batch_size, args.num_workers, device)
+    summary, _ = compare_backends({"teacher": EagerBackend(teacher), "student": EagerBackend(student)}, test_loader, test_df, device)
+    results = {row["backend"]: row for row in summary}
+
+    for name, model in (("teacher", teacher), ("student", student)):
+        results[name]["parameters"] = sum(p.numel() for p in model.parameters())
+        results[name]["cpu_latency"] = {str(bs): cpu_latency(model, bs) for bs in args.latency_batch_sizes}
+
+    report = {
+        "teacher": str(args.teacher),
+        "student": args.output,
+        "arch": args.student,
+        "best_val_acc": best_val_acc,
+        "test": results,
+    }
+    with open(args.report or f"{args.output}.report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'model':<10}{'params':>12}{'test acc':>10}{'agreement':>11}" + "".join(f"{f'cpu ms@{bs}':>13}" for bs in args.latency_batch_sizes))
+    for name in ("teacher", "student"):
+        row = results[name]
+        print(f"{name:<10}{row['parameters']:>12,}{row['accuracy']:>10.4f}{row['agreement']:>11.4f}"
+              + "".join(f"{row['cpu_latency'][str(bs)]['p50_ms']:>13.1f}" for bs in args.latency_batch_sizes))
+    print(f"Student checkpoint: {args.output} (serve it with MODEL_PATH or FAST_MODEL_PATH)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+from torchvision import models
+from torch.utils.data import DataLoader
+
+from backends import EagerBackend, build_backend, parse_backend_spec
+from classifiers import build_classifier, read_checkpoint
+from dataset import BenthicDataset, load_splits, species_classes, dataset_dir
+
+# Name of the --checkpoint row in a backend comparison
+REFERENCE_BACKEND = "reference"
+
+
+class EvalAccumulator:
+    """
+    Running evaluation statistics for a classifier. Every counter is a
+    preallocated tensor updated with vectorized ops per batch, so memory stays
+    constant no matter how many images are streamed through.
+    """
+
+    def __init__(self, num_classes, topk=(1, 3), num_bins=15):
+        self.num_classes = num_classes
+        # k past the number of classes is clamped (top-7 of 7 classes is always a hit)
+        self.topk = sorted({min(k, num_classes) for k in topk if k >= 1}) or [1]
+        self.num_bins = num_bins
+
+        self.confusion = torch.zeros(num_classes, num_classes, dtype=torch.int64)
+        self.topk_correct = torch.zeros(len(self.topk), dtype=torch.int64)
+        self.bin_count = torch.zeros(num_bins, dtype=torch.int64)
+        self.bin_conf = torch.zeros(num_bins, dtype=torch.float64)
+        self.bin_correct = torch.zeros(num_bins, dtype=torch.float64)
+        self.nll_sum = 0.0
+        self.total = 0
+
+    @torch.no_grad()
+    def update(self, logits, labels):
+        logits = logits.detach().float().cpu()
+        labels = labels.cpu().long()
+        C = self.num_classes
+
+        probs = F.softmax(logits, dim=1)
+        conf, preds = probs.max(dim=1)
+
+        # Confusion matrix (rows = true, cols = predicted) in a single bincount
+        self.confusion += torch.bincount(labels * C + preds, minlength=C * C).view(C, C)
+
+        # Top-k: hits along the ranked axis, cumulative so hit@k covers hit@1..k
+        ranked = logits.topk(self.topk[-1], dim=1).indices
+        hits = (ranked == labels[:, None]).cumsum(dim=1).clamp_(max=1)
+        self.topk_correct += hits[:, [k - 1 for k in self.topk]].sum(dim=0)
+
+        # Reliability bins for calibration
+        correct = (preds == labels).double()
+        bins = (conf * self.num_bins).long().clamp_(max=self.num_bins - 1)
+        self.bin_count += torch.bincount(bins, minlength=self.num_bins)
+        self.bin_conf.index_add_(0, bins, conf.double())
+        self.bin_correct.index_add_(0, bins, correct)
+
+        self.nll_sum += F.cross_entropy(logits, labels, reduction='sum').item()
+        self.total += labels.size(0)
+        return preds
+
+    def report(self, class_names):
+        cm = self.confusion.double()
+        tp = cm.diag()
+        support = cm.sum(dim=1)
+        predicted = cm.sum(dim=0)
+        precision = torch.where(predicted > 0, tp / predicted.clamp(min=1), torch.zeros_like(tp))
+        recall = torch.where(support > 0, tp / support.clamp(min=1), torch.zeros_like(tp))
+        denom = precision + recall
+        f1 = torch.where(denom > 0, 2 * precision * recall / denom.clamp(min=1e-12), torch.zeros_like(tp))
+
+        total = max(self.total, 1)
+        nonempty = self.bin_count > 0
+        bin_acc = torch.where(nonempty, self.bin_correct / self.bin_count.clamp(min=1), torch.zeros_like(self.bin_correct))
+        bin_conf = torch.where(nonempty, self.bin_conf / self.bin_count.clamp(min=1), torch.zeros_like(self.bin_conf))
+        ece = ((self.bin_count.double() / total) * (bin_acc - bin_conf).abs()).sum().item()
+
+        return {
+            "num_images": self.total,
+            "accuracy": tp.sum().item() / total,
+            "nll": self.nll_sum / total,
+            "topk_accuracy": {f"top{k}": self.topk_correct[i].item() / total for i, k in enumerate(self.topk)},
+            "macro_precision": precision.mean().item(),
+            "macro_recall": recall.mean().item(),
+            "macro_f1": f1.mean().item(),
+            "ece": ece,
+            "per_class": [
+                {
+                    "class": name,
+                    "precision": precision[i].item(),
+                    "recall": recall[i].item(),
+                    "f1": f1[i].item(),
+                    "support": int(support[i].item()),
+                }
+                for i, name in enumerate(class_names)
+            ],
+            "calibration": [
+                {
+                    "bin_lower": i / self.num_bins,
+                    "bin_upper": (i + 1) / self.num_bins,
+                    "count": int(self.bin_count[i].item()),
+                    "confidence": bin_conf[i].item(),
+                    "accuracy": bin_acc[i].item(),
+                }
+                for i in range(self.num_bins)
+            ],
+            "confusion_matrix": self.confusion.tolist(),
+        }
+
+
+def load_classifier(checkpoint_path, device):
+    state_dict, info = read_checkpoint(checkpoint_path)
+    model = build_classifier(info["arch"], len(species_classes), vit_config=info.get("vit_config"))
+    model.load_state_dict(state_dict)
+    return model.to(device).eval(), info
+
+
+def make_loader(split_df, batch_size, num_workers, device):
+    test_transforms = models.ResNet50_Weights.DEFAULT.transforms()
+    return DataLoader(
+        BenthicDataset(split_df, test_transforms),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",
+        prefetch_factor=4 if num_workers > 0 else None,
+    )
+
+
+def write_report(report, output_dir, class_names):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / "report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    with open(output_dir / "per_class.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["class", "precision", "recall", "f1", "support"])
+        writer.writeheader()
+        writer.writerows(report["per_class"])
+
+    # Headless backend so this runs on machines without a display
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import ConfusionMatrixDisplay
+
+    fig, ax = plt.subplots(figsize=(8, 8))
+    disp = ConfusionMatrixDisplay(confusion_matrix=torch.tensor(report["confusion_matrix"]).numpy(), display_labels=class_names)
+    disp.plot(cmap=plt.cm.Blues, ax=ax, colorbar=False)
+    ax.set_title(f"Test accuracy: {report['accuracy']:.4f}")
+    fig.tight_layout()
+    fig.savefig(output_dir / "confusion_matrix.png", dpi=150)
+    plt.close(fig)
+
+
+def evaluate(model, loader, device, topk=(1, 3), num_bins=15):
+    acc = EvalAccumulator(len(species_classes), topk=topk, num_bins=num_bins)
+    start = time.perf_counter()
+    with torch.inference_mode():
+        for images, labels in loader:
+            images = images.to(device, non_blocking=True)
+            acc.update(model(images), labels)
+    elapsed = time.perf_counter() - start
+    report = acc.report(species_classes)
+    report["seconds"] = elapsed
+    report["images_per_sec"] = acc.total / elapsed if elapsed > 0 else 0.0
+    return report
+
+
+def compare_backends(backends, loader, split_df, device, topk=(1, 3), num_bins=15):
+    """
+    Run every backend over the same batches (images are decoded once) and
+    collect per-backend accuracy, throughput and per-image agreement with the
+    first backend, which is treated as the reference.
+    """
+    names = list(backends)
+    num_images = len(split_df)
+    accumulators = {name: EvalAccumulator(len(species_classes), topk=topk, num_bins=num_bins) for name in names}
+    preds = {name: torch.empty(num_images, dtype=torch.int64) for name in names}
+    max_prob_delta = {name: torch.zeros(num_images) for name in names}
+    batch_seconds = {name: [] for name in names}
+    labels_all = torch.empty(num_images, dtype=torch.int64)
+
+    offset = 0
+    warmed_up = False
+    with torch.inference_mode():
+        for images, labels in loader:
+            images = images.to(device, non_blocking=True)
+            n = labels.size(0)
+            labels_all[offset:offset + n] = labels
+
+            if not warmed_up:
+                for name in names:
+                    backends[name](images)
+                warmed_up = True
+
+            ref_probs = None
+            for name in names:
+                start = time.perf_counter()
+                logits = backends[name](images)
+                batch_seconds[name].append(time.perf_counter() - start)
+
+                logits = logits.float().cpu()
+                preds[name][offset:offset + n] = accumulators[name].update(logits, labels)
+                probs = F.softmax(logits, dim=1)
+                if ref_probs is None:
+                    ref_probs = probs
+                max_prob_delta[name][offset:offset + n] = (probs - ref_probs).abs().max(dim=1).values
+            offset += n
+
+    reference = names[0]
+    summary = []
+    for name in names:
+        report = accumulators[name].report(species_classes)
+        times = torch.tensor(batch_seconds[name], dtype=torch.float64)
+        seconds = times.sum().item()
+        disagree = (preds[name][:offset] != preds[reference][:offset])
+        summary.append({
+            "backend": name,
+            "kind": getattr(backends[name], "kind", ""),
+            "accuracy": report["accuracy"],
+            "macro_f1": report["macro_f1"],
+            "ece": report["ece"],
+            "images_per_sec": offset / seconds if seconds > 0 else 0.0,
+            "batch_latency_p50_ms": times.quantile(0.5).item() * 1000 if len(times) else 0.0,
+            "batch_latency_p95_ms": times.quantile(0.95).item() * 1000 if len(times) else 0.0,
+            "disagreements": int(disagree.sum().item()),
+            "agreement": 1.0 - disagree.double().mean().item() if offset else 1.0,
+            "max_prob_delta": max_prob_delta[name][:offset].max().item() if offset else 0.0,
+        })
+
+    # One row per image where any backend's top-1 differs from the reference
+    stacked = torch.stack([preds[name][:offset] for name in names], dim=1)
+    differs = (stacked != stacked[:, :1]).any(dim=1).nonzero().flatten().tolist()
+    filenames = split_df["filename"].tolist()
+    disagreements = [
+        {
+            "filename": filenames[i],
+            "label": species_classes[labels_all[i]],
+            **{name: species_classes[preds[name][i]] for name in names},
+        }
+        for i in differs
+    ]
+    return summary, disagreements
+
+
+def write_comparison(summary, disagreements, output_dir, names):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / "backends.json", "w") as f:
+        json.dump({"backends": summary, "disagreements": disagreements}, f, indent=2)
+
+    with open(output_dir / "backends.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(summary[0].keys()))
+        writer.writeheader()
+        writer.writerows(summary)
+
+    with open(output_dir / "disagreements.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["filename", "label", *names])
+        writer.writeheader()
+        writer.writerows(disagreements)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless evaluation of the species classifier")
+    parser.add_argument("--checkpoint", default="best_model.pth", help=".pth training checkpoint or exported .safetensors")
+    parser.add_argument("--dataset-dir", default=str(dataset_dir))
+    parser.add_argument("--manifest", default=None, help="Dataset manifest from manifest.py (default: manifest.csv next to --dataset-dir)")
+    parser.add_argument("--split", choices=["train", "val", "test"], default="test")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--topk", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--calibration-bins", type=int, default=15)
+    parser.add_argument("--output-dir", default="eval_report")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Exit non-zero if accuracy falls below this")
+    parser.add_argument("--backend", action="append", default=[], metavar="NAME=KIND:PATH",
+                        help="Also evaluate an exported backend (kind: eager, torchscript, onnx, int8) against --checkpoint. Repeatable.")
+    args = parser.parse_args(argv)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    train_df, val_df, test_df = load_splits(args.dataset_dir, args.manifest)
+    split_df = {"train": train_df, "val": val_df, "test": test_df}[args.split]
+    loader = make_loader(split_df, args.batch_size, args.num_workers, device)
+
+    model, info = load_classifier(args.checkpoint, device)
+
+    if args.backend:
+        # --checkpoint is the reference every other backend is compared against, under a name no spec can take
+        backends = {REFERENCE_BACKEND: EagerBackend(model)}
+        for spec in args.backend:
+            name, kind, path = parse_backend_spec(spec)
+            if name in backends:
+                parser.error(f"Duplicate backend name '{name}' in --backend {spec} ('{REFERENCE_BACKEND}' is reserved for --checkpoint)")
+            backends[name] = build_backend(kind, path, load_classifier, device)
+        print(f"Comparing {list(backends)} on {len(split_df)} {args.split} images")
+
+        summary, disagreements = compare_backends(backends, loader, split_df, device,
+                                                  topk=args.topk, num_bins=args.calibration_bins)
+        write_comparison(summary, disagreements, args.output_dir, list(backends))
+
+        print(f"{'backend':<16}{'accuracy':>10}{'agreement':>11}{'img/s':>10}{'p95 ms':>10}")
+        for row in summary:
+            print(f"{row['backend']:<16}{row['accuracy']:>10.4f}{row['agreement']:>11.4f}"
+                  f"{row['images_per_sec']:>10.1f}{row['batch_latency_p95_ms']:>10.1f}")
+        print(f"{len(disagreements)} images with disagreeing predictions, report written to {args.output_dir}")
+
+        if args.min_accuracy is not None and any(r["accuracy"] < args.min_accuracy for r in summary):
+            print(f"A backend is below the required accuracy {args.min_accuracy:.4f}")
+            return 1
+        return 0
+
+    print(f"Loaded {args.checkpoint} (epoch {info.get('epoch')}, val acc {info.get('val_acc')}) - evaluating {len(split_df)} {args.split} images on {device}")
+
+    report = evaluate(model, loader, device, topk=args.topk, num_bins=args.calibration_bins)
+    report["checkpoint"] = str(args.checkpoint)
+    report["checkpoint_info"] = {k: str(v) for k, v in info.items()}
+    report["split"] = args.split
+    write_report(report, args.output_dir, species_classes)
+
+    print(f"{args.split} accuracy: {report['accuracy']:.4f}  macro F1: {report['macro_f1']:.4f}  "
+          f"ECE: {report['ece']:.4f}  ({report['images_per_sec']:.1f} img/s)")
+    print(f"Report written to {args.output_dir}")
+
+    if args.min_accuracy is not None and report["accuracy"] < args.min_accuracy:
+        print(f"Accuracy {report['accuracy']:.4f} is below the required {args.min_accuracy:.4f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import argparse
+import json
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from torchvision import models
+from safetensors.torch import save_file
+
+from classifiers import build_classifier, read_checkpoint
+
+# Class order used by the API (matches label_map ids 0-6 used in training)
+species_classes = ['Crab', 'Eel', 'Flatfish', 'Roundfish', 'Scallop', 'Skate', 'Whelk']
+
+
+def build_metadata(checkpoint, dtype):
+    # Pull preprocessing settings straight from the transforms we train and serve with
+    preprocess = models.ResNet50_Weights.DEFAULT.transforms()
+    metadata = {
+        "arch": checkpoint.get('arch', 'resnet50'),
+        "classes": json.dumps(species_classes),
+        "input_size": json.dumps(list(preprocess.crop_size)),
+        "resize_size": json.dumps(list(preprocess.resize_size)),
+        "mean": json.dumps(list(preprocess.mean)),
+        "std": json.dumps(list(preprocess.std)),
+        "val_acc": str(checkpoint.get('val_acc', '')),
+        "epoch": str(checkpoint.get('epoch', '')),
+        "dtype": dtype,
+    }
+    if checkpoint.get('vit_config'):
+        metadata["vit_config"] = json.dumps(checkpoint['vit_config'])
+    return metadata
+
+
+def export_weights(checkpoint_path, output_path, half=False):
+    """
+    Strip the optimizer state from a training checkpoint and write the model
+    weights as a .safetensors file that the API can memory-map at startup.
+    """
+    state_dict, checkpoint = read_checkpoint(checkpoint_path)
+
+    # Sanity check the weights against the architecture before writing anything
+    model = build_classifier(checkpoint["arch"], len(species_classes), vit_config=checkpoint.get("vit_config"))
+    model.load_state_dict(state_dict)
+
+    dtype = torch.float16 if half else torch.float32
+    tensors = {
+        name: (t.to(dtype) if t.is_floating_point() else t).contiguous()
+        for name, t in model.state_dict().items()
+    }
+
+    metadata = build_metadata(checkpoint, "float16" if half else "float32")
+    save_file(tensors, str(output_path), metadata=metadata)
+    return metadata
+
+
+def load_eager(checkpoint_path):
+    state_dict, info = read_checkpoint(checkpoint_path)
+    model = build_classifier(info["arch"], len(species_classes), vit_config=info.get("vit_config"))
+    model.load_state_dict(state_dict)
+    return model.eval()
+
+
+def export_torchscript(checkpoint_path, output_path, quantize=False):
+    """Trace the model to TorchScript, optionally with dynamic int8 Linear layers."""
+    model = load_eager(checkpoint_path)
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    example = torch.randn(1, 3, 224, 224)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    traced = torch.jit.freeze(traced)
+    traced.save(str(output_path))
+
+
+def export_onnx(checkpoint_path, output_path):
+    """Export an ONNX graph with a dynamic batch dimension."""
+    model = load_eager(checkpoint_path)
+    example = torch.randn(1, 3, 224, 224)
+    torch.onnx.export(
+        model, example, str(output_path),
+        input_names=["images"], output_names=["logits"],
+        dynamic_axes={"images": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an inference-only copy of a training checkpoint")
+    parser.add_argument("--checkpoint", default="best_model.pth", help="Training checkpoint written by pretrained_cnn.py")
+    parser.add_argument("--output", default="single_species.safetensors", help="Where to write the exported weights")
+    parser.add_argument("--half", action="store_true", help="Store weights in float16 (half the file size; the API upcasts them to float32 at load, so they are not memory-mapped)")
+    parser.add_argument("--format", choices=["safetensors", "torchscript", "int8", "onnx"], default="safetensors",
+                        help="safetensors weights for the API, or a TorchScript/int8 TorchScript/ONNX graph for evaluate.py --backend")
+    args = parser.parse_args()
+
+    if args.format == "safetensors":
+        metadata = export_weights(args.checkpoint, args.output, half=args.half)
+        print(f"Metadata: {metadata}")
+    elif args.format == "onnx":
+        export_onnx(args.checkpoint, args.output)
+    else:
+        export_torchscript(args.checkpoint, args.output, quantize=args.format == "int8")
+
+    in_size = Path(args.checkpoint).stat().st_size / (1024 * 1024)
+    out_size = Path(args.output).stat().st_size / (1024 * 1024)
+    print(f"Exported {args.checkpoint} ({in_size:.1f}MB) -> {args.output} ({out_size:.1f}MB)")
@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from PIL import Image
+from sklearn.model_selection import train_test_split
+
+from dataset import MANIFEST_COLUMNS, SPLIT_FRACTIONS, dataset_dir, label_map, labels_file, manifest_path, read_manifest
+
+
+def file_record(path):
+    """Content hash, size, mtime and dimensions of one image (the hash is the only part that reads the whole file)."""
+    stat = path.stat()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    try:
+        with Image.open(path) as image:
+            width, height = image.size  # Header only
+    except OSError:
+        width = height = None
+    return {"sha256": digest.hexdigest(), "width": width, "height": height, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def legacy_split(df):
+    """
+    The stratified 72/18/10 train_test_split every script used before the
+    manifest. Pass it the labels.txt listing as read (duplicates and missing
+    files included), as the scripts did, so the first build reproduces it.
+    """
+    train_val_df, test_df = train_test_split(df, test_size=0.1, stratify=df["label_id"], random_state=42)
+    train_df, val_df = train_test_split(train_val_df, test_size=0.2, stratify=train_val_df["label_id"], random_state=42)
+    split = pd.Series("train", index=df.index)
+    split[val_df.index] = "val"
+    split[test_df.index] = "test"
+    return split
+
+
+def assign_new(new_df, existing_df):
+    """
+    Split for images not in the manifest yet. Copies of an existing image
+    (same hash, e.g. a rename) go where it is, so they can't leak across
+    splits; the rest go, per label, to whichever split is furthest below
+    its share. In hash order, so the result doesn't depend on scan order.
+    """
+    counts = existing_df.groupby(["label", "split"]).size().to_dict()
+    by_hash = dict(zip(existing_df["sha256"], existing_df["split"]))
+    splits = {}
+    for idx, row in new_df.sort_values(["sha256", "filename"]).iterrows():
+        split = by_hash.get(row["sha256"])
+        if split is None:
+            total = sum(counts.get((row["label"], s), 0) for s in SPLIT_FRACTIONS) + 1
+            split = max(SPLIT_FRACTIONS, key=lambda s: SPLIT_FRACTIONS[s] * total - counts.get((row["label"], s), 0))
+            by_hash[row["sha256"]] = split
+        counts[(row["label"], split)] = counts.get((row["label"], split), 0) + 1
+        splits[idx] = split
+    return pd.Series(splits, dtype=object)
+
+
+def update_manifest(dataset_dir, labels_file, manifest_file, workers=8):
+    """
+    Bring the manifest in line with labels.txt and the image directory.
+    Only files that are new, or whose size/mtime changed, are hashed;
+    existing files keep their split. Returns (manifest dataframe, summary).
+    """
+    dataset_dir = Path(dataset_dir)
+    labels = pd.read_csv(labels_file, sep=" ", header=None, names=["filename", "label"])
+    unknown = sorted(set(labels["label"]) - set(label_map))
+    if unknown:
+        raise ValueError(f"Unknown labels in {labels_file}: {unknown}")
+
+    old = read_manifest(manifest_file) if Path(manifest_file).exists() else pd.DataFrame(columns=MANIFEST_COLUMNS)
+    old = old.set_index("filename")
+
+    # First build: split the untouched listing, as the scripts did; a filename listed twice keeps its last row's split
+    legacy = None
+    if len(old) == 0:
+        split = legacy_split(labels.assign(label_id=labels["label"].map(label_map)))
+        legacy = dict(zip(labels["filename"], split))
+    labels = labels.drop_duplicates("filename", keep="last")
+
+    # Unchanged size and mtime: trust the recorded hash and dimensions
+    to_hash, records, missing = [], {}, []
+    for filename in labels["filename"]:
+        path = dataset_dir / filename
+        if not path.exists():
+            missing.append(filename)
+            continue
+        if filename in old.index:
+            stat = path.stat()
+            row = old.loc[filename]
+            if int(row["size"]) == stat.st_size and int(row["mtime_ns"]) == stat.st_mtime_ns:
+                records[filename] = {c: row[c] for c in ("sha256", "width", "height", "size", "mtime_ns")}
+                continue
+        to_hash.append(filename)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for filename, record in zip(to_hash, pool.map(lambda f: file_record(dataset_dir / f), to_hash)):
+            records[filename] = record
+
+    df = labels[labels["filename"].isin(records)].reset_index(drop=True)
+    df = pd.concat([df, pd.DataFrame([records[f] for f in df["filename"]])], axis=1)
+    df["split"] = df["filename"].map(old["split"]) if len(old) else None
+
+    new = df["split"].isna()
+    if legacy is not None:
+        df["split"] = df["filename"].map(legacy)
+    elif new.any():
+        df.loc[new, "split"] = assign_new(df[new], df[~new])
+
+    df = df[MANIFEST_COLUMNS].sort_values("filename").reset_index(drop=True)
+    df.to_csv(manifest_file, index=False)
+
+    leaks = df.groupby("sha256")["split"].nunique()
+    summary = {
+        "images": len(df),
+        "hashed": len(to_hash),
+        "added": int(new.sum()) if len(old) else len(df),
+        "removed": len(set(old.index) - set(df["filename"])),
+        "missing": missing,
+        "duplicates": int((df["sha256"].duplicated()).sum()),
+        "cross_split_duplicates": int((leaks > 1).sum()),
+        "splits": df.groupby(["split", "label"]).size().unstack(fill_value=0),
+    }
+    return df, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the dataset manifest (content hash, dimensions, label and frozen split per image)")
+    parser.add_argument("--dataset-dir", default=str(dataset_dir))
+    parser.add_argument("--labels-file", default=str(labels_file))
+    parser.add_argument("--manifest", default=None, help="Manifest path (default: manifest.csv next to the image directory)")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1), help="Threads hashing new images")
+    args = parser.parse_args(argv)
+
+    manifest_file = args.manifest or manifest_path(args.dataset_dir)
+    _, summary = update_manifest(args.dataset_dir, args.labels_file, manifest_file, args.workers)
+
+    print(f"{manifest_file}: {summary['images']} images, {summary['added']} added, {summary['removed']} removed, {summary['hashed']} hashed")
+    if summary["missing"]:
+        print(f"{len(summary['missing'])} files in {args.labels_file} not found, e.g. {summary['missing'][:5]}")
+    if summary["duplicates"]:
+        print(f"{summary['duplicates']} images are byte-identical copies of another ({summary['cross_split_duplicates']} across splits)")
+    print(summary["splits"].to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
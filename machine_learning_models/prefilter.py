@@ -0,0 +1,13 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+# The gate's features are defined once, in the API's utils/prefilter.py (which scores frames
+# at serving time), and loaded from there by path so training can't drift from serving.
+_spec = importlib.util.spec_from_file_location("aquasense_prefilter", Path(__file__).resolve().parent.parent / "api" / "utils" / "prefilter.py")
+_prefilter = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = _prefilter
+_spec.loader.exec_module(_prefilter)
+
+FEATURE_SIZE, TILES, FEATURE_NAMES = _prefilter.FEATURE_SIZE, _prefilter.TILES, _prefilter.FEATURE_NAMES
+frame_features = _prefilter.frame_features
@@ -1,184 +1,173 @@
-import pandas as pd
-from pathlib import Path
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-from PIL import Image
-from tqdm import tqdm
-import torch
-import numpy as np
-import torch.nn as nn
-import torch.nn.functional as F
-import torch.optim as optim
-from torchvision import transforms
-from torchvision import models
-from torch.utils.data import DataLoader
-from torch.utils.data import Dataset
-import einops
-from einops.layers.torch import Rearrange
-
-
-
-# Path setup
-dataset_dir = Path("C:/Users/ricks/Downloads/Data/Data/classification_dataset/images")
-labels_file = Path("C:/Users/ricks/Downloads/Data/Data/classification_dataset/labels.txt")
-
-# Read the text file (filename label)
-df = pd.read_csv(labels_file, sep=" ", header=None, names=["filename", "label"])
-
-# Add full path column
-df["path"] = df["filename"].apply(lambda x: dataset_dir / x)
-
-
-label_map = {
-    "crab": 0,
-    "Eel": 1,
-    "flatfish": 2,
-    "roundfish": 3,
-    "Scallop": 4,
-    "skate": 5,
-    "whelk": 6
-}
-
-
-df['label_id'] = df['label'].map(label_map)
-
-
-train_val_df, test_df = train_test_split(df, test_size=0.1, stratify=df["label_id"], random_state=42)
-
-train_df, val_df = train_test_split(train_val_df, test_size=0.2, stratify=train_val_df["label_id"], random_state=42)
-
-
-class BenthicDataset(Dataset):
-    def __init__(self, df, transform):
-        self.df = df.reset_index(drop = True)
-        self.transform = transform
-
-    def __len__(self):
-        return len(self.df)
-    
-    def __getitem__(self,idx):
-        row = self.df.iloc[idx]
-        image = Image.open(row['path'])
-        label = row['label_id']
-        image = self.transform(image)
-        return image, label
-    
-
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print("Using device:", device)
-
-
-    
-# Load pretrained ResNet-50
-weights = models.ResNet50_Weights.DEFAULT
-# --- Match pretrained normalization and transforms ---
-train_transforms = weights.transforms()
-val_transforms = weights.transforms()
-test_transforms = weights.transforms()
-
-train_dataset = BenthicDataset(train_df, train_transforms)
-val_dataset = BenthicDataset(val_df, val_transforms)
-test_dataset = BenthicDataset(test_df, test_transforms)
-
-train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=32)
-test_loader = DataLoader(test_dataset, batch_size=32)
-
-model = models.resnet50(weights = weights)
-
-num_fts = model.fc.in_features
-model.fc = nn.Linear(num_fts, 7)
-
-model = model.to(device)
-
-
-# --- Freeze backbone initially (only train classifier head) ---
-for param in model.parameters():
-    param.requires_grad = False
-for param in model.fc.parameters():
-    param.requires_grad = True
-
-
-t_params = sum(p.numel() for p in model.parameters())
-print("Network Parameters: ",t_params)
-
-num_epochs = 20
-criterion = nn.CrossEntropyLoss(label_smoothing=0.1)  # expects integer labels
-#criterion = nn.CrossEntropyLoss()
-
-# Optimizer
-optimizer = optim.AdamW(filter(lambda p: p.requires_grad, model.parameters()), lr=1e-3, weight_decay=1e-4)
-
-def Trainer(model, criterion, optimizer, num_epochs, scheduler=None, unfreeze_epoch=5):
-    best_val_acc = 0.0
-    early_stop_counter = 0
-    unfrozen = False
-
-    for epoch in range(num_epochs):
-        if (not unfrozen) and (epoch == unfreeze_epoch):
-            print(f"Unfreezing all layers at epoch {epoch+1}")
-            for param in model.parameters():
-                param.requires_grad = True
-            optimizer = optim.AdamW(model.parameters(), lr=1e-4, weight_decay=1e-4)  # lower LR after unfreezing
-            unfrozen = True
-        loop = tqdm(train_loader, total=len(train_loader), ncols=100, desc=f"Epoch {epoch+1}/{num_epochs}")
-        model.train()
-        running_loss = 0.0
-        correct = 0
-        total = 0
-
-        for images, labels in loop:
-            images = images.to(device)
-            labels = labels.to(device)
-
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-
-            running_loss += loss.item() * images.size(0)
-            _, preds = torch.max(outputs, 1)
-            correct += (preds == labels).sum().item()
-            total += labels.size(0)
-            loop.set_postfix(loss=running_loss/total, acc=correct/total)
-
-        train_loss = running_loss/total
-        train_acc = correct/total
-
-        model.eval()
-        val_correct = 0
-        val_total = 0
-        val_loss = 0
-        with torch.no_grad():
-            for images, labels in val_loader:
-                images = images.to(device)
-                labels = labels.to(device)
-
-                outputs = model(images)
-                loss = criterion(outputs, labels)
-                val_loss += loss.item() * images.size(0)
-                _,preds = torch.max(outputs,1)
-                val_correct += (preds == labels).sum().item()
-                val_total += labels.size(0)
-        val_loss /= val_total
-        val_acc = val_correct/val_total
-
-        if scheduler is not None:
-            scheduler.step(val_loss)
-
-        loop.write(f"Epoch {epoch+1}/{num_epochs} —  Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f}, Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.4f}")
-        
-        if val_acc > best_val_acc:
-            best_val_acc = val_acc
-            torch.save({
-                'epoch': epoch + 1,
-                'model_state_dict': model.state_dict(),
-                'optimizer_state_dict': optimizer.state_dict(),
-                'val_acc': val_acc
-            }, "best_model.pth")
-            tqdm.write(f"Model saved at epoch {epoch+1} with Val Acc: {val_acc:.4f}")
-
-Trainer(model=model, criterion=criterion, num_epochs=20, optimizer = optimizer, scheduler = None)
-
+import argparse
+from pathlib import Path
+from sklearn.preprocessing import LabelEncoder
+from PIL import Image
+from tqdm import tqdm
+import torch
+import numpy as np
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+from torchvision import transforms
+from torchvision import models
+from torch.utils.data import DataLoader
+from torch.utils.data import Dataset
+from dataset import BenthicDataset, dataset_dir, load_splits
+from compile import COMPILE_ERRORS, configure_compile_cache
+import einops
+from einops.layers.torch import Rearrange
+
+
+
+# Frozen split from the dataset manifest (see manifest.py)
+parser = argparse.ArgumentParser(description="Fine-tune a pretrained ResNet-50 on the frozen manifest split")
+parser.add_argument("--dataset-dir", default=str(dataset_dir))
+parser.add_argument("--manifest", default=None, help="Dataset manifest from manifest.py (default: manifest.csv next to --dataset-dir)")
+args = parser.parse_args()
+train_df, val_df, test_df = load_splits(args.dataset_dir, args.manifest)
+    
+
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+print("Using device:", device)
+
+
+    
+# Load pretrained ResNet-50
+weights = models.ResNet50_Weights.DEFAULT
+# --- Match pretrained normalization and transforms ---
+train_transforms = weights.transforms()
+val_transforms = weights.transforms()
+test_transforms = weights.transforms()
+
+train_dataset = BenthicDataset(train_df, train_transforms)
+val_dataset = BenthicDataset(val_df, val_transforms)
+test_dataset = BenthicDataset(test_df, test_transforms)
+
+train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
+val_loader = DataLoader(val_dataset, batch_size=32)
+test_loader = DataLoader(test_dataset, batch_size=32)
+
+model = models.resnet50(weights = weights)
+
+num_fts = model.fc.in_features
+model.fc = nn.Linear(num_fts, 7)
+
+model = model.to(device)
+
+
+# --- Freeze backbone initially (only train classifier head) ---
+for param in model.parameters():
+    param.requires_grad = False
+for param in model.fc.parameters():
+    param.requires_grad = True
+
+
+t_params = sum(p.numel() for p in model.parameters())
+print("Network Parameters: ",t_params)
+
+num_epochs = 20
+criterion = nn.CrossEntropyLoss(label_smoothing=0.1)  # expects integer labels
+#criterion = nn.CrossEntropyLoss()
+
+# Optimizer
+optimizer = optim.AdamW(filter(lambda p: p.requires_grad, model.parameters()), lr=1e-3, weight_decay=1e-4)
+
+def Trainer(model, criterion, optimizer, num_epochs, scheduler=None, unfreeze_epoch=5, compile_model=False, compile_cache_dir="compile_cache"):
+    best_val_acc = 0.0
+    early_stop_counter = 0
+    unfrozen = False
+    # torch.compile'd view of the same model: parameters (so checkpoints and optimizer) are shared.
+    # Compiles on the first batch (and again on unfreezing / train-eval switches), with the kernels
+    # kept in compile_cache_dir so a rerun skips most of that; eager from then on if compiling fails.
+    if compile_model:
+        configure_compile_cache(compile_cache_dir)
+    net = torch.compile(model) if compile_model else model
+
+    def run(net, images, labels, backward):
+        outputs = net(images)
+        loss = criterion(outputs, labels)
+        if backward:
+            loss.backward()
+        return outputs, loss
+
+    def step(images, labels, backward=False):
+        # The backward graph is compiled on the first loss.backward(), so it's covered here too
+        nonlocal net
+        try:
+            return run(net, images, labels, backward)
+        except COMPILE_ERRORS as e:
+            if net is model:
+                raise
+            # Eager raises too if the batch itself is at fault, and the compiled path stays on
+            optimizer.zero_grad()
+            outputs, loss = run(model, images, labels, backward)
+            tqdm.write(f"torch.compile failed ({type(e).__name__}: {e}), continuing in eager mode")
+            net = model
+            return outputs, loss
+
+    for epoch in range(num_epochs):
+        if (not unfrozen) and (epoch == unfreeze_epoch):
+            print(f"Unfreezing all layers at epoch {epoch+1}")
+            for param in model.parameters():
+                param.requires_grad = True
+            optimizer = optim.AdamW(model.parameters(), lr=1e-4, weight_decay=1e-4)  # lower LR after unfreezing
+            unfrozen = True
+        loop = tqdm(train_loader, total=len(train_loader), ncols=100, desc=f"Epoch {epoch+1}/{num_epochs}")
+        model.train()
+        running_loss = 0.0
+        correct = 0
+        total = 0
+
+        for images, labels in loop:
+            images = images.to(device)
+            labels = labels.to(device)
+
+            optimizer.zero_grad()
+            outputs, loss = step(images, labels, backward=True)
+            optimizer.step()
+
+            running_loss += loss.item() * images.size(0)
+            _, preds = torch.max(outputs, 1)
+            correct += (preds == labels).sum().item()
+            total += labels.size(0)
+            loop.set_postfix(loss=running_loss/total, acc=correct/total)
+
+        train_loss = running_loss/total
+        train_acc = correct/total
+
+        model.eval()
+        val_correct = 0
+        val_total = 0
+        val_loss = 0
+        with torch.no_grad():
+            for images, labels in val_loader:
+                images = images.to(device)
+                labels = labels.to(device)
+
+                outputs, loss = step(images, labels)
+                val_loss += loss.item() * images.size(0)
+                _,preds = torch.max(outputs,1)
+                val_correct += (preds == labels).sum().item()
+                val_total += labels.size(0)
+        val_loss /= val_total
+        val_acc = val_correct/val_total
+
+        if scheduler is not None:
+            scheduler.step(val_loss)
+
+        loop.write(f"Epoch {epoch+1}/{num_epochs} —  Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f}, Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.4f}")
+        
+        if val_acc > best_val_acc:
+            best_val_acc = val_acc
+            torch.save({
+                'epoch': epoch + 1,
+                'model_state_dict': model.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'val_acc': val_acc
+            }, "best_model.pth")
+            tqdm.write(f"Model saved at epoch {epoch+1} with Val Acc: {val_acc:.4f}")
+
+# compile_model=True trades a slower first epoch for faster steps after it
+Trainer(model=model, criterion=criterion, num_epochs=20, optimizer = optimizer, scheduler = None, compile_model=False)
+
@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data import DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
+from torchvision import models
+from tqdm import tqdm
+
+from classifiers import build_classifier
+from dataset import BenthicDataset, load_splits, species_classes, dataset_dir
+
+
+def launched_by_torchrun():
+    return "RANK" in os.environ and "WORLD_SIZE" in os.environ
+
+
+def _spawned(local_rank, nprocs, port, fn, args):
+    # Single-box launch without torchrun: fill in the env torchrun would set
+    os.environ.update({
+        "RANK": str(local_rank),
+        "LOCAL_RANK": str(local_rank),
+        "WORLD_SIZE": str(nprocs),
+        "LOCAL_WORLD_SIZE": str(nprocs),
+        "MASTER_ADDR": "127.0.0.1",
+        "MASTER_PORT": str(port),
+    })
+    fn(args)
+
+
+def launch(fn, args, nprocs):
+    """Run fn(args) on every rank: in place under torchrun, otherwise in nprocs local processes."""
+    if launched_by_torchrun():
+        fn(args)
+    else:
+        mp.spawn(_spawned, args=(nprocs, args.port, fn, args), nprocs=nprocs, join=True)
+
+
+def init_distributed(threads=None, bind=False):
+    """
+    Join the gloo process group. Each rank gets an equal share of this box's
+    cores for its intra-op threads; with bind, it is also pinned to its own
+    contiguous block of cores (one socket per rank when ranks = sockets).
+    """
+    dist.init_process_group("gloo")
+    local_rank = int(os.environ.get("LOCAL_RANK", 0))
+    local_world = int(os.environ.get("LOCAL_WORLD_SIZE", 1))
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    share = max(len(cores) // local_world, 1)
+    if bind and hasattr(os, "sched_setaffinity") and len(cores) >= local_world:
+        os.sched_setaffinity(0, cores[local_rank * share:(local_rank + 1) * share])
+    torch.set_num_threads(threads or share)
+    return dist.get_rank(), dist.get_world_size()
+
+
+def build_model(rank, freeze_backbone=True, pretrained=True):
+    # Rank 0 fetches the ImageNet weights first so the other ranks read them from the cache
+    if pretrained and rank != 0:
+        dist.barrier()
+    model = build_classifier("resnet50", len(species_classes), pretrained=pretrained)
+    if pretrained and rank == 0:
+        dist.barrier()
+    for name, param in model.named_parameters():
+        param.requires_grad = not freeze_backbone or name.startswith("fc.")
+    return model
+
+
+def make_loaders(train_df, val_df, args, rank, world_size):
+    """Training split sharded (and reshuffled each epoch) by DistributedSampler; validation split strided without padding."""
+    transform = models.ResNet50_Weights.DEFAULT.transforms()
+    train_dataset = BenthicDataset(train_df, transform)
+    val_dataset = BenthicDataset(val_df, transform)
+    sampler = DistributedSampler(train_dataset, num_replicas=world_size, rank=rank, shuffle=True, seed=args.seed, drop_last=True)
+    # DistributedSampler pads with repeats to even out shards; a plain stride keeps val metrics exact
+    val_shard = Subset(val_dataset, range(rank, len(val_dataset), world_size))
+    train_loader = DataLoader(train_dataset, batch_size=args.batch_size, sampler=sampler,
+                              num_workers=args.num_workers, persistent_workers=args.num_workers > 0)
+    val_loader = DataLoader(val_shard, batch_size=args.batch_size, num_workers=args.num_workers)
+    if len(train_loader) == 0:
+        # The sampler's drop_last leaves every shard empty when there are fewer images than ranks
+        raise ValueError(f"{len(train_dataset)} training images can't be sharded over {world_size} ranks; use fewer ranks")
+    return train_loader, val_loader, sampler
+
+
+def all_reduce(values, op=dist.ReduceOp.SUM):
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=op)
+    return tensor.tolist()
+
+
+def train_epoch(model, loader, criterion, optimizer, rank, desc, frozen=False):
+    model.train()
+    if frozen:
+        # A frozen backbone's BatchNorm layers keep their pretrained statistics instead of
+        # drifting apart on each rank's shard
+        for module in model.modules():
+            if isinstance(module, nn.modules.batchnorm._BatchNorm):
+                module.eval()
+    loss_sum = correct = total = 0.0
+    start = time.perf_counter()
+    loop = tqdm(loader, total=len(loader), ncols=100, desc=desc, disable=rank != 0)
+    for images, labels in loop:
+        optimizer.zero_grad()
+        outputs = model(images)
+        loss = criterion(outputs, labels)
+        loss.backward()  # DDP averages the gradients across ranks here
+        optimizer.step()
+
+        loss_sum += loss.item() * images.size(0)
+        correct += (outputs.argmax(dim=1) == labels).sum().item()
+        total += labels.size(0)
+        loop.set_postfix(loss=loss_sum/total, acc=correct/total)
+    elapsed = time.perf_counter() - start
+
+    # Global metrics; throughput is bounded by the slowest rank
+    loss_sum, correct, total = all_reduce([loss_sum, correct, total])
+    (elapsed,) = all_reduce([elapsed], op=dist.ReduceOp.MAX)
+    return loss_sum / total, correct / total, total / elapsed
+
+
+@torch.no_grad()
+def validate(model, loader, criterion):
+    model.eval()
+    loss_sum = correct = total = 0.0
+    for images, labels in loader:
+        outputs = model(images)
+        loss_sum += criterion(outputs, labels).item() * images.size(0)
+        correct += (outputs.argmax(dim=1) == labels).sum().item()
+        total += labels.size(0)
+    loss_sum, correct, total = all_reduce([loss_sum, correct, total])
+    return loss_sum / total, correct / total
+
+
+def train(args):
+    """
+    Data-parallel version of pretrained_cnn.py's Trainer: backbone frozen
+    until --unfreeze-epoch, then everything trains at the lower learning
+    rate. Only rank 0 prints and writes checkpoints.
+    """
+    rank, world_size = init_distributed(args.threads, args.bind)
+    torch.manual_seed(args.seed)
+    if rank == 0:
+        print(f"Training on {world_size} ranks x {torch.get_num_threads()} threads, "
+              f"{args.batch_size * world_size} images per global batch")
+
+    train_df, val_df, _ = load_splits(args.dataset_dir, args.manifest)
+    train_loader, val_loader, sampler = make_loaders(train_df, val_df, args, rank, world_size)
+
+    model = build_model(rank, freeze_backbone=args.unfreeze_epoch > 0)
+    # DDP only syncs parameters that require grad when it is built, so it is rebuilt after unfreezing
+    ddp = DDP(model)
+    criterion = nn.CrossEntropyLoss(label_smoothing=0.1)
+    optimizer = optim.AdamW(filter(lambda p: p.requires_grad, model.parameters()), lr=args.lr, weight_decay=1e-4)
+
+    best_val_acc = 0.0
+    history = []
+    for epoch in range(args.epochs):
+        if epoch == args.unfreeze_epoch and epoch > 0:
+            if rank == 0:
+                print(f"Unfreezing all layers at epoch {epoch+1}")
+            for param in model.parameters():
+                param.requires_grad = True
+            # Release the old wrapper's reducer and gradient hooks before wrapping again
+            del ddp
+            ddp = DDP(model)
+            optimizer = optim.AdamW(model.parameters(), lr=args.finetune_lr, weight_decay=1e-4)
+
+        sampler.set_epoch(epoch)
+        train_loss, train_acc, throughput = train_epoch(ddp, train_loader, criterion, optimizer, rank, f"Epoch {epoch+1}/{args.epochs}",
+                                                        frozen=epoch < args.unfreeze_epoch)
+        val_loss, val_acc = validate(ddp, val_loader, criterion)
+        history.append({"epoch": epoch + 1, "train_loss": train_loss, "train_acc": train_acc,
+                        "val_loss": val_loss, "val_acc": val_acc, "images_per_sec": throughput})
+
+        if rank == 0:
+            tqdm.write(f"Epoch {epoch+1}/{args.epochs} —  Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f}, "
+                       f"Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.4f}, {throughput:.1f} img/s")
+            if val_acc > best_val_acc:
+                best_val_acc = val_acc
+                torch.save({
+                    'arch': 'resnet50',
+                    'epoch': epoch + 1,
+                    'model_state_dict': model.state_dict(),
+                    'optimizer_state_dict': optimizer.state_dict(),
+                    'val_acc': val_acc
+                }, args.output)
+                tqdm.write(f"Model saved at epoch {epoch+1} with Val Acc: {val_acc:.4f}")
+
+    if rank == 0:
+        write_report(args, world_size, best_val_acc, history)
+    dist.destroy_process_group()
+
+
+def write_report(args, world_size, best_val_acc, history):
+    # Unfrozen epochs are the steady state; frozen ones barely run a backward pass
+    steady = [h["images_per_sec"] for h in history if h["epoch"] > args.unfreeze_epoch] or [h["images_per_sec"] for h in history]
+    report = {
+        "world_size": world_size,
+        "nodes": world_size // int(os.environ.get("LOCAL_WORLD_SIZE", world_size)),
+        "threads_per_rank": torch.get_num_threads(),
+        "batch_size_per_rank": args.batch_size,
+        "best_val_acc": best_val_acc,
+        "images_per_sec": sum(steady) / len(steady),
+        "history": history,
+    }
+    if args.baseline_report:
+        with open(args.baseline_report) as f:
+            baseline = json.load(f)
+        # Ideal throughput scales linearly with ranks from the baseline run
+        ideal = baseline["images_per_sec"] * world_size / baseline["world_size"]
+        report["scaling_efficiency"] = report["images_per_sec"] / ideal
+        print(f"Scaling efficiency vs {args.baseline_report}: {report['scaling_efficiency']:.1%} "
+              f"({report['images_per_sec']:.1f} img/s on {world_size} ranks, ideal {ideal:.1f})")
+    with open(args.report or f"{args.output}.report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def benchmark(args):
+    """Time --benchmark-steps fully unfrozen training steps on real batches; rank 0 writes images/s to args.result_file."""
+    rank, world_size = init_distributed(args.threads, args.bind)
+    torch.manual_seed(args.seed)
+    train_df, val_df, _ = load_splits(args.dataset_dir, args.manifest)
+    train_loader, _, sampler = make_loaders(train_df, val_df, args, rank, world_size)
+    # Step time doesn't depend on the weights, so no download here
+    model = DDP(build_model(rank, freeze_backbone=False, pretrained=False))
+    criterion = nn.CrossEntropyLoss(label_smoothing=0.1)
+    optimizer = optim.AdamW(model.parameters(), lr=args.finetune_lr, weight_decay=1e-4)
+
+    steps, epoch, images = 0, 0, 0
+    start = None
+    while steps < args.warmup_steps + args.benchmark_steps:
+        sampler.set_epoch(epoch)
+        for batch, labels in train_loader:
+            if steps == args.warmup_steps:
+                dist.barrier()
+                start = time.perf_counter()
+            optimizer.zero_grad()
+            criterion(model(batch), labels).backward()
+            optimizer.step()
+            steps += 1
+            if start is not None:
+                images += batch.size(0)
+            if steps == args.warmup_steps + args.benchmark_steps:
+                break
+        epoch += 1
+    elapsed = time.perf_counter() - start
+    images, = all_reduce([images])
+    elapsed, = all_reduce([elapsed], op=dist.ReduceOp.MAX)
+    if rank == 0:
+        with open(args.result_file, "w") as f:
+            json.dump({"world_size": world_size, "threads_per_rank": torch.get_num_threads(), "images_per_sec": images / elapsed}, f)
+    dist.destroy_process_group()
+
+
+def scaling_benchmark(args):
+    """Benchmark each local world size in --scaling and print throughput, speedup and efficiency against the first."""
+    rows = []
+    for nprocs in args.scaling:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            args.result_file = f.name
+        mp.spawn(_spawned, args=(nprocs, args.port, benchmark, args), nprocs=nprocs, join=True)
+        with open(args.result_file) as f:
+            rows.append(json.load(f))
+        os.unlink(args.result_file)
+        print(f"{nprocs} ranks: {rows[-1]['images_per_sec']:.1f} img/s", flush=True)
+
+    base = rows[0]
+    for row in rows:
+        row["speedup"] = row["images_per_sec"] / base["images_per_sec"]
+        row["scaling_efficiency"] = row["speedup"] * base["world_size"] / row["world_size"]
+    print(f"{'ranks':>6}{'threads':>9}{'img/s':>10}{'speedup':>9}{'efficiency':>12}")
+    for row in rows:
+        print(f"{row['world_size']:>6}{row['threads_per_rank']:>9}{row['images_per_sec']:>10.1f}{row['speedup']:>9.2f}{row['scaling_efficiency']:>12.1%}")
+    with open(args.report or "scaling_report.json", "w") as f:
+        json.dump(rows, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Data-parallel CPU training of the ResNet-50 classifier (torch.distributed, gloo)")
+    parser.add_argument("--nproc-per-node", type=int, default=1, help="Processes to spawn when not launched by torchrun")
+    parser.add_argument("--port", type=int, default=29500, help="Rendezvous port for the self-spawned processes")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per rank (default: this box's cores / local ranks)")
+    parser.add_argument("--bind", action="store_true", help="Pin each local rank to its own block of cores")
+    parser.add_argument("--output", default="best_model.pth")
+    parser.add_argument("--report", default=None, help="JSON report path (default: <output>.report.json)")
+    parser.add_argument("--baseline-report", default=None, help="Report of an earlier (e.g. single-rank) run to compute scaling efficiency against")
+    parser.add_argument("--dataset-dir", default=str(dataset_dir))
+    parser.add_argument("--manifest", default=None, help="Dataset manifest from manifest.py (default: manifest.csv next to --dataset-dir)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--unfreeze-epoch", type=int, default=5, help="Epoch from which the backbone trains too (0: from the start)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Per rank")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--finetune-lr", type=float, default=1e-4, help="Learning rate once the backbone is unfrozen")
+    parser.add_argument("--num-workers", type=int, default=2, help="DataLoader workers per rank")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scaling", type=int, nargs="+", default=None,
+                        help="Instead of training, benchmark these local rank counts (e.g. 1 2 4) and report scaling efficiency")
+    parser.add_argument("--benchmark-steps", type=int, default=20)
+    parser.add_argument("--warmup-steps", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        scaling_benchmark(args)
+    else:
+        launch(train, args, args.nproc_per_node)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from prefilter import FEATURE_NAMES, FEATURE_SIZE, frame_features
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def list_frames(data_dir):
+    """(image path, occupied) for a YOLO-format folder: a frame is occupied if its label file has any box."""
+    frames = []
+    for image_path in sorted((data_dir / "images").rglob("*")):
+        if image_path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        label_path = (data_dir / "labels" / image_path.relative_to(data_dir / "images")).with_suffix(".txt")
+        occupied = label_path.exists() and any(line.strip() for line in label_path.read_text().splitlines())
+        frames.append((image_path, occupied))
+    return frames
+
+
+def extract(path):
+    with Image.open(path) as image:
+        return frame_features(image)
+
+
+def operating_curve(probs, occupied, points=200):
+    """
+    Recall of occupied frames and share of frames skipped for a range of
+    thresholds (frames scoring below the threshold skip the detector).
+    """
+    thresholds = np.unique(np.quantile(probs, np.linspace(0, 1, points)))
+    curve = []
+    for threshold in thresholds:
+        keep = probs >= threshold
+        curve.append({
+            "threshold": float(threshold),
+            "recall": float(keep[occupied].mean()) if occupied.any() else 1.0,
+            "skip_rate": float((~keep).mean()),
+        })
+    return curve
+
+
+def pick_threshold(curve, recall_target):
+    """Highest threshold (most frames skipped) that still keeps recall_target of the occupied frames."""
+    passing = [point for point in curve if point["recall"] >= recall_target]
+    return max(passing, key=lambda point: point["threshold"]) if passing else {"threshold": 0.0, "recall": 1.0, "skip_rate": 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the empty-frame gate that lets the API skip the detector on empty seabed frames")
+    parser.add_argument("--data-dir", required=True, help="Folder with images/ and labels/ in YOLO format; frames with no boxes are the empty ones")
+    parser.add_argument("--output", default="prefilter.json")
+    parser.add_argument("--recall-target", type=float, default=0.99, help="Share of occupied frames that must still reach the detector")
+    parser.add_argument("--val-fraction", type=float, default=0.3, help="Held-out frames the threshold is chosen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Image decode threads")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    frames = list_frames(Path(args.data_dir))
+    occupied = np.array([o for _, o in frames])
+    if len(frames) == 0 or occupied.all() or not occupied.any():
+        print(f"Need both empty and occupied frames under {args.data_dir} (found {int(occupied.sum())} occupied of {len(frames)})")
+        return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        features = np.stack(list(pool.map(extract, [path for path, _ in frames])))
+    per_frame_ms = (time.perf_counter() - start) / len(frames) * 1000 * args.workers
+
+    x_train, x_val, y_train, y_val = train_test_split(
+        features, occupied, test_size=args.val_fraction, stratify=occupied, random_state=args.seed
+    )
+    scaler = StandardScaler().fit(x_train)
+    # Balanced, since a survey is mostly empty frames and a missed animal costs more than a wasted detector pass
+    model = LogisticRegression(class_weight="balanced", max_iter=1000).fit(scaler.transform(x_train), y_train)
+
+    probs = model.predict_proba(scaler.transform(x_val))[:, 1]
+    curve = operating_curve(probs, y_val)
+    chosen = pick_threshold(curve, args.recall_target)
+
+    gate = {
+        "features": FEATURE_NAMES,
+        "size": FEATURE_SIZE,
+        "mean": scaler.mean_.tolist(),
+        "scale": scaler.scale_.tolist(),
+        "coef": model.coef_[0].tolist(),
+        "intercept": float(model.intercept_[0]),
+        "recall_target": args.recall_target,
+        "threshold": chosen["threshold"],
+        "curve": curve,
+        "trained_on": {"frames": len(frames), "occupied": int(occupied.sum()), "empty": int((~occupied).sum()), "val_frames": len(y_val)},
+    }
+    with open(args.output, "w") as f:
+        json.dump(gate, f, indent=2)
+
+    print(f"{len(frames)} frames ({int((~occupied).sum())} empty), features {per_frame_ms:.1f} ms/frame")
+    print(f"{'recall target':>14}{'threshold':>11}{'val recall':>12}{'skipped':>9}")
+    for target in sorted({0.95, 0.98, 0.99, 0.995, 1.0, args.recall_target}):
+        point = pick_threshold(curve, target)
+        print(f"{target:>14.3f}{point['threshold']:>11.3f}{point['recall']:>12.3f}{point['skip_rate']:>9.1%}")
+    print(f"Gate written to {args.output} (threshold {chosen['threshold']:.3f}: skips {chosen['skip_rate']:.1%} of held-out frames "
+          f"at {chosen['recall']:.1%} recall); serve it with PREFILTER_ENABLED=1 PREFILTER_PATH={args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
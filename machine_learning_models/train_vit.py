@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader
+from torchvision import models, transforms
+from tqdm import tqdm
+
+from classifiers import build_classifier
+from dataset import BenthicDataset, load_splits, species_classes, dataset_dir
+from distill import accuracy, cpu_latency
+from evaluate import load_classifier, make_loader
+from vit import VIT_DEFAULTS
+
+
+def train_transforms(image_size):
+    # The ViT has no ImageNet weights to lean on, so it gets light augmentation;
+    # normalisation matches the serving transform
+    weights = models.ResNet50_Weights.DEFAULT.transforms()
+    return transforms.Compose([
+        transforms.RandomResizedCrop(image_size, scale=(0.6, 1.0)),
+        transforms.RandomHorizontalFlip(),
+        transforms.ColorJitter(0.2, 0.2, 0.2),
+        transforms.ToTensor(),
+        transforms.Normalize(weights.mean, weights.std),
+    ])
+
+
+def train(model, train_df, val_df, args, device):
+    """AdamW with linear warmup then cosine decay; keeps the best-val-accuracy weights in args.output."""
+    train_loader = DataLoader(BenthicDataset(train_df, train_transforms(model.image_size)), batch_size=args.batch_size,
+                              shuffle=True, num_workers=args.num_workers, pin_memory=device.type == "cuda")
+    val_loader = make_loader(val_df, args.batch_size, args.num_workers, device)
+
+    criterion = nn.CrossEntropyLoss(label_smoothing=0.1)
+    optimizer = optim.AdamW(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+    warmup = max(args.warmup_epochs, 1)
+    scheduler = optim.lr_scheduler.SequentialLR(optimizer, [
+        optim.lr_scheduler.LinearLR(optimizer, start_factor=0.1, total_iters=warmup),
+        optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(args.epochs - warmup, 1)),
+    ], milestones=[warmup])
+    best_val_acc = 0.0
+
+    for epoch in range(args.epochs):
+        model.train()
+        loop = tqdm(train_loader, total=len(train_loader), ncols=100, desc=f"Epoch {epoch+1}/{args.epochs}")
+        running_loss = 0.0
+        correct = 0
+        total = 0
+
+        for images, labels in loop:
+            images = images.to(device)
+            labels = labels.to(device)
+
+            optimizer.zero_grad()
+            outputs = model(images)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+
+            running_loss += loss.item() * images.size(0)
+            correct += (outputs.argmax(dim=1) == labels).sum().item()
+            total += labels.size(0)
+            loop.set_postfix(loss=running_loss/total, acc=correct/total)
+        scheduler.step()
+
+        val_acc = accuracy(model, val_loader, device)
+        loop.write(f"Epoch {epoch+1}/{args.epochs} —  Train Loss: {running_loss/total:.4f}, Train Acc: {correct/total:.4f}, Val Acc: {val_acc:.4f}")
+
+        if val_acc > best_val_acc or epoch == 0:
+            best_val_acc = val_acc
+            # 'arch' + 'vit_config' let the API's load_model, evaluate.py and export_weights.py rebuild it
+            torch.save({
+                'arch': 'vit',
+                'vit_config': model.config(),
+                'epoch': epoch + 1,
+                'model_state_dict': model.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'val_acc': val_acc
+            }, args.output)
+            tqdm.write(f"Model saved at epoch {epoch+1} with Val Acc: {val_acc:.4f}")
+    return best_val_acc
+
+
+def _peak_rss_mb():
+    # VmHWM belongs to this process image; ru_maxrss on Linux is inherited from the parent across exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _forward_peak_rss(arch, vit_config, batch_size, threads):
+    """Runs in a fresh process: extra peak RSS (MB) of one forward pass over the loaded model."""
+    torch.set_num_threads(threads)
+    model = build_classifier(arch, len(species_classes), vit_config=vit_config).eval()
+    images = torch.randn(batch_size, 3, 224, 224)
+    before = _peak_rss_mb()
+    with torch.inference_mode():
+        model(images)
+    return _peak_rss_mb() - before
+
+
+def forward_memory(arch, vit_config, batch_size, threads):
+    """Peak activation memory of a forward pass, or None where it can't be measured (Windows)."""
+    if sys.platform == "win32":
+        return None
+    # A new process per measurement, since the high-water mark never goes back down
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_forward_peak_rss, arch, vit_config, batch_size, threads).result()
+
+
+def benchmark(candidates, batch_sizes, threads):
+    """CPU latency and memory for each {name: (model, arch, vit_config)}."""
+    torch.set_num_threads(threads)
+    results = {}
+    for name, (model, arch, vit_config) in candidates.items():
+        results[name] = {
+            "arch": arch,
+            "parameters": sum(p.numel() for p in model.parameters()),
+            "weights_mb": sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024),
+            "cpu_latency": {str(bs): cpu_latency(model, bs) for bs in batch_sizes},
+            "forward_peak_mb": {str(bs): forward_memory(arch, vit_config, bs, threads) for bs in batch_sizes},
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the ViT classifier and benchmark it against ResNet-50 on the CPU")
+    parser.add_argument("--output", default="vit_model.pth", help="ViT checkpoint path")
+    parser.add_argument("--baseline", default="best_model.pth", help="ResNet-50 checkpoint to compare against")
+    parser.add_argument("--benchmark-only", action="store_true", help="Skip training and benchmark the existing --output")
+    parser.add_argument("--dataset-dir", default=str(dataset_dir))
+    parser.add_argument("--manifest", default=None, help="Dataset manifest from manifest.py (default: manifest.csv next to --dataset-dir)")
+    parser.add_argument("--image-size", type=int, default=VIT_DEFAULTS["image_size"], help="Resolution the ViT runs at (inputs are resized to it)")
+    parser.add_argument("--patch-size", type=int, default=VIT_DEFAULTS["patch_size"])
+    parser.add_argument("--embed-dim", type=int, default=VIT_DEFAULTS["embed_dim"])
+    parser.add_argument("--attn-heads", type=int, nargs="+", default=VIT_DEFAULTS["attn_heads"], help="Heads per encoder block (one entry per block)")
+    parser.add_argument("--mlp-scale", type=int, default=VIT_DEFAULTS["mlp_scale"])
+    parser.add_argument("--drop-rate", type=float, default=0.1)
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--warmup-epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=5e-4)
+    parser.add_argument("--weight-decay", type=float, default=0.05)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency-batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads(), help="torch threads for the CPU benchmark")
+    parser.add_argument("--report", default=None, help="JSON report path (default: <output>.report.json)")
+    args = parser.parse_args(argv)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print("Using device:", device)
+
+    # Same stratified split as pretrained_cnn.py, so both models are scored on the same unseen images
+    train_df, val_df, test_df = load_splits(args.dataset_dir, args.manifest)
+
+    best_val_acc = None
+    if not args.benchmark_only:
+        vit_config = {
+            "image_size": args.image_size,
+            "patch_size": args.patch_size,
+            "embed_dim": args.embed_dim,
+            "attn_heads": args.attn_heads,
+            "mlp_scale": args.mlp_scale,
+            "drop_rate": args.drop_rate,
+        }
+        model = build_classifier("vit", len(species_classes), vit_config=vit_config).to(device)
+        print("Network Parameters: ", sum(p.numel() for p in model.parameters()))
+        best_val_acc = train(model, train_df, val_df, args, device)
+
+    vit, info = load_classifier(args.output, device)
+    candidates = {"vit": (vit, "vit", info.get("vit_config"))}
+    if os.path.exists(args.baseline):
+        resnet, resnet_info = load_classifier(args.baseline, device)
+        candidates = {"resnet50": (resnet, resnet_info["arch"], None), **candidates}
+    else:
+        print(f"{args.baseline} not found: comparing against an untrained ResNet-50 (latency and memory only)")
+        candidates = {"resnet50": (build_classifier("resnet50", len(species_classes)).to(device), "resnet50", None), **candidates}
+
+    test_loader = make_loader(test_df, args.batch_size, args.num_workers, device)
+    test_acc = {name: accuracy(model.to(device), test_loader, device) for name, (model, _, _) in candidates.items()}
+    results = benchmark(candidates, args.latency_batch_sizes, args.threads)
+    for name in results:
+        results[name]["test_acc"] = test_acc[name]
+
+    report = {
+        "vit": args.output,
+        "vit_config": info.get("vit_config"),
+        "baseline": args.baseline,
+        "best_val_acc": best_val_acc,
+        "threads": args.threads,
+        "results": results,
+    }
+    with open(args.report or f"{args.output}.report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    header = f"{'model':<10}{'params':>12}{'weights MB':>12}{'test acc':>10}"
+    for bs in args.latency_batch_sizes:
+        header += f"{f'ms@{bs}':>10}{f'act MB@{bs}':>12}"
+    print(header)
+    for name, row in results.items():
+        line = f"{name:<10}{row['parameters']:>12,}{row['weights_mb']:>12.1f}{row['test_acc']:>10.4f}"
+        for bs in args.latency_batch_sizes:
+            memory = row["forward_peak_mb"][str(bs)]
+            line += f"{row['cpu_latency'][str(bs)]['p50_ms']:>10.1f}" + (f"{memory:>12.1f}" if memory is not None else f"{'n/a':>12}")
+        print(line)
+    print(f"ViT checkpoint: {args.output} (serve it with MODEL_PATH or FAST_MODEL_PATH; its 'arch' is 'vit')")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+# The ViT is defined once, in the API's utils/vit.py (which the API loads checkpoints with),
+# and loaded from there by path so the training scripts can't drift from what gets served.
+_spec = importlib.util.spec_from_file_location("aquasense_vit", Path(__file__).resolve().parent.parent / "api" / "utils" / "vit.py")
+_vit = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = _vit
+_spec.loader.exec_module(_vit)
+
+VIT_DEFAULTS = _vit.VIT_DEFAULTS
+Patchify, FF, MHSA, EncoderBlock, ViT = _vit.Patchify, _vit.FF, _vit.MHSA, _vit.EncoderBlock, _vit.ViT